@@ -0,0 +1,241 @@
+# Import Module -- Start
+
+import sys
+import os
+import re
+import time
+import json
+import queue
+import random
+import sqlite3
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import collections
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import collector
+import flow_parser
+import dns_resolver
+import dns_cache
+import generate_corpus
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+def parse_arg():
+
+    # Create the parser object
+    parser = argparse.ArgumentParser(description="Flownix Collector Benchmark", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    # Define arguments
+    parser.add_argument('--corpus', type=str, required=False, default=None, help="Recorded or generated ptcpdump --oneline -v lines, a synthetic corpus is generated when omitted")
+    parser.add_argument('--packets', type=int, required=False, default=200000, help="Synthetic corpus size (lines)")
+    parser.add_argument('--flows', type=int, required=False, default=5000, help="Synthetic corpus flow cardinality")
+    parser.add_argument('--rate', type=float, required=False, default=20000, help="Packet rate, decides how many lines fall into one window")
+    parser.add_argument('--window', type=float, required=False, default=5, help="Window length in seconds of capture time")
+    parser.add_argument('--seed', type=int, required=False, default=183, help="Random seed for the synthetic corpus")
+    parser.add_argument('--workers', type=str, required=False, default='1,2,4', help="Comma-separated parsing worker counts for the sharded throughput scaling run")
+    parser.add_argument('--output', type=str, required=False, default='benchmark_results.json', help="JSON file the results are written to")
+
+    # Parse the arguments
+    arg = parser.parse_args()
+
+    return arg
+
+def get_release():
+
+    # Package version from the Debian control file, so results can be compared across releases
+    control_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "deb/DEBIAN/control")
+
+    try:
+        with open(control_path, "r") as f:
+            for line in f:
+                if line.startswith("Version:"):
+                    return line.split(":", 1)[1].strip()
+    except FileNotFoundError:
+        pass
+
+    return None
+
+def load_lines():
+
+    if arg.corpus:
+        timestamp_pattern = re.compile(r"(?:\d{9,}\.\d+|\d{2}:\d{2}:\d{2}\.\d+)\s")
+        with open(arg.corpus, "r") as f:
+            return [timestamp_pattern.sub("", line, count=1) for line in f if line.strip()]
+
+    random.seed(arg.seed)
+    return list(generate_corpus.generate_corpus(arg.packets, arg.flows, arg.rate, timestamp=False))
+
+def setup_collector(db_path):
+
+    # Minimal stand-in for collector.main(): no capture, no forwarding, no resolver traffic
+    collector.config = {"collector": {"local_db_path": db_path, "remote_forwarding": False}}
+    collector.set_session_limits()
+    collector.dns = dns_cache.DnsCache()
+    dns_resolver.start(collector.dns)
+    collector.pipeline_stats = collections.defaultdict(float)
+    collector.db_queue = queue.Queue()
+    collector.data_queue = queue.Queue()
+    collector.shutdown_event = threading.Event()
+
+def benchmark_parse(lines):
+
+    start_time = time.perf_counter()
+    packets = [flow_parser.parse_line(line) for line in lines]
+    elapsed_time = time.perf_counter() - start_time
+
+    return [packet for packet in packets if packet], elapsed_time
+
+def benchmark_aggregate(packets):
+
+    # Reverse DNS is network-bound, pre-seed the cache so only aggregation is measured
+    for packet in packets:
+        collector.dns[packet.src_ip] = 'None'
+        collector.dns[packet.dst_ip] = 'None'
+
+    length_sums = collections.defaultdict(int)
+    tcp_session = collections.OrderedDict()
+    window_lines = max(1, int(arg.rate * arg.window))
+
+    aggregate_time = handoff_time = 0.0
+    for index in range(0, len(packets), window_lines):
+        start_time = time.perf_counter()
+        for packet in packets[index:index + window_lines]:
+            collector.aggregate_packet(packet, length_sums, tcp_session)
+        aggregate_time += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        collector.expire_sessions(tcp_session)
+        length_sums = collector.flush_window(length_sums)
+        handoff_time += time.perf_counter() - start_time
+
+    windows = []
+    while not collector.db_queue.empty():
+        windows.append(collector.db_queue.get())
+
+    return windows, aggregate_time, handoff_time, len(tcp_session)
+
+def benchmark_scaling(lines):
+
+    # End-to-end reader -> parse -> aggregate throughput, in-process first and then sharded
+    scaling = {}
+
+    for worker_count in [0] + [int(worker_count) for worker_count in arg.workers.split(",") if worker_count]:
+        collector.db_queue = queue.Queue()
+
+        start_time = time.perf_counter()
+        if worker_count:
+            collector.run_sharded_parsing(iter(lines), worker_count)
+        else:
+            collector.run_parsing(iter(lines))
+        elapsed_time = time.perf_counter() - start_time
+
+        scaling["in_process" if worker_count == 0 else f"workers_{worker_count}"] = {
+            "seconds": elapsed_time,
+            "lines_per_sec": len(lines) / elapsed_time,
+        }
+
+    baseline = scaling["in_process"]["lines_per_sec"]
+    for result in scaling.values():
+        result["speedup"] = result["lines_per_sec"] / baseline
+
+    collector.db_queue = queue.Queue()
+
+    return scaling
+
+def benchmark_write(windows, db_path):
+
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    collector.create_traffic_table(c)
+    conn.commit()
+    conn.execute("PRAGMA journal_mode=WAL;")
+
+    start_time = time.perf_counter()
+    for length_sums in windows:
+        collector.write_traffic_table(length_sums, c)
+        conn.commit()
+    elapsed_time = time.perf_counter() - start_time
+
+    table_rows = c.execute("SELECT COUNT(*) FROM traffic").fetchone()[0]
+    conn.close()
+
+    return elapsed_time, table_rows
+
+def main():
+
+    global arg
+    arg = parse_arg()
+
+    lines = load_lines()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "benchmark.db")
+        setup_collector(db_path)
+
+        packets, parse_time = benchmark_parse(lines)
+        windows, aggregate_time, handoff_time, tcp_sessions = benchmark_aggregate(packets)
+        write_time, table_rows = benchmark_write(windows, db_path)
+        db_size = os.path.getsize(db_path)
+
+    rows_written = int(collector.pipeline_stats['flows'])
+
+    scaling = benchmark_scaling(lines)
+
+    results = {
+        "release": get_release(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "corpus": {
+            "source": arg.corpus or "synthetic",
+            "lines": len(lines),
+            "packets": len(packets),
+            "flows": None if arg.corpus else arg.flows,
+            "rate": arg.rate,
+            "window": arg.window,
+            "seed": None if arg.corpus else arg.seed,
+        },
+        "parse": {
+            "seconds": parse_time,
+            "lines_per_sec": len(lines) / parse_time,
+        },
+        "aggregate": {
+            "seconds": aggregate_time,
+            "usec_per_packet": aggregate_time / max(1, len(packets)) * 1e6,
+            "handoff_seconds": handoff_time,
+            "windows": len(windows),
+            "tcp_sessions": tcp_sessions,
+        },
+        "write_traffic_table": {
+            "seconds": write_time,
+            "rows_upserted": rows_written,
+            "upserts_per_sec": rows_written / write_time if write_time else None,
+            "table_rows": table_rows,
+            "db_bytes": db_size,
+        },
+        "scaling": scaling,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+    with open(arg.output, "w") as f:
+        json.dump(results, f, indent=4)
+
+    print(json.dumps(results, indent=4))
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+
+# Global Variable -- End
+
+if __name__ == "__main__":
+
+    main()
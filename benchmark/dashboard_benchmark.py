@@ -0,0 +1,211 @@
+# Import Module -- Start
+
+import sys
+import os
+import time
+import json
+import random
+import sqlite3
+import argparse
+import platform
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dashboard
+import flow_index
+import flow_schema
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+def parse_arg():
+
+    # Create the parser object
+    parser = argparse.ArgumentParser(description="Flownix Dashboard Query Latency Benchmark", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    # Define arguments
+    parser.add_argument('--table-flows', type=str, required=False, default='1000000', help="Comma-separated traffic table sizes (rows) to benchmark against")
+    parser.add_argument('--partitions', type=str, required=False, default='1,3,30', help="Comma-separated partition counts the rows are spread over, 30 as with the default daily partitions and partition_retention")
+    parser.add_argument('--repeat', type=int, required=False, default=3, help="Runs per query, the median is reported")
+    parser.add_argument('--window-flows', type=int, required=False, default=10000, help="Flows per window for the write cost of the indexes")
+    parser.add_argument('--seed', type=int, required=False, default=183, help="Random seed")
+    parser.add_argument('--output', type=str, required=False, default='dashboard_results.json', help="JSON file the results are written to")
+
+    # Parse the arguments
+    arg = parser.parse_args()
+
+    return arg
+
+def make_key(index):
+
+    # Shaped like a real flow key: hosts from fixed pools, a handful of interfaces/protocols and a few dozen processes
+    local_host = index % LOCAL_HOSTS
+    remote_host = index * 7919 % REMOTE_HOSTS
+    descriptor = DESCRIPTORS[index % len(DESCRIPTORS)]
+    process = index * 31 % PROCESSES
+
+    return (
+        'None', f"10.0.{local_host >> 8}.{local_host & 255}", str(1024 + index // LOCAL_HOSTS),
+        f"host{remote_host % 5000}.example.com", f"93.{remote_host >> 16}.{remote_host >> 8 & 255}.{remote_host & 255}", random.choice(REMOTE_PORTS),
+        *descriptor,
+        f"process{process}", f"/usr/bin/process{process}", f"process{process} --serve", 'systemd', '/usr/lib/systemd/systemd', 'systemd',
+    )
+
+def populate(db_path, table_flows, partitions):
+
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+
+    flow_schema.clear_cache()
+    flow_schema.create_traffic_tables(c, partition_hours=1)
+
+    # Consecutive chunks go to the last `partitions` hours, oldest first
+    now = time.time()
+    chunk = -(-table_flows // partitions)
+    for start in range(0, table_flows, chunk):
+        for batch in range(start, min(start + chunk, table_flows), 100000):
+            items = [(make_key(index), random.randint(40, 10000000)) for index in range(batch, min(batch + 100000, start + chunk, table_flows))]
+            flow_schema.upsert_flows(c, items, now - 3600 * (partitions - 1 - start // chunk))
+
+    conn.commit()
+    conn.close()
+
+def set_indexes(db_path, enabled):
+
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+
+    start_time = time.perf_counter()
+
+    flow_index.create_indexes(c, 'flow_totals', flow_index.get_definitions() if enabled else {})
+    flow_index.create_indexes(c, 'host', flow_index.HOST_INDEXES if enabled else {})
+
+    conn.commit()
+    elapsed_time = time.perf_counter() - start_time
+
+    conn.close()
+
+    return elapsed_time
+
+def get_db_bytes(db_path):
+
+    # Used pages rather than the file size, dropped indexes stay in the file as free pages
+    conn = sqlite3.connect(db_path)
+    db_bytes = flow_schema.used_bytes(conn.cursor())
+    conn.close()
+
+    return db_bytes
+
+def benchmark_queries(db_path):
+
+    dashboard.config = {"collector": {"local_db_path": db_path}}
+    results = {}
+
+    for name, kwargs in QUERIES.items():
+        timings = []
+        for _ in range(arg.repeat):
+            start_time = time.perf_counter()
+            dashboard.read_local_traffic_table(20, 0, **kwargs)
+            timings.append(time.perf_counter() - start_time)
+        results[name] = statistics.median(timings)
+
+    return results
+
+def benchmark_write(db_path, table_flows):
+
+    # One window into the newest partition, mostly updates as on a busy collector
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+
+    flow_schema.clear_cache()
+    items = [(make_key(random.randrange(table_flows) if random.random() < 0.8 else table_flows + index), random.randint(40, 150000)) for index in range(arg.window_flows)]
+
+    start_time = time.perf_counter()
+    flow_schema.upsert_flows(c, items, time.time())
+    conn.commit()
+    elapsed_time = time.perf_counter() - start_time
+
+    conn.close()
+
+    return len(items) / elapsed_time
+
+def main():
+
+    global arg
+    arg = parse_arg()
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "repeat": arg.repeat,
+        "tables": {},
+    }
+
+    for table_flows in [int(table_flows) for table_flows in arg.table_flows.split(",") if table_flows]:
+        for partitions in [int(partitions) for partitions in arg.partitions.split(",") if partitions]:
+            random.seed(arg.seed)
+
+            with tempfile.TemporaryDirectory() as temp_dir:
+                db_path = os.path.join(temp_dir, "dashboard.db")
+                populate(db_path, table_flows, partitions)
+
+                set_indexes(db_path, False)
+                before = benchmark_queries(db_path)
+                before_write = benchmark_write(db_path, table_flows)
+                before_bytes = get_db_bytes(db_path)
+
+                index_seconds = set_indexes(db_path, True)
+                after = benchmark_queries(db_path)
+                after_write = benchmark_write(db_path, table_flows)
+                after_bytes = get_db_bytes(db_path)
+
+            result = {
+                "queries": {name: {"no_indexes": before[name], "indexes": after[name], "speedup": before[name] / after[name]} for name in QUERIES},
+                "write_rows_per_sec": {"no_indexes": before_write, "indexes": after_write},
+                "index_build_seconds": index_seconds,
+                "db_bytes": {"no_indexes": before_bytes, "indexes": after_bytes},
+            }
+            results["tables"][f"{table_flows}x{partitions}"] = result
+
+            print(f"{table_flows} flows in {partitions} partition(s), index build {index_seconds:.1f}s, db {before_bytes / 1048576:.0f} -> {after_bytes / 1048576:.0f} MiB")
+            for name, query in result["queries"].items():
+                print(f"  {name:<24} {query['no_indexes'] * 1000:>9.1f} ms -> {query['indexes'] * 1000:>9.1f} ms ({query['speedup']:.1f}x)")
+            print(f"  {'write':<24} {before_write:>9,.0f} rows/sec -> {after_write:,.0f} rows/sec")
+
+    with open(arg.output, "w") as f:
+        json.dump(results, f, indent=4)
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+LOCAL_HOSTS = 4096
+
+REMOTE_HOSTS = 65536
+
+REMOTE_PORTS = ('443', '80', '53', '22', '8080', '5353')
+
+PROCESSES = 60
+
+DESCRIPTORS = [(interface, direction, 'IP', trans_proto, '0x0', 'None') for interface in ('eth0', 'wlan0') for direction in ('In', 'Out') for trans_proto in ('TCP', 'UDP')]
+
+# The dashboard page requests: default page, the sortable columns, the filterable ones and known-port bucketing
+QUERIES = {
+    "page": {},
+    "sort_total_length": {"sort_option": ['total_length', 'DESC']},
+    "sort_last_updated": {"sort_option": ['last_updated', 'DESC']},
+    "filter_dst_ip": {"filter_query": "dst_ip = inet('93.0.1.17')"},
+    "filter_process_sorted": {"filter_query": "process_name = 'process7'", "sort_option": ['total_length', 'DESC']},
+    "filter_known_port": {"filter_query": "CASE WHEN dst_port > 1024 THEN 'Not well-known' ELSE dst_port END = 443", "sort_option": ['total_length', 'DESC']},
+    "known_port_grouped": {"known_port": True},
+}
+
+# Global Variable -- End
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,200 @@
+# Import Module -- Start
+
+import sys
+import random
+import argparse
+import ipaddress
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+def parse_arg():
+
+    # Create the parser object
+    parser = argparse.ArgumentParser(description="Flownix Synthetic ptcpdump Corpus Generator", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    # Define arguments
+    parser.add_argument('--output', type=str, required=False, default='-', help="Output file ('-' for stdout)")
+    parser.add_argument('--packets', type=int, required=False, default=100000, help="Number of lines to generate")
+    parser.add_argument('--flows', type=int, required=False, default=1000, help="Number of concurrently active flows")
+    parser.add_argument('--rate', type=float, required=False, default=10000, help="Packet rate used for the capture timestamps (packets/sec)")
+    parser.add_argument('--no-timestamp', action='store_true', help="Omit the leading capture timestamp, as ptcpdump -t prints")
+    parser.add_argument('--seed', type=int, required=False, default=183, help="Random seed")
+
+    # Parse the arguments
+    arg = parser.parse_args()
+
+    return arg
+
+def random_ipv4():
+    return f"10.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+
+def random_public_ipv4():
+    return str(ipaddress.IPv4Address(random.randint(0x01000000, 0xDFFFFFFF)))
+
+def random_ipv6():
+    return str(ipaddress.IPv6Address((0x2001_0db8 << 96) | random.getrandbits(64)))
+
+def random_process():
+
+    # Roughly a fifth of the packets arrive without process attribution
+    if random.random() < 0.2:
+        return ""
+
+    cmd, args, parent_cmd, parent_args = random.choice(PROCESSES)
+    pid = random.randint(300, 65000)
+
+    return f", Process (pid {pid}, cmd {cmd}, args {args}), ParentProc (pid {random.randint(1, pid)}, cmd {parent_cmd}, args {parent_args})"
+
+def new_flow():
+
+    kind = random.choices(FLOW_KINDS, weights=FLOW_WEIGHTS)[0]
+    network_proto = "IP6" if kind.endswith("6") else "IP"
+    local_ip = random_ipv6() if network_proto == "IP6" else random_ipv4()
+    remote_ip = random_ipv6() if network_proto == "IP6" else random_public_ipv4()
+
+    flow = {
+        'kind': kind,
+        'network_proto': network_proto,
+        'interface': random.choice(INTERFACES),
+        'local_ip': local_ip,
+        'remote_ip': remote_ip,
+        'local_port': random.randint(32768, 60999),
+        'remote_port': random.choice(REMOTE_PORTS),
+        'process': random_process(),
+        'packets': 0,
+        'lifetime': random.randint(4, 64),
+    }
+
+    if kind.startswith("arp"):
+        flow['local_ip'] = random_ipv4()
+        flow['remote_ip'] = random_ipv4()
+        flow['mac'] = ":".join(f"{random.randint(0, 255):02x}" for _ in range(6))
+
+    return flow
+
+def tcp_flag(flow):
+
+    # SYN, SYN-ACK, data ... then either a FIN exchange or an abortive RST
+    packets = flow['packets']
+
+    if packets == 0:
+        return "S"
+    if packets == 1:
+        return "S."
+    if packets >= flow['lifetime']:
+        return "R" if flow['lifetime'] % 5 == 0 else "F."
+    return random.choice(["P.", "."])
+
+def format_line(flow):
+
+    interface = flow['interface']
+    outbound = random.random() < 0.5
+    direction = "Out" if outbound else "In"
+    src_ip, dst_ip = (flow['local_ip'], flow['remote_ip']) if outbound else (flow['remote_ip'], flow['local_ip'])
+    src_port, dst_port = (flow['local_port'], flow['remote_port']) if outbound else (flow['remote_port'], flow['local_port'])
+    kind = flow['kind']
+
+    if kind == "arp_req":
+        return f"{interface} {direction} ARP, Ethernet (len 6), IPv4 (len 4), Request who-has {flow['remote_ip']} tell {flow['local_ip']}, length 28"
+
+    if kind == "arp_rep":
+        return f"{interface} {direction} ARP, Ethernet (len 6), IPv4 (len 4), Reply {flow['remote_ip']} is-at {flow['mac']}, length 46"
+
+    if kind.startswith("tcp"):
+        flag = tcp_flag(flow)
+        payload = random.randint(1, 1448) if flag == "P." else 0
+        options = "options [mss 1460,sackOK,TS val 1 ecr 0,nop,wscale 7], " if flag.startswith("S") else ""
+        sni = f" (SNI={random.choice(DOMAINS)})" if flow['packets'] == 2 and flow['remote_port'] == 443 else ""
+        body = f"{src_ip}.{src_port} > {dst_ip}.{dst_port}: Flags [{flag}], cksum 0x{random.getrandbits(16):04x} (correct), seq {flow['packets']}, win 502, {options}length {payload}{sni}{flow['process']}"
+        length = payload + 52
+        proto = "TCP (6)"
+
+    elif kind.startswith("udp"):
+        payload = random.randint(20, 1200)
+        body = f"{src_ip}.{src_port} > {dst_ip}.{dst_port}: UDP, length {payload}{flow['process']}"
+        length = payload + 8
+        proto = "UDP (17)"
+
+    else:
+        body = f"{src_ip} > {dst_ip}: ICMP echo {'request' if outbound else 'reply'}, id {flow['local_port']}, seq {flow['packets']}, length 64"
+        length = 64
+        proto = "ICMPv6 (58)" if flow['network_proto'] == "IP6" else "ICMPv4 (1)"
+
+    if flow['network_proto'] == "IP6":
+        return f"{interface} {direction} IP6 (flowlabel 0x{random.getrandbits(20):05x}, hlim 64, next-header {proto} payload length: {length}) {body}"
+
+    return f"{interface} {direction} IP (tos 0x{random.choice([0, 0, 0, 16, 184]):x}, ttl 64, id {random.getrandbits(16)}, offset 0, flags [DF], proto {proto}, length {length + 20}) {body}"
+
+def format_timestamp(seconds):
+
+    hour, remainder = divmod(seconds, 3600)
+    minute, second = divmod(remainder, 60)
+
+    return f"{int(hour) % 24:02d}:{int(minute):02d}:{second:09.6f} "
+
+def generate_corpus(packets, flows, rate, timestamp=True):
+
+    """Yield synthetic ptcpdump --oneline -v lines drawn from a fixed-size pool of active flows."""
+    pool = [new_flow() for _ in range(flows)]
+
+    for index in range(packets):
+        slot = random.randrange(flows)
+        flow = pool[slot]
+
+        line = format_line(flow)
+        flow['packets'] += 1
+
+        # Finished flows are replaced so the cardinality stays constant
+        if flow['packets'] > flow['lifetime'] or (flow['kind'].startswith("tcp") and flow['packets'] > 2 and random.random() < 0.001):
+            pool[slot] = new_flow()
+
+        if timestamp:
+            line = format_timestamp(index / rate) + line
+
+        yield line + "\n"
+
+def main():
+
+    global arg
+    arg = parse_arg()
+
+    random.seed(arg.seed)
+
+    output = sys.stdout if arg.output == '-' else open(arg.output, "w")
+
+    try:
+        output.writelines(generate_corpus(arg.packets, arg.flows, arg.rate, not arg.no_timestamp))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+FLOW_KINDS = ["tcp", "tcp6", "udp", "udp6", "icmp", "icmp6", "arp_req", "arp_rep"]
+FLOW_WEIGHTS = [60, 10, 15, 5, 3, 2, 3, 2]
+
+INTERFACES = ["eth0", "eth0", "eth0", "wlan0", "lo", "docker0"]
+
+REMOTE_PORTS = [443, 443, 443, 80, 53, 22, 123, 5432, 8080, 8443]
+
+DOMAINS = ["example.com", "www.example.org", "api.github.com", "cdn.jsdelivr.net", "updates.ubuntu.com", "registry.npmjs.org"]
+
+PROCESSES = [
+    ("/usr/bin/curl", "curl https://example.com", "/usr/bin/bash", "bash"),
+    ("/usr/lib/firefox/firefox", "/usr/lib/firefox/firefox -contentproc", "/usr/lib/systemd/systemd", "/lib/systemd/systemd --user"),
+    ("/usr/bin/python3", "python3 -m http.server 8080", "/usr/bin/zsh", "zsh"),
+    ("/usr/lib/systemd/systemd-resolved", "systemd-resolved", "/usr/lib/systemd/systemd", "/sbin/init"),
+    ("/usr/sbin/sshd", "sshd: root@pts/0", "/usr/sbin/sshd", "sshd: /usr/sbin/sshd -D [listener] 0 of 10-100 startups"),
+    ("/usr/bin/apt-get", "apt-get update", "/usr/bin/sudo", "sudo apt-get update"),
+    ("/usr/sbin/chronyd", "/usr/sbin/chronyd -F 1", "/usr/lib/systemd/systemd", "/sbin/init"),
+]
+
+# Global Variable -- End
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,234 @@
+# Import Module -- Start
+
+import sys
+import os
+import re
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flow_parser
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+def parse_arg():
+
+    # Create the parser object
+    parser = argparse.ArgumentParser(description="Flownix Parser Benchmark", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    # Define arguments
+    parser.add_argument('--corpus', type=str, required=False, default=None, help="ptcpdump --oneline -v capture to parse, built-in samples when omitted")
+    parser.add_argument('--lines', type=int, required=False, default=200000, help="Number of lines to parse per run")
+    parser.add_argument('--repeat', type=int, required=False, default=3, help="Number of runs, the best one is reported")
+
+    # Parse the arguments
+    arg = parser.parse_args()
+
+    return arg
+
+def declare_regex_pattern():
+
+    # Per-field patterns used by the collector before flow_parser, kept as the baseline
+    pattern = {
+        'prefix': re.compile(r"^(?P<interface>\S+)\s(?P<direction>In|Out)\s(?P<network_proto>[^,\r\n\t\f\v ]+)"),
+        'tos': re.compile(r"tos\s(\S+)\,"),
+        'trans_proto': re.compile(r"proto\s(\S+)\s"),
+        'length': re.compile(r"length\s(\d+)"),
+        'ip': re.compile(r"(?P<src_ip>\d+\.\d+\.\d+\.\d+)\s>\s(?P<dst_ip>\d+\.\d+\.\d+\.\d+):"),
+        'arp_req': re.compile(r"who-has\s(?P<target_ip>\d+\.\d+\.\d+\.\d+)\stell\s(?P<src_ip>\d+\.\d+\.\d+\.\d+)\,"),
+        'arp_rep': re.compile(r"Reply\s(?P<target_ip>\d+\.\d+\.\d+\.\d+)\sis-at\s(?P<target_mac>[0-9a-fA-F]{2}(:[0-9a-fA-F]{2}){5})\,"),
+        'ip_port': re.compile(r"(?P<src_ip>\d+\.\d+\.\d+\.\d+)\.(?P<src_port>\d+)\s>\s(?P<dst_ip>\d+\.\d+\.\d+\.\d+)\.(?P<dst_port>\d+):"),
+        'ip_port_flag': re.compile(r"(?P<src_ip>\d+\.\d+\.\d+\.\d+)\.(?P<src_port>\d+)\s>\s(?P<dst_ip>\d+\.\d+\.\d+\.\d+)\.(?P<dst_port>\d+):\sFlags\s\[(?P<flag>[^\]]+)\]"),
+        'process': re.compile(r"Process\s\(pid\s(?P<process_pid>\d+)\,\scmd\s(?P<process_cmd>[^,]*)\,\sargs\s(?P<process_arg>[^,]*)\)\,"),
+        'parent_process': re.compile(r"ParentProc\s\(pid\s(?P<parent_process_pid>\d+)\,\scmd\s(?P<parent_process_cmd>[^,]*)\,\sargs\s(?P<parent_process_arg>[^,]*)\)"),
+        'sni': re.compile(r"SNI=(\S+)\)"),
+        'trans_proto_v6': re.compile(r"next-header\s(\S+)\s"),
+        'length_v6': re.compile(r"length:\s(\d+)"),
+        'ip_v6': re.compile(r"(?P<src_ip>[0-9a-fA-F:]+)\s>\s(?P<dst_ip>[0-9a-fA-F:]+):"),
+        'ip_port_v6': re.compile(r"(?P<src_ip>[0-9a-fA-F:]+)\.(?P<src_port>\d+)\s>\s(?P<dst_ip>[0-9a-fA-F:]+)\.(?P<dst_port>\d+):"),
+        'ip_port_flag_v6': re.compile(r"(?P<src_ip>[0-9a-fA-F:]+)\.(?P<src_port>\d+)\s>\s(?P<dst_ip>[0-9a-fA-F:]+)\.(?P<dst_port>\d+):\sFlags\s\[(?P<flag>[^\]]+)\]"),
+    }
+
+    return pattern
+
+def get_match_group(pattern, line):
+    match = pattern.search(line)
+    if match:
+        if match.groupdict():
+            return match.groupdict()
+        else:
+            return match.group(1)
+    return None
+
+def get_process_fields(line):
+
+    process_info = get_match_group(regex_pattern['process'], line)
+    parent_process_info = get_match_group(regex_pattern['parent_process'], line)
+
+    if process_info:
+        process_cmd = process_info['process_cmd']
+        process_arg = process_info['process_arg']
+        process_name = process_cmd.split("/")[-1]
+    else:
+        process_name = process_cmd = process_arg = 'None'
+
+    if parent_process_info:
+        parent_process_cmd = parent_process_info['parent_process_cmd']
+        parent_process_arg = parent_process_info['parent_process_arg']
+        parent_process_name = parent_process_cmd.split("/")[-1]
+    else:
+        parent_process_name = parent_process_cmd = parent_process_arg = 'None'
+
+    return process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg
+
+def legacy_parse_line(line):
+
+    """Baseline: the per-field search sequence of the original initialize_parsing loop."""
+    prefix = get_match_group(regex_pattern['prefix'], line)
+
+    if not prefix:
+        return None
+
+    network_proto = prefix['network_proto']
+    interface = prefix['interface']
+    direction = prefix['direction']
+    flag = None
+
+    if network_proto == "IP":
+
+        tos = get_match_group(regex_pattern['tos'], line) or 'None'
+        trans_proto = get_match_group(regex_pattern['trans_proto'], line)
+        length = get_match_group(regex_pattern['length'], line)
+        ip_pattern, ip_port_pattern, ip_port_flag_pattern, icmp = 'ip', 'ip_port', 'ip_port_flag', "ICMPv4"
+
+    elif network_proto == "IP6":
+
+        tos = 'None'
+        trans_proto = get_match_group(regex_pattern['trans_proto_v6'], line)
+        length = get_match_group(regex_pattern['length_v6'], line)
+        ip_pattern, ip_port_pattern, ip_port_flag_pattern, icmp = 'ip_v6', 'ip_port_v6', 'ip_port_flag_v6', "ICMPv6"
+
+    elif network_proto == "ARP":
+
+        length = get_match_group(regex_pattern['length'], line)
+        arp_req_info = get_match_group(regex_pattern['arp_req'], line)
+        if arp_req_info:
+            src_ip = arp_req_info['src_ip']
+            desc = f"target_ip: {arp_req_info['target_ip']}"
+        else:
+            arp_rep_info = get_match_group(regex_pattern['arp_rep'], line)
+            if not arp_rep_info:
+                return None
+            src_ip = 'None'
+            desc = f"target_ip: {arp_rep_info['target_ip']}, target_mac: {arp_rep_info['target_mac']}"
+
+        return flow_parser.Packet(interface, direction, network_proto, 'None', 'None', desc, src_ip, 'None', 'None', 'None', 'None', 'None', 'None', 'None', 'None', 'None', int(length), None)
+
+    else:
+        return None
+
+    if trans_proto == "TCP":
+
+        ip_port_flag = get_match_group(regex_pattern[ip_port_flag_pattern], line)
+        if not ip_port_flag:
+            return None
+
+        sni = get_match_group(regex_pattern['sni'], line)
+        desc = f"sni: {sni}" if sni else 'None'
+        return flow_parser.Packet(interface, direction, network_proto, trans_proto, tos, desc, ip_port_flag['src_ip'], ip_port_flag['src_port'], ip_port_flag['dst_ip'], ip_port_flag['dst_port'], *get_process_fields(line), int(length), ip_port_flag['flag'])
+
+    elif trans_proto == "UDP":
+
+        ip_port = get_match_group(regex_pattern[ip_port_pattern], line)
+        if not ip_port:
+            return None
+
+        return flow_parser.Packet(interface, direction, network_proto, trans_proto, tos, 'None', ip_port['src_ip'], ip_port['src_port'], ip_port['dst_ip'], ip_port['dst_port'], *get_process_fields(line), int(length), flag)
+
+    elif trans_proto == icmp:
+
+        ip = get_match_group(regex_pattern[ip_pattern], line)
+        if not ip:
+            return None
+
+        return flow_parser.Packet(interface, direction, network_proto, trans_proto, tos, 'None', ip['src_ip'], 'None', ip['dst_ip'], 'None', 'None', 'None', 'None', 'None', 'None', 'None', int(length), flag)
+
+    return None
+
+def load_lines(path, count):
+
+    if path:
+        with open(path, "r") as f:
+            lines = [line for line in f if line.strip()]
+    else:
+        lines = list(SAMPLE_LINES)
+
+    if not lines:
+        raise ValueError("Corpus contains no lines")
+
+    return (lines * (count // len(lines) + 1))[:count]
+
+def measure(parse, lines, repeat):
+
+    best = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for line in lines:
+            parse(line)
+        elapsed_time = time.perf_counter() - start_time
+        if best is None or elapsed_time < best:
+            best = elapsed_time
+
+    return len(lines) / best
+
+def main():
+
+    global arg
+    arg = parse_arg()
+
+    global regex_pattern
+    regex_pattern = declare_regex_pattern()
+
+    lines = load_lines(arg.corpus, arg.lines)
+
+    # Both parsers have to agree on every field that ends up in a flow key
+    mismatch = 0
+    for line in set(lines):
+        if legacy_parse_line(line) != flow_parser.parse_line(line):
+            mismatch += 1
+            print(f"Mismatch: {line.strip()}")
+
+    legacy_rate = measure(legacy_parse_line, lines, arg.repeat)
+    single_pass_rate = measure(flow_parser.parse_line, lines, arg.repeat)
+
+    print(f"Lines parsed per run : {len(lines)}")
+    print(f"Mismatched lines     : {mismatch}")
+    print(f"declare_regex_pattern: {legacy_rate:,.0f} lines/sec")
+    print(f"flow_parser          : {single_pass_rate:,.0f} lines/sec")
+    print(f"Speedup              : {single_pass_rate / legacy_rate:.2f}x")
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+SAMPLE_LINES = [
+    "eth0 Out IP (tos 0x0, ttl 64, id 48721, offset 0, flags [DF], proto TCP (6), length 60) 10.0.0.5.51514 > 93.184.216.34.443: Flags [S], cksum 0x8c1a (correct), seq 1815245571, win 64240, options [mss 1460,sackOK,TS val 1 ecr 0,nop,wscale 7], length 0, Process (pid 4242, cmd /usr/bin/curl, args curl https://example.com), ParentProc (pid 4100, cmd /usr/bin/bash, args bash)\n",
+    "eth0 Out IP (tos 0x0, ttl 64, id 48722, offset 0, flags [DF], proto TCP (6), length 569) 10.0.0.5.51514 > 93.184.216.34.443: Flags [P.], cksum 0x8c1a (incorrect -> 0x1d2e), seq 1:518, ack 1, win 502, length 517 (SNI=example.com), Process (pid 4242, cmd /usr/bin/curl, args curl https://example.com), ParentProc (pid 4100, cmd /usr/bin/bash, args bash)\n",
+    "eth0 In IP (tos 0x20, ttl 57, id 0, offset 0, flags [DF], proto TCP (6), length 52) 93.184.216.34.443 > 10.0.0.5.51514: Flags [F.], cksum 0x2b3c (correct), seq 1, ack 518, win 501, length 0, Process (pid 4242, cmd /usr/bin/curl, args curl https://example.com), ParentProc (pid 4100, cmd /usr/bin/bash, args bash)\n",
+    "eth0 Out IP (tos 0x0, ttl 64, id 5563, offset 0, flags [DF], proto UDP (17), length 71) 10.0.0.5.41234 > 1.1.1.1.53: 3122+ A? example.com. (43), Process (pid 611, cmd /usr/lib/systemd/systemd-resolved, args systemd-resolved), ParentProc (pid 1, cmd /usr/lib/systemd/systemd, args /sbin/init)\n",
+    "eth0 In IP (tos 0x0, ttl 117, id 23511, offset 0, flags [none], proto ICMPv4 (1), length 84) 8.8.8.8 > 10.0.0.5: ICMP echo reply, id 7, seq 1, length 64\n",
+    "lo In IP6 (flowlabel 0x5e7a2, hlim 64, next-header TCP (6) payload length: 40) ::1.8080 > ::1.36822: Flags [S.], cksum 0x0030 (incorrect -> 0x4b5e), seq 1, ack 2, win 65483, length 0, Process (pid 900, cmd /usr/bin/python3, args python3 -m http.server 8080), ParentProc (pid 880, cmd /usr/bin/zsh, args zsh)\n",
+    "eth0 Out IP6 (flowlabel 0x1a2b3, hlim 255, next-header UDP (17) payload length: 45) fe80::a00:27ff:fe4e:66a1.5353 > ff02::fb.5353: 0 PTR (QM)? _googlecast._tcp.local. (37)\n",
+    "eth0 In IP6 (hlim 255, next-header ICMPv6 (58) payload length: 32) fe80::1 > fe80::a00:27ff:fe4e:66a1: ICMP6, neighbor advertisement, tgt is fe80::1, length 32\n",
+    "eth0 Out ARP, Ethernet (len 6), IPv4 (len 4), Request who-has 10.0.0.1 tell 10.0.0.5, length 28\n",
+    "eth0 In ARP, Ethernet (len 6), IPv4 (len 4), Reply 10.0.0.1 is-at 52:54:00:12:35:02, length 46\n",
+]
+
+# Global Variable -- End
+
+if __name__ == "__main__":
+
+    main()
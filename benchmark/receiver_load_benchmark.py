@@ -0,0 +1,162 @@
+# Import Module -- Start
+
+import sys
+import os
+import ssl
+import time
+import json
+import random
+import asyncio
+import resource
+import argparse
+import platform
+import statistics
+
+import websockets.asyncio.client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire_format
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+def parse_arg():
+
+    # Create the parser object
+    parser = argparse.ArgumentParser(description="Flownix Receiver Connection Load Benchmark, run against a started receiver", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    # Define arguments
+    parser.add_argument('--url', type=str, required=False, default='wss://127.0.0.1:8765', help="Receiver websocket URL")
+    parser.add_argument('--cert', type=str, required=False, default='cert.pem', help="Receiver certificate, as sender_cert_path")
+    parser.add_argument('--connections', type=int, required=False, default=2000, help="Simulated collectors connected at once")
+    parser.add_argument('--windows', type=int, required=False, default=10, help="Windows each collector sends")
+    parser.add_argument('--window-flows', type=int, required=False, default=20, help="Flows per window")
+    parser.add_argument('--interval', type=float, required=False, default=1.0, help="Seconds between the windows of a collector")
+    parser.add_argument('--connect-rate', type=int, required=False, default=200, help="Connections opened per second")
+    parser.add_argument('--format', type=str, required=False, default='binary', choices=wire_format.WIRE_FORMATS, help="Wire format offered to the receiver")
+    parser.add_argument('--seed', type=int, required=False, default=183, help="Random seed")
+    parser.add_argument('--output', type=str, required=False, default='receiver_load_results.json', help="JSON file the results are written to")
+
+    # Parse the arguments
+    arg = parser.parse_args()
+
+    return arg
+
+def make_window(collector, window_flows):
+
+    # Flows of one simulated collector host, its address keeps the keys of the collectors apart
+    local_ip = f"10.{collector >> 16 & 255}.{collector >> 8 & 255}.{collector & 255}"
+
+    return [(
+        ('None', local_ip, str(1024 + index), f"host{index % 50}.example.com", f"93.184.{index % 50}.{index % 200}", '443',
+         'eth0', 'Out', 'IP', 'TCP', '0x0', 'None', 'curl', '/usr/bin/curl', 'curl', 'systemd', '/usr/lib/systemd/systemd', 'systemd'),
+        random.randint(40, 100000),
+    ) for index in range(window_flows)]
+
+async def run_collector(collector, ssl_context, start_time, results):
+
+    # Spread over the ramp, a burst of TLS handshakes would measure the accept backlog instead
+    await asyncio.sleep(max(0, start_time + collector / arg.connect_rate - time.monotonic()))
+
+    try:
+        async with websockets.asyncio.client.connect(arg.url, ssl=ssl_context, subprotocols=wire_format.get_subprotocols(arg.format), open_timeout=60, max_size=None) as ws:
+            results['connected'] += 1
+            results['concurrent_max'] = max(results['concurrent_max'], results['connected'] - results['finished'])
+
+            stream = os.urandom(16)
+            window = make_window(collector, arg.window_flows)
+
+            for seq in range(1, arg.windows + 1):
+                send_time = time.monotonic()
+                await ws.send(wire_format.encode(window, ws.subprotocol, stream, seq))
+
+                status, ack, _ = wire_format.decode_ack(await ws.recv())
+                if status != "secure-ok" or ack != seq:
+                    results['errors'] += 1
+                    continue
+
+                results['latencies'].append(time.monotonic() - send_time)
+                results['acked'] += 1
+                results['bytes'] += sum(total_length for _, total_length in window)
+
+                await asyncio.sleep(arg.interval)
+
+            # Held open until every collector got its windows out, so the receiver keeps them all at once
+            results['finished'] += 1
+            while results['finished'] + results['failed'] < arg.connections:
+                await asyncio.sleep(0.5)
+
+    except Exception as e:
+        results['failed'] += 1
+        results['failures'][type(e).__name__] = results['failures'].get(type(e).__name__, 0) + 1
+
+async def run_collectors():
+
+    ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ssl_context.load_verify_locations(cafile=arg.cert)
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_REQUIRED
+
+    results = {'connected': 0, 'finished': 0, 'failed': 0, 'errors': 0, 'acked': 0, 'bytes': 0, 'concurrent_max': 0, 'latencies': [], 'failures': {}}
+
+    start_time = time.monotonic()
+    await asyncio.gather(*(run_collector(collector, ssl_context, start_time, results) for collector in range(arg.connections)))
+    results['wall_seconds'] = time.monotonic() - start_time
+
+    return results
+
+def raise_file_limit():
+
+    # A socket per simulated collector
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    if hard != resource.RLIM_INFINITY and hard < arg.connections + 64:
+        print(f"Open file limit {hard} is below --connections {arg.connections}, raise it (ulimit -n) for the full load")
+
+def main():
+
+    global arg
+    arg = parse_arg()
+
+    random.seed(arg.seed)
+    raise_file_limit()
+
+    results = asyncio.run(run_collectors())
+    latencies = sorted(results.pop('latencies')) or [0]
+
+    summary = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "url": arg.url,
+        "format": arg.format,
+        "connections": arg.connections,
+        "windows_per_connection": arg.windows,
+        "window_flows": arg.window_flows,
+        "interval": arg.interval,
+        **results,
+        "windows_per_sec": results['acked'] / results['wall_seconds'],
+        "ack_ms_p50": statistics.median(latencies) * 1000,
+        "ack_ms_p99": latencies[int(len(latencies) * 0.99)] * 1000 if len(latencies) > 1 else latencies[0] * 1000,
+        "ack_ms_max": latencies[-1] * 1000,
+    }
+
+    print(f"{summary['connected']}/{arg.connections} collectors connected (max {summary['concurrent_max']} at once), {summary['failed']} failed {summary['failures'] or ''}")
+    print(f"{summary['acked']}/{arg.connections * arg.windows} windows acked, {summary['errors']} errors, {summary['windows_per_sec']:,.0f} windows/sec over {summary['wall_seconds']:.1f}s")
+    print(f"Ack latency: p50 {summary['ack_ms_p50']:.1f} ms, p99 {summary['ack_ms_p99']:.1f} ms, max {summary['ack_ms_max']:.1f} ms")
+    print(f"Bytes acked: {summary['bytes']}, compare with SELECT SUM(total_length) FROM receiver_traffic on a fresh receiver database")
+
+    with open(arg.output, "w") as f:
+        json.dump(summary, f, indent=4)
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+# Global Variable -- End
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,205 @@
+# Import Module -- Start
+
+import sys
+import os
+import time
+import json
+import queue
+import random
+import sqlite3
+import argparse
+import platform
+import tempfile
+import collections
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import collector
+import dns_cache
+import flow_schema
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+def parse_arg():
+
+    # Create the parser object
+    parser = argparse.ArgumentParser(description="Flownix Traffic Table Upsert Benchmark", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    # Define arguments
+    parser.add_argument('--table-flows', type=str, required=False, default='1000,100000,1000000', help="Comma-separated traffic table sizes (rows) to benchmark against")
+    parser.add_argument('--window-flows', type=int, required=False, default=10000, help="Flows per written window")
+    parser.add_argument('--windows', type=int, required=False, default=5, help="Windows written per table size")
+    parser.add_argument('--update-ratio', type=float, required=False, default=0.8, help="Share of window flows already in the table (updates rather than inserts)")
+    parser.add_argument('--seed', type=int, required=False, default=183, help="Random seed")
+    parser.add_argument('--output', type=str, required=False, default='upsert_results.json', help="JSON file the results are written to")
+
+    # Parse the arguments
+    arg = parser.parse_args()
+
+    return arg
+
+def make_key(index):
+
+    # Unique per index, shaped like a real flow key (see flow_key.FLOW_KEY_FIELDS): hosts come from
+    # fixed pools as on a real network, the ephemeral source port keeps the keys apart
+    local_host = index % LOCAL_HOSTS
+    remote_host = index * 7919 % REMOTE_HOSTS
+
+    return (
+        'None', f"10.0.{local_host >> 8}.{local_host & 255}", str(1024 + index // LOCAL_HOSTS),
+        'example.com', f"93.{remote_host >> 16}.{remote_host >> 8 & 255}.{remote_host & 255}", '443',
+        'eth0', 'Out', 'IP', 'TCP', '0x0', 'sni: example.com',
+        'curl', '/usr/bin/curl', 'curl https://example.com', 'bash', '/usr/bin/bash', 'bash',
+    )
+
+def setup_collector(db_path):
+
+    collector.config = {"collector": {"local_db_path": db_path, "remote_forwarding": False}}
+    collector.dns = dns_cache.DnsCache()
+    collector.pipeline_stats = collections.defaultdict(float)
+    collector.data_queue = queue.Queue()
+
+def create_legacy_traffic_table(c):
+
+    # The flat 18-column TEXT primary key layout used before flow_schema
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS traffic (
+            src_domain TEXT, src_ip TEXT, src_port TEXT, dst_domain TEXT, dst_ip TEXT, dst_port TEXT,
+            interface TEXT, direction TEXT, network_proto TEXT, trans_proto TEXT, tos TEXT, desc TEXT,
+            process_name TEXT, process_cmd TEXT, process_arg TEXT, parent_process_name TEXT, parent_process_cmd TEXT, parent_process_arg TEXT,
+            total_length INTEGER,
+            last_updated TEXT DEFAULT (datetime('now','localtime')),
+            PRIMARY KEY (src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg)
+        )
+    ''')
+
+def populate(db_path, table_flows, legacy):
+
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+
+    if legacy:
+        create_legacy_traffic_table(c)
+        c.executemany('''
+            INSERT INTO traffic (src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg, total_length)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', ((*make_key(index), 1000) for index in range(table_flows)))
+    else:
+        collector.create_traffic_table(c)
+        flow_schema.clear_cache()
+        for start in range(0, table_flows, 100000):
+            flow_schema.upsert_flows(c, [(make_key(index), 1000) for index in range(start, min(start + 100000, table_flows))], time.time())
+
+    conn.commit()
+    conn.close()
+
+def make_windows(table_flows):
+
+    windows = []
+    next_index = table_flows
+
+    for _ in range(arg.windows):
+        window = {}
+        for _ in range(arg.window_flows):
+            if random.random() < arg.update_ratio:
+                index = random.randrange(table_flows)
+            else:
+                index = next_index
+                next_index += 1
+            window[make_key(index)] = random.randint(40, 150000)
+        windows.append(window)
+
+    return windows
+
+def legacy_write_traffic_table(length_sums, c):
+
+    # Row-by-row upsert into the flat table as db_worker did before batching and normalization, kept as the baseline
+    for key, total_length in length_sums.items():
+        try:
+            c.execute('''
+                INSERT INTO traffic (src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg, total_length, last_updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now', 'localtime'))
+                ON CONFLICT(src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg)
+                DO UPDATE SET total_length = total_length + excluded.total_length, last_updated = datetime('now', 'localtime')
+            ''', (*key, total_length))
+        except Exception as e:
+            print(f"Exception message: {e}")
+
+def benchmark_writer(db_path, windows, write):
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    c = conn.cursor()
+
+    start_time = time.perf_counter()
+    for length_sums in windows:
+        write(length_sums, c)
+    conn.commit()
+    elapsed_time = time.perf_counter() - start_time
+
+    table_rows = c.execute("SELECT COUNT(*) FROM traffic").fetchone()[0]
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+    conn.close()
+
+    rows = sum(len(length_sums) for length_sums in windows)
+
+    return {
+        "seconds": elapsed_time,
+        "rows": rows,
+        "rows_per_sec": rows / elapsed_time,
+        "table_rows_after": table_rows,
+        "db_bytes": os.path.getsize(db_path),
+    }
+
+def main():
+
+    global arg
+    arg = parse_arg()
+
+    random.seed(arg.seed)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "window_flows": arg.window_flows,
+        "windows": arg.windows,
+        "update_ratio": arg.update_ratio,
+        "tables": {},
+    }
+
+    for table_flows in [int(table_flows) for table_flows in arg.table_flows.split(",") if table_flows]:
+        windows = make_windows(table_flows)
+        result = {}
+
+        for name, write, legacy in (("row_by_row", legacy_write_traffic_table, True), ("executemany", collector.write_traffic_table, False)):
+            with tempfile.TemporaryDirectory() as temp_dir:
+                db_path = os.path.join(temp_dir, f"{name}.db")
+                populate(db_path, table_flows, legacy)
+                setup_collector(db_path)
+                flow_schema.clear_cache()
+                result[name] = benchmark_writer(db_path, windows, write)
+
+        result["speedup"] = result["executemany"]["rows_per_sec"] / result["row_by_row"]["rows_per_sec"]
+        results["tables"][str(table_flows)] = result
+
+        print(f"{table_flows:>9} flows: row_by_row {result['row_by_row']['rows_per_sec']:,.0f} rows/sec ({result['row_by_row']['db_bytes'] / 1048576:.1f} MiB), executemany {result['executemany']['rows_per_sec']:,.0f} rows/sec ({result['executemany']['db_bytes'] / 1048576:.1f} MiB), {result['speedup']:.2f}x")
+
+    with open(arg.output, "w") as f:
+        json.dump(results, f, indent=4)
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+LOCAL_HOSTS = 4096
+
+REMOTE_HOSTS = 65536
+
+# Global Variable -- End
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,143 @@
+# Import Module -- Start
+
+import sys
+import os
+import time
+import json
+import random
+import argparse
+import platform
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire_format
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+def parse_arg():
+
+    # Create the parser object
+    parser = argparse.ArgumentParser(description="Flownix Forwarding Wire Format Benchmark", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    # Define arguments
+    parser.add_argument('--window-flows', type=str, required=False, default='1000,10000,100000', help="Comma-separated flows per forwarded window")
+    parser.add_argument('--levels', type=str, required=False, default='1,6,9', help="Comma-separated zlib levels of the compressed binary format")
+    parser.add_argument('--repeat', type=int, required=False, default=5, help="Runs per format, the median is reported")
+    parser.add_argument('--seed', type=int, required=False, default=183, help="Random seed")
+    parser.add_argument('--output', type=str, required=False, default='wire_results.json', help="JSON file the results are written to")
+
+    # Parse the arguments
+    arg = parser.parse_args()
+
+    return arg
+
+def make_key(index):
+
+    # Shaped like a real flow key (see flow_key.FLOW_KEY_FIELDS): hosts from fixed pools, a handful of
+    # interfaces/protocols and a few dozen processes, the ephemeral source port keeps the keys apart
+    local_host = index % LOCAL_HOSTS
+    remote_host = index * 7919 % REMOTE_HOSTS
+    descriptor = DESCRIPTORS[index % len(DESCRIPTORS)]
+    process = index * 31 % PROCESSES
+
+    return (
+        'None', f"10.0.{local_host >> 8}.{local_host & 255}", str(1024 + index // LOCAL_HOSTS % 64000),
+        f"host{remote_host % 5000}.example.com", f"93.{remote_host >> 16}.{remote_host >> 8 & 255}.{remote_host & 255}", random.choice(REMOTE_PORTS),
+        *descriptor,
+        f"process{process}", f"/usr/bin/process{process}", f"process{process} --serve", 'systemd', '/usr/lib/systemd/systemd', 'systemd',
+    )
+
+def make_window(window_flows):
+    return [(make_key(index), random.randint(40, 10000000)) for index in range(window_flows)]
+
+def get_formats():
+
+    # (name, subprotocol, zlib level); the legacy JSON exchange also has the whole window echoed back in the reply
+    formats = [("json_legacy", None, 0), ("json", wire_format.JSON_SUBPROTOCOL, 0), ("binary", wire_format.BINARY_SUBPROTOCOL, 0)]
+    formats += [(f"binary_zlib{level}", wire_format.BINARY_SUBPROTOCOL, level) for level in [int(level) for level in arg.levels.split(",") if level]]
+
+    return formats
+
+def benchmark_format(items, subprotocol, level):
+
+    encode_times = []
+    decode_times = []
+
+    for _ in range(arg.repeat):
+        # CPU time, the forwarding thread shares the collector's cores with the parsing
+        start_time = time.process_time()
+        message = wire_format.encode(items, subprotocol, STREAM, 1, level)
+        encode_times.append(time.process_time() - start_time)
+
+        start_time = time.process_time()
+        _, seq, data = wire_format.decode(message)
+        decode_times.append(time.process_time() - start_time)
+
+    ack = wire_format.encode_ack(subprotocol, data, ack=seq, stored=seq)
+
+    message_bytes = len(message.encode() if isinstance(message, str) else message)
+    ack_bytes = len(ack.encode())
+
+    # Per 10k flows, to compare window sizes
+    scale = 10000 / len(items)
+
+    return {
+        "message_bytes": message_bytes,
+        "ack_bytes": ack_bytes,
+        "wire_bytes_per_10k": (message_bytes + ack_bytes) * scale,
+        "encode_ms_per_10k": statistics.median(encode_times) * 1000 * scale,
+        "decode_ms_per_10k": statistics.median(decode_times) * 1000 * scale,
+    }
+
+def main():
+
+    global arg
+    arg = parse_arg()
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "repeat": arg.repeat,
+        "windows": {},
+    }
+
+    for window_flows in [int(window_flows) for window_flows in arg.window_flows.split(",") if window_flows]:
+        random.seed(arg.seed)
+        items = make_window(window_flows)
+
+        result = {name: benchmark_format(items, subprotocol, level) for name, subprotocol, level in get_formats()}
+        results["windows"][str(window_flows)] = result
+
+        baseline = result["json_legacy"]["wire_bytes_per_10k"]
+
+        print(f"{window_flows} flows per window, per 10k flows:")
+        for name, measured in result.items():
+            print(f"  {name:<14} {measured['wire_bytes_per_10k'] / 1024:>9,.1f} KiB on wire ({baseline / measured['wire_bytes_per_10k']:>5.1f}x smaller), encode {measured['encode_ms_per_10k']:>7.1f} ms, decode {measured['decode_ms_per_10k']:>7.1f} ms")
+
+    with open(arg.output, "w") as f:
+        json.dump(results, f, indent=4)
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+STREAM = bytes(16)  # stream id of the sequenced formats
+
+LOCAL_HOSTS = 4096
+
+REMOTE_HOSTS = 65536
+
+REMOTE_PORTS = ('443', '80', '53', '22', '8080', '5353')
+
+PROCESSES = 60
+
+DESCRIPTORS = [(interface, direction, 'IP', trans_proto, '0x0', 'None') for interface in ('eth0', 'wlan0') for direction in ('In', 'Out') for trans_proto in ('TCP', 'UDP')]
+
+# Global Variable -- End
+
+if __name__ == "__main__":
+
+    main()
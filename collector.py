@@ -9,15 +9,25 @@ import os
 import re
 import time
 import sqlite3
-import socket
 import argparse
 import collections
+import multiprocessing
 import traceback
 import websockets.sync.client
 import ssl
 import json
 import pathlib
-import copy
+import selectors
+import flow_parser
+import flow_key
+import dns_resolver
+import dns_cache
+import flow_schema
+import flow_archive
+import spill_queue
+import forward_spool
+import wire_format
+import db_tuning
 
 # Import Module -- End
 
@@ -35,6 +45,9 @@ def parse_arg():
 
     # Define arguments
     parser.add_argument('--config-path', type=str, required=False, default='config/flownix.json', help="Configuration file path")
+    parser.add_argument('--replay', type=str, required=False, default=None, help="Replay recorded ptcpdump --oneline -v output from a file ('-' for stdin) instead of capturing live")
+    parser.add_argument('--parsing-workers', type=int, required=False, default=None, help="Number of parsing worker processes, overrides 'parsing_workers' in the configuration")
+    parser.add_argument('--replay-paced', action='store_true', help="Pace the replay by the capture timestamps leading each line (as printed without -t)")
 
     # Parse the arguments
     arg = parser.parse_args()
@@ -70,27 +83,77 @@ def initialize_websocket():
     ssl_context.check_hostname = False      # disable hostname check (since self-signed CN may not match IP)
     ssl_context.verify_mode = ssl.CERT_REQUIRED
 
+    # Binary framing when the receiver negotiates it, JSON with receivers that predate it
+    subprotocols = wire_format.get_subprotocols(config["collector"].get("forward_format", "binary"))
+
+    # Windows are read from the forward spool in order, numbered within its stream. Up to forward_window of them are
+    # sent ahead of the receiver's cumulative ack, but they stay spooled until its stored ack reports them committed
+    # to its database. After a reconnect the spool is read again from the first window not stored and the receiver
+    # drops those it already took
+    in_flight = collections.deque()  # (sequence number, sent sequenced) of the windows not acknowledged yet
+    window_size = max(1, config["collector"].get("forward_window", 8))
+
     while not shutdown_event.is_set():
         try:
-           with websockets.sync.client.connect(f'wss://{config["collector"]["sender_wss_ip"]}:{config["collector"]["sender_wss_port"]}', ssl=ssl_context, open_timeout=5, close_timeout=5) as ws:
+           with websockets.sync.client.connect(f'wss://{config["collector"]["sender_wss_ip"]}:{config["collector"]["sender_wss_port"]}', ssl=ssl_context, open_timeout=5, close_timeout=5, subprotocols=subprotocols) as ws:
+
+                print(f'Connected to wss://{config["collector"]["sender_wss_ip"]}:{config["collector"]["sender_wss_port"]} ({ws.subprotocol or "json"}).')
+
+                # A receiver without sequence numbers cannot tell a window sent again from a new one, it gets one at a time and nothing twice
+                sequenced = ws.subprotocol is not None
+                limit = window_size if sequenced else 1
 
-                print(f'Connected to wss://{config["collector"]["sender_wss_ip"]}:{config["collector"]["sender_wss_port"]}.')
+                # Handled as the connection they were sent over, which may have negotiated the other way
+                unsequenced = [seq for seq, sent_sequenced in in_flight if not sent_sequenced]
+                if unsequenced:
+                    data_queue.ack(unsequenced[-1])
+                if len(in_flight) > len(unsequenced):
+                    print(f"Resending {len(in_flight) - len(unsequenced)} unacknowledged windows")
+                    pipeline_stats['forward_resent'] += len(in_flight) - len(unsequenced)
+
+                in_flight.clear()
+                data_queue.rewind()
 
                 while not shutdown_event.is_set():  # inner send/receive loop
                     try:
-                        data = data_queue.get(timeout=1)
-                        ws.send(json.dumps(data))
-                        print(f"Sent: {data}")
+                        # Fill the window from the spool, only waiting for data while nothing is outstanding
+                        records = data_queue.read(limit - len(in_flight), timeout=0 if in_flight else 1) if len(in_flight) < limit else []
+
+                        for seq, message in records:
+                            # Spooled in the binary format, the other formats are encoded from its items
+                            if ws.subprotocol != wire_format.BINARY_SUBPROTOCOL:
+                                message = wire_format.encode(wire_format.decode_binary(message)[2], ws.subprotocol, data_queue.stream, seq)
+
+                            in_flight.append((seq, sequenced))
+                            ws.send(message)
+                            print(f"Sent window {seq} ({len(message)} bytes)")
+
+                            pipeline_stats['forwarded'] += 1
+                            pipeline_stats['forward_in_flight_max'] = max(pipeline_stats['forward_in_flight_max'], len(in_flight))
+
+                        if not in_flight:
+                            continue  # no data, check shutdown_event again
+
+                        try:
+                            reply = ws.recv(timeout=1)
+                        except TimeoutError:
+                            continue
 
-                        reply = ws.recv()
                         print(f"Server replied: {reply}")
 
-                        data_queue.task_done()
+                        status, ack, stored = wire_format.decode_ack(reply)
+                        if not sequenced:
+                            ack = in_flight[0][0]  # one reply per window
+                        if stored is None:
+                            stored = ack  # a receiver that acks windows as it takes them
 
-                    except queue.Empty:
-                        continue  # no data, check shutdown_event again
+                        if ack is not None:
+                            while in_flight and in_flight[0][0] <= ack:
+                                in_flight.popleft()
+                        if stored is not None:
+                            data_queue.ack(stored)
 
-                    except websockets.exceptions.ConnectionClosedError as e:
+                    except websockets.exceptions.ConnectionClosed as e:
                         print(f"WebSocket connection closed: {e}, reconnecting...")
                         print(f"Exception type: {type(e).__name__}")
                         print(f"Exception args: {e.args}")
@@ -117,487 +180,513 @@ def initialize_websocket():
             print(f"Exception message: {e}")
             traceback.print_exc()
 
-def declare_regex_pattern():
-
-    pattern = {
-        'prefix': re.compile(r"^(?P<interface>\S+)\s(?P<direction>In|Out)\s(?P<network_proto>[^,\r\n\t\f\v ]+)"),
-        'tos': re.compile(r"tos\s(\S+)\,"),
-        'trans_proto': re.compile(r"proto\s(\S+)\s"),
-        'length': re.compile(r"length\s(\d+)"),
-        'ip': re.compile(r"(?P<src_ip>\d+\.\d+\.\d+\.\d+)\s>\s(?P<dst_ip>\d+\.\d+\.\d+\.\d+):"),
-        'arp_req': re.compile(r"who-has\s(?P<target_ip>\d+\.\d+\.\d+\.\d+)\stell\s(?P<src_ip>\d+\.\d+\.\d+\.\d+)\,"),
-        'arp_rep': re.compile(r"Reply\s(?P<target_ip>\d+\.\d+\.\d+\.\d+)\sis-at\s(?P<target_mac>[0-9a-fA-F]{2}(:[0-9a-fA-F]{2}){5})\,"),
-        'ip_port': re.compile(r"(?P<src_ip>\d+\.\d+\.\d+\.\d+)\.(?P<src_port>\d+)\s>\s(?P<dst_ip>\d+\.\d+\.\d+\.\d+)\.(?P<dst_port>\d+):"),
-        'ip_port_flag': re.compile(r"(?P<src_ip>\d+\.\d+\.\d+\.\d+)\.(?P<src_port>\d+)\s>\s(?P<dst_ip>\d+\.\d+\.\d+\.\d+)\.(?P<dst_port>\d+):\sFlags\s\[(?P<flag>[^\]]+)\]"),
-        'process': re.compile(r"Process\s\(pid\s(?P<process_pid>\d+)\,\scmd\s(?P<process_cmd>[^,]*)\,\sargs\s(?P<process_arg>[^,]*)\)\,"),
-        'parent_process': re.compile(r"ParentProc\s\(pid\s(?P<parent_process_pid>\d+)\,\scmd\s(?P<parent_process_cmd>[^,]*)\,\sargs\s(?P<parent_process_arg>[^,]*)\)"),
-        'sni': re.compile(r"SNI=(\S+)\)"),
-        'trans_proto_v6': re.compile(r"next-header\s(\S+)\s"),
-        'length_v6': re.compile(r"length:\s(\d+)"),
-        'ip_v6': re.compile(r"(?P<src_ip>[0-9a-fA-F:]+)\s>\s(?P<dst_ip>[0-9a-fA-F:]+):"),
-        'ip_port_v6': re.compile(r"(?P<src_ip>[0-9a-fA-F:]+)\.(?P<src_port>\d+)\s>\s(?P<dst_ip>[0-9a-fA-F:]+)\.(?P<dst_port>\d+):"),
-        'ip_port_flag_v6': re.compile(r"(?P<src_ip>[0-9a-fA-F:]+)\.(?P<src_port>\d+)\s>\s(?P<dst_ip>[0-9a-fA-F:]+)\.(?P<dst_port>\d+):\sFlags\s\[(?P<flag>[^\]]+)\]"),
-    }
-
-    return pattern
-
-# Helper function to safely extract groups (either named or unnamed)
-def get_match_group(pattern, line):
-    match = pattern.search(line)
-    if match:
-        # Check if there are named groups
-        if match.groupdict():  # groupdict() will return a non-empty dictionary if named groups exist
-            return match.groupdict()  # Return a dictionary of named groups
-        else:
-            return match.group(1)  # Return a tuple of unnamed groups
-    return None  # Return None if no match is found
-
 def get_domain_by_ip(ip):
-    """Resolve the domain name (hostname) from an IP address."""
-    # Check if the domain is in cache first
-    if ip in dns:
-        return dns[ip]
-
-    try:
-        # Perform reverse DNS lookup to get the hostname for the given IP address
-        hostname, _, _ = socket.gethostbyaddr(ip)
-        dns[ip] = hostname
-        return hostname
-    except (socket.herror, socket.gaierror):
-        # If DNS lookup fails, return the IP as is and cache it
-        dns[ip] = 'None'
-        return 'None'
-
-# Function to load DNS cache from the database
-def read_dns_table():
-
-    """Load DNS cache from the database into the global dns dictionary."""
-    conn = sqlite3.connect(config["collector"]["local_db_path"])
-    c = conn.cursor()
-
-    # Select all entries from the dns table
-    c.execute("SELECT ip, domain FROM dns")
-    rows = c.fetchall()
+    """Return the cached domain for an IP, the lookup itself runs in the background resolver."""
+    return dns_resolver.resolve(ip)
 
-    # Populate the dns dictionary with data from the database
-    for row in rows:
-        ip, domain = row
-        dns[ip] = domain  # Store in the global cache
-
-    conn.close()
+def create_dns_cache(track_loaded=False):
 
-def write_dns_table():
+    """Build the bounded DNS cache backed by the local dns table."""
+    return dns_cache.DnsCache(
+        config["collector"]["local_db_path"],
+        config["collector"].get("dns_cache_size", 65536),
+        config["collector"].get("dns_ttl", 3600),
+        config["collector"].get("dns_negative_ttl", 300),
+        track_loaded,
+    )
 
-    """Write or update the DNS cache to the database."""
-    conn = sqlite3.connect(config["collector"]["local_db_path"])
-    c = conn.cursor()
+def create_dns_table(c):
 
     # Create the dns table
     c.execute('''
         CREATE TABLE IF NOT EXISTS dns (
             ip TEXT PRIMARY KEY,
-            domain TEXT
+            domain TEXT,
+            resolved_at REAL
         )
     ''')
 
-    conn.commit()
+    # Tables from older releases have no resolved_at, their rows count as expired and get resolved again
+    columns = [row[1] for row in c.execute("PRAGMA table_info(dns)")]
+    if "resolved_at" not in columns:
+        c.execute("ALTER TABLE dns ADD COLUMN resolved_at REAL")
 
-    # Iterate through the DNS cache and update or insert each record
-    for ip, domain in dns.items():
-        c.execute('''
-            INSERT INTO dns (ip, domain)
-            VALUES (?, ?)
-            ON CONFLICT(ip)
-            DO UPDATE SET domain = excluded.domain
-        ''', (ip, domain))
+def write_dns_table(c):
 
-    conn.commit()
-    conn.close()
+    """Persist the DNS entries resolved since the last call, the caller commits."""
+    dirty = dns.take_dirty()
 
-def write_traffic_table(length_sums, tcp_session, c):
+    if not dirty:
+        return
 
-    items_to_process = list(length_sums.items())
+    c.executemany('''
+        INSERT INTO dns (ip, domain, resolved_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(ip)
+        DO UPDATE SET domain = excluded.domain, resolved_at = excluded.resolved_at
+    ''', [(ip, domain, resolved_at) for ip, (domain, resolved_at) in dirty.items()])
 
-    for tcp_session_key, session_data in tcp_session.items():
-        if "key" in session_data:
-            items_to_process.extend(list(session_data["key"].items()))
+    pipeline_stats['dns_persisted'] += len(dirty)
 
-    if config["collector"]["remote_forwarding"]:
-        data_queue.put(copy.deepcopy(items_to_process))
+def fill_domains(length_sums):
 
-    for key, total_length in items_to_process:
-        try:
-            key_src, key_dst, key_etc, key_process, key_parent_process = key.split(" ~~~ ")
-            src_domain, src_ip, src_port = key_src.split(" ~~ ")
-            dst_domain, dst_ip, dst_port = key_dst.split(" ~~ ")
-            interface, direction, network_proto, trans_proto, tos, desc = key_etc.split(" ~~ ")
-            process_name, process_cmd, process_arg = key_process.split(" ~~ ")
-            parent_process_name, parent_process_cmd, parent_process_arg = key_parent_process.split(" ~~ ")
-
-            # Insert or update in the database
-            c.execute('''
-                INSERT INTO traffic (src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg, total_length, last_updated)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now', 'localtime'))
-                ON CONFLICT(src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg)
-                DO UPDATE SET total_length = total_length + excluded.total_length, last_updated = datetime('now', 'localtime')
-            ''', (src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg, total_length))
+    """Fill in domains whose lookup completed after the packets were aggregated, returns the window as (key, total_length) items.
 
-        except Exception as e:
-            print(f"Exception type: {type(e).__name__}")
-            print(f"Exception args: {e.args}")
-            print(f"Exception message: {e}")
-            traceback.print_exc()
+    A flow aggregated both before and after its lookup completed ends up under one key, with the sum of both.
+    """
+    filled = {}
 
-def initialize_parsing():
+    for key, total_length in length_sums.items():
+        src_domain = dns.get(key[1], 'None') if key[0] == 'None' else key[0]
+        dst_domain = dns.get(key[4], 'None') if key[3] == 'None' else key[3]
 
-    length_sums = collections.defaultdict(int)
-    tcp_session = collections.defaultdict(lambda: collections.defaultdict(dict))
+        if src_domain != key[0] or dst_domain != key[3]:
+            key = (src_domain, key[1], key[2], dst_domain) + key[4:]
 
-    command = [os.path.join(get_runtime_path(), "assets/ptcpdump"), "-i", "any", "--oneline", "-n", "-t", "-v"]
+        filled[key] = filled.get(key, 0) + total_length
 
-    process = subprocess.Popen(command, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=1)
+    return list(filled.items())
 
-    try:
-        while not shutdown_event.is_set():
-            start_time = time.time()
-            for line in process.stdout:
-                # print(f"Captured packet: {line.strip()}")
-                # print(line.split(' ')[2])
-                # start_time_test = time.time()
-                prefix = get_match_group(regex_pattern['prefix'], line)
+def write_traffic_table(length_sums, c, archive=None):
 
-                if not prefix:
-                    pass
-                    # print(f"Captured unprefixed packet: {line.strip()}")
+    # The window is owned by the DB worker now, nothing else touches it
+    items_to_process = fill_domains(length_sums)
 
-                else:
+    pipeline_stats['flows'] += len(items_to_process)
+
+    if config["collector"]["remote_forwarding"]:
+        data_queue.put(items_to_process)  # appended to the forward spool, the websocket thread reads it from there
+
+    if archive:
+        # Buffered in memory, only the window closing a segment pays for writing it out
+        stage_time = time.perf_counter()
+        try:
+            archive.add(items_to_process, time.time())
+        except Exception as e:
+            print("Archive write error:", e)
+        pipeline_stats['archive'] += time.perf_counter() - stage_time
+
+    try:
+        # Open the group-commit transaction first, otherwise RELEASE of the outermost savepoint would commit
+        if not c.connection.in_transaction:
+            c.execute("BEGIN")
 
-                    network_proto = prefix['network_proto']
-                    interface = prefix['interface']
-                    direction = prefix['direction']
-                    # print(time.time() - start_time_test)
-                    # print(prefix['network_proto'])
-                    if network_proto == "IP":
+        # One savepoint per window, a failing window is rolled back as a whole and the transaction carries on
+        c.execute("SAVEPOINT window")
+        flow_schema.upsert_flows(c, items_to_process, time.time())
+        c.execute("RELEASE window")
 
-                        tos = get_match_group(regex_pattern['tos'], line)
-                        trans_proto = get_match_group(regex_pattern['trans_proto'], line)
-                        length = get_match_group(regex_pattern['length'], line)
+    except Exception as e:
+        print(f"Exception type: {type(e).__name__}")
+        print(f"Exception args: {e.args}")
+        print(f"Exception message: {e}")
+        traceback.print_exc()
 
-                        if trans_proto == "TCP":
+        if c.connection.in_transaction:
+            c.execute("ROLLBACK TO window")
+            c.execute("RELEASE window")
+        flow_schema.clear_cache()  # ids inserted by the rolled back window no longer exist
 
-                            ip_port_flag = get_match_group(regex_pattern['ip_port_flag'], line)
+        return 0
 
-                            if not ip_port_flag:
+    return len(items_to_process)
 
-                                print(f"Captured IP-TCP packet without ip_port_flag pattern: {line.strip()}")
+def aggregate_packet(packet, length_sums, tcp_session):
 
-                            else:
+    interface, direction, network_proto, trans_proto, tos, desc, src_ip, src_port, dst_ip, dst_port, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg, length, flag = packet
 
-                                src_ip = ip_port_flag['src_ip']
-                                src_port = ip_port_flag['src_port']
-                                dst_ip = ip_port_flag['dst_ip']
-                                dst_port = ip_port_flag['dst_port']
+    src_domain = get_domain_by_ip(src_ip) if src_ip != 'None' else 'None'
+    dst_domain = get_domain_by_ip(dst_ip) if dst_ip != 'None' else 'None'
 
-                                flag = ip_port_flag['flag']
+    if trans_proto == "TCP":
 
-                                process_info = get_match_group(regex_pattern['process'], line)
-                                parent_process_info = get_match_group(regex_pattern['parent_process'], line)
+        endpoint = sorted([(src_ip, src_port), (dst_ip, dst_port)])
+        tcp_session_key = (endpoint[0], endpoint[1], interface)
 
-                                if process_info:
+        # Only connection state lives here, the bytes go to the window like every other flow.
+        # The OrderedDict is kept in last-seen order, so the oldest sessions are always at the front.
+        info = tcp_session.get(tcp_session_key)
 
-                                    process_cmd = process_info['process_cmd']
-                                    process_arg = process_info['process_arg']
+        if info is None:
+            info = tcp_session[tcp_session_key] = {"finish": 0}
 
-                                    if "/" in process_info['process_cmd']:
-                                        process_name = process_info['process_cmd'].split("/")[-1]
-                                    else:
-                                        process_name = process_info['process_cmd']
-                                else:
-                                    process_name = process_cmd = process_arg = 'None'
+            if len(tcp_session) > tcp_session_limit:
+                tcp_session.popitem(last=False)
+                pipeline_stats['sessions_evicted'] += 1
+        else:
+            tcp_session.move_to_end(tcp_session_key)
 
-                                if parent_process_info:
+        info["last_seen"] = time.monotonic()
 
-                                    parent_process_cmd = parent_process_info['parent_process_cmd']
-                                    parent_process_arg = parent_process_info['parent_process_arg']
+        if desc.startswith("sni"):
+            info["sni"] = desc
 
-                                    if "/" in parent_process_info['parent_process_cmd']:
-                                        parent_process_name = parent_process_info['parent_process_cmd'].split("/")[-1]
-                                    else:
-                                        parent_process_name = parent_process_info['parent_process_cmd']
-                                else:
-                                    parent_process_name = parent_process_cmd = parent_process_arg = 'None'
+        if "sni" in info:
+            desc = info["sni"]
 
+        if "R" in flag:
 
-                                src_domain = get_domain_by_ip(ip_port_flag['src_ip'])
-                                dst_domain = get_domain_by_ip(ip_port_flag['dst_ip'])
+            del tcp_session[tcp_session_key]
+            pipeline_stats['sessions_finished'] += 1
 
-                                sni = get_match_group(regex_pattern['sni'], line)
+        elif "F" in flag and info["finish"] != 2:
 
-                                if sni:
+            info["finish"] += 1
 
-                                    desc = f"sni: {sni}"
+        elif "F" in flag and info["finish"] == 2:
 
-                                else:
+            del tcp_session[tcp_session_key]
+            pipeline_stats['sessions_finished'] += 1
 
-                                    desc = 'None'
+    key = (src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg)
 
-                        elif trans_proto == "UDP":
+    # Tuple hashes are not cached, so each key is looked up as few times as possible
+    total_length = length_sums.get(key)
 
-                            ip_port = get_match_group(regex_pattern['ip_port'], line)
+    if total_length is None:
+        length_sums[flow_key.intern_key(key)] = length
+    else:
+        length_sums[key] = total_length + length
 
-                            src_ip = ip_port['src_ip']
-                            src_port = ip_port['src_port']
-                            dst_ip = ip_port['dst_ip']
-                            dst_port = ip_port['dst_port']
+def set_session_limits():
 
-                            process_info = get_match_group(regex_pattern['process'], line)
-                            parent_process_info = get_match_group(regex_pattern['parent_process'], line)
+    global tcp_session_timeout
+    tcp_session_timeout = config["collector"].get("tcp_session_timeout", 300)
 
-                            if process_info:
+    global tcp_session_limit
+    tcp_session_limit = config["collector"].get("tcp_session_limit", 65536)
 
-                                process_cmd = process_info['process_cmd']
-                                process_arg = process_info['process_arg']
+def expire_sessions(tcp_session):
 
-                                if "/" in process_info['process_cmd']:
-                                    process_name = process_info['process_cmd'].split("/")[-1]
-                                else:
-                                    process_name = process_info['process_cmd']
-                            else:
-                                process_name = process_cmd = process_arg = 'None'
+    """Drop sessions idle for longer than tcp_session_timeout, e.g. lost FINs, NAT timeouts or half-open scans."""
+    deadline = time.monotonic() - tcp_session_timeout
+    expired = []
 
-                            if parent_process_info:
+    for tcp_session_key, info in tcp_session.items():
+        if info["last_seen"] > deadline:
+            break  # everything after this was seen more recently
+        expired.append(tcp_session_key)
 
-                                parent_process_cmd = parent_process_info['parent_process_cmd']
-                                parent_process_arg = parent_process_info['parent_process_arg']
+    for tcp_session_key in expired:
+        del tcp_session[tcp_session_key]
 
-                                if "/" in parent_process_info['parent_process_cmd']:
-                                    parent_process_name = parent_process_info['parent_process_cmd'].split("/")[-1]
-                                else:
-                                    parent_process_name = parent_process_info['parent_process_cmd']
-                            else:
-                                parent_process_name = parent_process_cmd = parent_process_arg = 'None'
+    pipeline_stats['sessions_expired'] += len(expired)
+    pipeline_stats['sessions_live'] = len(tcp_session)
 
+def flush_window(length_sums):
 
-                            src_domain = get_domain_by_ip(ip_port['src_ip'])
-                            dst_domain = get_domain_by_ip(ip_port['dst_ip'])
+    """Hand the current window over to the DB worker and return a fresh accumulator."""
+    # Double buffering: the DB worker takes ownership of the old dict, so nothing is copied
+    db_queue.put(length_sums)
 
-                            desc = 'None'
-                        
-                        elif trans_proto == "ICMPv4":
+    return collections.defaultdict(int)
 
-                            ip = get_match_group(regex_pattern['ip'], line)
+def poll_lines(stream):
 
-                            src_ip = ip['src_ip']
-                            dst_ip = ip['dst_ip']
+    """Yield lines from a pipe as they arrive, or None whenever nothing arrived for POLL_INTERVAL seconds."""
+    # select() on the descriptor and os.read() around the TextIOWrapper, whose readline would block
+    selector = selectors.DefaultSelector()
+    selector.register(stream.fileno(), selectors.EVENT_READ)
+    pending = b""
 
-                            src_domain = get_domain_by_ip(ip['src_ip'])
-                            dst_domain = get_domain_by_ip(ip['dst_ip'])
+    try:
+        while True:
+            if not selector.select(POLL_INTERVAL):
+                yield None
+                continue
 
-                            src_port = dst_port = process_name = process_cmd = process_arg = parent_process_name = parent_process_cmd = parent_process_arg = desc = 'None'
-                        
-                        else:
+            chunk = os.read(stream.fileno(), 65536)
 
-                            print(f"Captured unparsed: {line.strip()}")
+            if not chunk:
+                if pending:
+                    yield pending.decode(errors="replace")
+                return
 
-                    elif network_proto == "IP6":
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
 
-                        trans_proto = get_match_group(regex_pattern['trans_proto_v6'], line)
-                        length = get_match_group(regex_pattern['length_v6'], line)
+            for line in lines:
+                yield line.decode(errors="replace") + "\n"
 
-                        if trans_proto == "TCP":
+    finally:
+        selector.close()
 
-                            ip_port_flag = get_match_group(regex_pattern['ip_port_flag_v6'], line)
+def replay_lines(stream):
 
-                            if not ip_port_flag:
+    """Yield recorded lines, stripping capture timestamps and optionally sleeping to their original spacing."""
+    first_timestamp = None
+    replay_start = time.perf_counter()
 
-                                print(f"Captured IP-TCP packet without ip_port_flag_v6 pattern: {line.strip()}")
+    for line in stream:
+        if line is None:
+            yield None  # idle tick from poll_lines
+            continue
 
-                            else:
+        timestamp = replay_timestamp_pattern.match(line)
 
-                                src_ip = ip_port_flag['src_ip']
-                                src_port = ip_port_flag['src_port']
-                                dst_ip = ip_port_flag['dst_ip']
-                                dst_port = ip_port_flag['dst_port']
+        if timestamp:
+            line = line[timestamp.end():]
 
-                                flag = ip_port_flag['flag']
+            if arg.replay_paced:
+                if timestamp.group('epoch'):
+                    seconds = float(timestamp.group('epoch'))
+                else:
+                    seconds = int(timestamp.group('hour')) * 3600 + int(timestamp.group('minute')) * 60 + float(timestamp.group('second'))
 
-                                process_info = get_match_group(regex_pattern['process'], line)
-                                parent_process_info = get_match_group(regex_pattern['parent_process'], line)
+                if first_timestamp is None:
+                    first_timestamp = seconds
 
-                                if process_info:
+                offset = seconds - first_timestamp
+                if offset < 0:
+                    offset += 86400  # capture crossed midnight
 
-                                    process_cmd = process_info['process_cmd']
-                                    process_arg = process_info['process_arg']
+                # Sleep in ticks, so windows still close on time across long gaps in the recording
+                delay = offset - (time.perf_counter() - replay_start)
+                while delay > 0:
+                    time.sleep(min(delay, POLL_INTERVAL))
+                    delay = offset - (time.perf_counter() - replay_start)
+                    if delay > 0:
+                        yield None
 
-                                    if "/" in process_info['process_cmd']:
-                                        process_name = process_info['process_cmd'].split("/")[-1]
-                                    else:
-                                        process_name = process_info['process_cmd']
-                                else:
-                                    process_name = process_cmd = process_arg = 'None'
+        yield line
 
-                                if parent_process_info:
+def open_capture():
 
-                                    parent_process_cmd = parent_process_info['parent_process_cmd']
-                                    parent_process_arg = parent_process_info['parent_process_arg']
+    if arg.replay:
+        stream = sys.stdin if arg.replay == '-' else open(arg.replay, "r")
+        if arg.replay_paced:
+            print(f"Replaying {arg.replay} paced by capture timestamps ...")
+        else:
+            print(f"Replaying {arg.replay} as fast as possible ...")
+        # A regular file is always readable, only a pipe on stdin can leave the reader waiting
+        return replay_lines(poll_lines(stream) if stream is sys.stdin else stream), stream, None
 
-                                    if "/" in parent_process_info['parent_process_cmd']:
-                                        parent_process_name = parent_process_info['parent_process_cmd'].split("/")[-1]
-                                    else:
-                                        parent_process_name = parent_process_info['parent_process_cmd']
-                                else:
-                                    parent_process_name = parent_process_cmd = parent_process_arg = 'None'
+    command = [os.path.join(get_runtime_path(), "assets/ptcpdump"), "-i", "any", "--oneline", "-n", "-t", "-v"]
 
+    process = subprocess.Popen(command, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=1)
+
+    return poll_lines(process.stdout), process.stdout, process
 
-                                src_domain = get_domain_by_ip(ip_port_flag['src_ip'])
-                                dst_domain = get_domain_by_ip(ip_port_flag['dst_ip'])
+def run_parsing(lines):
 
-                                sni = get_match_group(regex_pattern['sni'], line)
+    length_sums = collections.defaultdict(int)
+    tcp_session = collections.OrderedDict()
 
-                                if sni:
+    window_interval = config["collector"].get("window_interval", 5)
 
-                                    desc = f"sni: {sni}"
+    while not shutdown_event.is_set():
+        window_end = time.monotonic() + window_interval
+        exhausted = True
+        stage_time = time.perf_counter()
+        for line in lines:
+            # The reader wakes up at least every POLL_INTERVAL, so a quiet capture still closes its window
+            if line is None:
+                if time.monotonic() >= window_end or shutdown_event.is_set():
+                    exhausted = False
+                    break
+                continue
+
+            # print(f"Captured packet: {line.strip()}")
+            read_time = time.perf_counter()
+            packet = flow_parser.parse_line(line)
+            parse_time = time.perf_counter()
+
+            if packet:
+                aggregate_packet(packet, length_sums, tcp_session)
+                pipeline_stats['packets'] += 1
+
+            stage_time_end = time.perf_counter()
+            pipeline_stats['lines'] += 1
+            pipeline_stats['read'] += read_time - stage_time
+            pipeline_stats['parse'] += parse_time - read_time
+            pipeline_stats['aggregate'] += stage_time_end - parse_time
+            stage_time = stage_time_end
+
+            if time.monotonic() >= window_end:
+                exhausted = False
+                break
 
-                                else:
+        stage_time = time.perf_counter()
+        expire_sessions(tcp_session)
+        length_sums = flush_window(length_sums)
+        pipeline_stats['handoff'] += time.perf_counter() - stage_time
+        pipeline_stats['windows'] += 1
 
-                                    tos = desc = 'None'
+        if exhausted:
+            print("Capture input exhausted, shutting down ...")
+            break
 
-                        elif trans_proto == "UDP":
+def shard_line(line):
 
-                            ip_port = get_match_group(regex_pattern['ip_port_v6'], line)
+    """Hash a line by its unordered address pair, so both directions of a connection land on the same worker."""
+    position = line.find(" > ")
 
-                            src_ip = ip_port['src_ip']
-                            src_port = ip_port['src_port']
-                            dst_ip = ip_port['dst_ip']
-                            dst_port = ip_port['dst_port']
+    if position == -1:
+        return hash(line)  # ARP and other lines without a connection
 
-                            process_info = get_match_group(regex_pattern['process'], line)
-                            parent_process_info = get_match_group(regex_pattern['parent_process'], line)
+    src = line[line.rfind(" ", 0, position) + 1:position]
+    dst = line[position + 3:line.find(": ", position + 3)]
 
-                            if process_info:
+    return hash(src) ^ hash(dst)
 
-                                process_cmd = process_info['process_cmd']
-                                process_arg = process_info['process_arg']
+def parsing_worker(worker_config, line_queue, result_queue):
 
-                                if "/" in process_info['process_cmd']:
-                                    process_name = process_info['process_cmd'].split("/")[-1]
-                                else:
-                                    process_name = process_info['process_cmd']
-                            else:
-                                process_name = process_cmd = process_arg = 'None'
+    """Parse and aggregate one shard of the capture, returning its aggregates on every window flush."""
+    global config
+    config = worker_config
 
-                            if parent_process_info:
+    global dns
+    dns = create_dns_cache(track_loaded=True)  # the reader needs loaded entries too, to fill in domains
 
-                                parent_process_cmd = parent_process_info['parent_process_cmd']
-                                parent_process_arg = parent_process_info['parent_process_arg']
+    dns_resolver.start(dns, config["collector"].get("dns_workers", 4), config["collector"].get("dns_timeout", 2))
 
-                                if "/" in parent_process_info['parent_process_cmd']:
-                                    parent_process_name = parent_process_info['parent_process_cmd'].split("/")[-1]
-                                else:
-                                    parent_process_name = parent_process_info['parent_process_cmd']
-                            else:
-                                parent_process_name = parent_process_cmd = parent_process_arg = 'None'
+    global pipeline_stats
+    pipeline_stats = collections.defaultdict(float)
 
+    set_session_limits()
 
-                            src_domain = get_domain_by_ip(ip_port['src_ip'])
-                            dst_domain = get_domain_by_ip(ip_port['dst_ip'])
+    # The reader process owns shutdown, workers stop when it sends None
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
 
-                            tos = desc = 'None'
-                        
-                        elif trans_proto == "ICMPv6":
+    length_sums = collections.defaultdict(int)
+    tcp_session = collections.OrderedDict()
 
-                            ip = get_match_group(regex_pattern['ip_v6'], line)
+    while True:
+        batch = line_queue.get()
 
-                            src_ip = ip['src_ip']
-                            dst_ip = ip['dst_ip']
+        if batch is None:
+            break
 
-                            src_domain = get_domain_by_ip(ip['src_ip'])
-                            dst_domain = get_domain_by_ip(ip['dst_ip'])
+        if batch == WINDOW_FLUSH:
+            expire_sessions(tcp_session)
 
-                            tos = src_port = dst_port = process_name = process_cmd = process_arg = parent_process_name = parent_process_cmd = parent_process_arg = desc = 'None'
-                        
-                        else:
+            # Only the entries resolved since the last flush travel back to the reader, which persists them
+            worker_dns = (dns.take_dirty(), dns.take_loaded())
+            for name, value in dns_resolver.get_stats(reset=True).items():
+                if name != 'pending':
+                    pipeline_stats[f"dns_{name}"] += value
 
-                            print(f"Captured unparsed: {line.strip()}")
+            result_queue.put((length_sums, worker_dns, pipeline_stats))
+            length_sums = collections.defaultdict(int)
+            pipeline_stats = collections.defaultdict(float)
+            continue
 
-                    elif network_proto == "ARP":
+        for line in batch:
+            stage_time = time.perf_counter()
+            packet = flow_parser.parse_line(line)
+            parse_time = time.perf_counter()
 
-                        arp_req_info = get_match_group(regex_pattern['arp_req'], line)
-                        if arp_req_info:
-                            src_ip = arp_req_info['src_ip']
-                            src_domain = get_domain_by_ip(src_ip)
-                            target_ip = arp_req_info['target_ip']
-                            length = get_match_group(regex_pattern['length'], line)
-                            desc = f"target_ip: {target_ip}"
+            if packet:
+                aggregate_packet(packet, length_sums, tcp_session)
+                pipeline_stats['packets'] += 1
 
-                            dst_domain = dst_ip = tos = trans_proto = src_port = dst_port = process_name = process_cmd = process_arg = parent_process_name = parent_process_cmd = parent_process_arg = 'None'
+            pipeline_stats['parse'] += parse_time - stage_time
+            pipeline_stats['aggregate'] += time.perf_counter() - parse_time
 
+def merge_worker_windows(result_queue, worker_count):
 
-                        else:
-                            arp_rep_info = get_match_group(regex_pattern['arp_rep'], line)
-                            target_ip = arp_rep_info['target_ip']
-                            target_mac = arp_rep_info['target_mac']
-                            length = get_match_group(regex_pattern['length'], line)
-                            desc = f"target_ip: {target_ip}, target_mac: {target_mac}"
+    """Merge one window from every worker into a single length_sums handoff."""
+    length_sums = None
 
-                            src_ip = src_domain = dst_domain = dst_ip = tos = trans_proto = src_port = dst_port = process_name = process_cmd = process_arg = parent_process_name = parent_process_cmd = parent_process_arg = 'None'
+    pipeline_stats['sessions_live'] = 0  # a gauge, every worker reports its own table size below
 
-                    else:
-                        print(f"Captured uncategorized packet: {line.strip()}")
+    for _ in range(worker_count):
+        worker_length_sums, worker_dns, worker_stats = result_queue.get(timeout=60)
 
-        #            print(src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg)
-                    
-                    if trans_proto == "TCP":
+        # Flows are sharded by connection, so the first window is reused and the rest rarely overlap
+        if length_sums is None:
+            length_sums = worker_length_sums
+        else:
+            for key, total_length in worker_length_sums.items():
+                length_sums[key] += total_length
 
-                        endpoint = sorted([(src_ip, src_port), (dst_ip, dst_port)])
-                        tcp_session_key =  f"{endpoint[0][0]} ~~ {endpoint[0][1]} ~~~ {endpoint[1][0]} ~~ {endpoint[1][1]} ~~~ {interface}"
+        resolved, loaded = worker_dns
+        dns.merge(resolved)
+        dns.merge(loaded, dirty=False)
 
-                        if desc.startswith("sni"):
-                            tcp_session[tcp_session_key]["info"]["sni"] = desc
+        for stage, value in worker_stats.items():
+            pipeline_stats[stage] += value
 
-                        if "sni" in tcp_session.get(tcp_session_key, {}).get("info", {}):
+    return length_sums
 
-                            desc = tcp_session[tcp_session_key]["info"]["sni"]
-                            key = f"{src_domain} ~~ {src_ip} ~~ {src_port} ~~~ {dst_domain} ~~ {dst_ip} ~~ {dst_port} ~~~ {interface} ~~ {direction} ~~ {network_proto} ~~ {trans_proto} ~~ {tos} ~~ {desc} ~~~ {process_name} ~~ {process_cmd} ~~ {process_arg} ~~~ {parent_process_name} ~~ {parent_process_cmd} ~~ {parent_process_arg}"
+def run_sharded_parsing(lines, worker_count):
 
-                        else:
+    context = multiprocessing.get_context("spawn")
+    line_queues = [context.Queue(maxsize=SHARD_QUEUE_SIZE) for _ in range(worker_count)]
+    result_queue = context.Queue()
+    workers = [context.Process(target=parsing_worker, args=(config, line_queue, result_queue), daemon=True) for line_queue in line_queues]
 
-                            key = f"{src_domain} ~~ {src_ip} ~~ {src_port} ~~~ {dst_domain} ~~ {dst_ip} ~~ {dst_port} ~~~ {interface} ~~ {direction} ~~ {network_proto} ~~ {trans_proto} ~~ {tos} ~~ {desc} ~~~ {process_name} ~~ {process_cmd} ~~ {process_arg} ~~~ {parent_process_name} ~~ {parent_process_cmd} ~~ {parent_process_arg}"
+    for worker in workers:
+        worker.start()
 
-                        if key not in tcp_session[tcp_session_key]["key"]:
-                            tcp_session[tcp_session_key]["key"][key] = 0
+    print(f"Parsing with {worker_count} worker processes ...")
 
-                        if "finish" not in tcp_session[tcp_session_key]["info"]:
-                                tcp_session[tcp_session_key]["info"]["finish"] = 0
+    batches = [[] for _ in range(worker_count)]
 
-                        tcp_session[tcp_session_key]["key"][key] += int(length)
+    window_interval = config["collector"].get("window_interval", 5)
 
-                        if "R" in flag:
+    try:
+        while not shutdown_event.is_set():
+            window_end = time.monotonic() + window_interval
+            exhausted = True
+            stage_time = time.perf_counter()
+            for line in lines:
+                if line is None:
+                    if time.monotonic() >= window_end or shutdown_event.is_set():
+                        exhausted = False
+                        break
+                    continue
+
+                shard = shard_line(line) % worker_count
+                batch = batches[shard]
+                batch.append(line)
+
+                if len(batch) >= SHARD_BATCH_SIZE:
+                    line_queues[shard].put(batch)
+                    batches[shard] = []
+
+                pipeline_stats['lines'] += 1
+
+                if time.monotonic() >= window_end:
+                    exhausted = False
+                    break
 
-                            tcp_session[tcp_session_key].clear()
+            pipeline_stats['read'] += time.perf_counter() - stage_time
 
-                        if "F" in flag and tcp_session[tcp_session_key]["info"]["finish"] != 2:
+            for shard, line_queue in enumerate(line_queues):
+                if batches[shard]:
+                    line_queue.put(batches[shard])
+                    batches[shard] = []
+                line_queue.put(WINDOW_FLUSH)
 
-                            tcp_session[tcp_session_key]["info"]["finish"] += 1
+            stage_time = time.perf_counter()
+            db_queue.put(merge_worker_windows(result_queue, worker_count))
+            pipeline_stats['merge'] += time.perf_counter() - stage_time
+            pipeline_stats['windows'] += 1
 
-                        elif "F" in flag and tcp_session[tcp_session_key]["info"]["finish"] == 2:
+            if exhausted:
+                print("Capture input exhausted, shutting down ...")
+                break
 
-                            tcp_session[tcp_session_key].clear()
+    finally:
+        for line_queue in line_queues:
+            line_queue.put(None)
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
 
-                    else:
-                        key = f"{src_domain} ~~ {src_ip} ~~ {src_port} ~~~ {dst_domain} ~~ {dst_ip} ~~ {dst_port} ~~~ {interface} ~~ {direction} ~~ {network_proto} ~~ {trans_proto} ~~ {tos} ~~ {desc} ~~~ {process_name} ~~ {process_cmd} ~~ {process_arg} ~~~ {parent_process_name} ~~ {parent_process_cmd} ~~ {parent_process_arg}"
-                        length_sums[key] += int(length)
+def initialize_parsing():
 
-                elapsed_time = time.time() - start_time
-                if elapsed_time >= 5:
-                    break
+    lines, stream, process = open_capture()
 
-            db_queue.put((copy.deepcopy(length_sums), copy.deepcopy(tcp_session)))
-            length_sums.clear()
-            for tcp_session_key, session_data in tcp_session.items():
-                if "key" in session_data:
-                    session_data["key"].clear()
+    worker_count = arg.parsing_workers or config["collector"].get("parsing_workers", 1)
 
+    try:
+        if worker_count > 1:
+            run_sharded_parsing(lines, worker_count)
+        else:
+            run_parsing(lines)
 
     except Exception as e:
         print(f"Exception type: {type(e).__name__}")
@@ -606,11 +695,78 @@ def initialize_parsing():
         traceback.print_exc()
 
     finally:
-        process.terminate()
-        process.wait()
-        for line in process.stderr:
-            print(line)
-        write_dns_table()
+        if process:
+            process.terminate()
+            process.wait()
+            for line in process.stderr:
+                print(line)
+        elif stream is not sys.stdin:
+            stream.close()
+        if not shutdown_event.is_set():
+            shutdown_event.set()
+            db_queue.put(None)  # stop DB worker
+
+def format_session_stats():
+    return ", ".join(f"{name} {pipeline_stats[f'sessions_{name}']:.0f}" for name in ('live', 'finished', 'expired', 'evicted'))
+
+def create_queue(name, merge):
+
+    """Bounded queue in front of a writer thread, overflowing by the queue_policy setting (see spill_queue.SpillQueue)."""
+    spool_path = os.path.join(config["collector"].get("spool_path", "spool"), f"{name}.spool")
+
+    return spill_queue.SpillQueue(config["collector"].get("queue_size", 64), config["collector"].get("queue_policy", "spill"), spool_path, merge)
+
+def create_forward_spool():
+
+    """Disk spool of the windows to forward (see forward_spool.ForwardSpool), sized by forward_spool_mb."""
+    spool_path = config["collector"].get("spool_path", "spool")
+    data_queue = forward_spool.ForwardSpool(
+        os.path.join(spool_path, "forward"),
+        config["collector"].get("forward_spool_mb", 256) * 1048576,
+        config["collector"].get("forward_spool_policy", "drop_oldest"),
+        config["collector"].get("forward_compression_level", 1),
+        config["collector"].get("forward_compress_min_bytes", 1024),
+    )
+
+    # Windows an older release spilled from its in-memory forward queue move over
+    old_spool_path = os.path.join(spool_path, "data_queue.spool")
+    if os.path.exists(old_spool_path):
+        old_queue = spill_queue.SpillQueue(spool_path=old_spool_path)
+        while not old_queue.empty():
+            data_queue.put(old_queue.get())
+
+    return data_queue
+
+def print_pipeline_stats(elapsed_time):
+
+    print("Replay summary:")
+    print(f"  Parsing workers : {arg.parsing_workers or config['collector'].get('parsing_workers', 1)}")
+    print(f"  Lines read      : {pipeline_stats['lines']:.0f} ({pipeline_stats['lines'] / elapsed_time:,.0f} lines/sec)")
+    print(f"  Packets parsed  : {pipeline_stats['packets']:.0f}")
+    print(f"  Windows flushed : {pipeline_stats['windows']:.0f}")
+    print(f"  Flows produced  : {pipeline_stats['flows']:.0f}")
+    print(f"  Commits         : {pipeline_stats['commits'] + 1:.0f}")  # plus the final one at shutdown
+    print(f"  Rollups         : {pipeline_stats['rollup_rows']:.0f} rows rolled up, {pipeline_stats['rollup_expired']:.0f} expired, {pipeline_stats['partitions_dropped']:.0f} partitions dropped")
+    print(f"  Wall time       : {elapsed_time:.3f}s")
+    for stage in ('read', 'parse', 'aggregate', 'handoff', 'merge', 'write', 'commit', 'rollup', 'archive'):
+        print(f"  {stage:<16}: {pipeline_stats[stage]:.3f}s")
+
+    # Sharded workers report their resolver counters as dns_* deltas
+    resolver_stats = dns_resolver.get_stats()
+    for name in dns_resolver.STAT_NAMES:
+        resolver_stats[name] = resolver_stats.get(name, 0) + pipeline_stats[f"dns_{name}"]
+    print(f"  DNS resolver    : {dns_resolver.format_stats(resolver_stats)}")
+    print(f"  DNS cache       : {len(dns)} entries, {pipeline_stats['dns_persisted']:.0f} persisted")
+    print(f"  TCP sessions    : {format_session_stats()}")
+    print(f"  DB queue        : {db_queue.format_stats()}")
+    print(f"  Checkpoints     : {db_tuning.format_stats(pipeline_stats)}")
+    if config["collector"]["remote_forwarding"]:
+        print(f"  Forward queue   : {data_queue.format_stats()}, forwarded {pipeline_stats['forwarded']:.0f} (max {pipeline_stats['forward_in_flight_max']:.0f} in flight), resent {pipeline_stats['forward_resent']:.0f}")
+
+def create_traffic_table(c):
+
+    """Create the flow tables behind the traffic view, returns True when an old flat traffic table was migrated."""
+    return flow_schema.create_traffic_tables(c, partition_hours=config["collector"].get("partition_hours", 24), index_names=config["collector"].get("traffic_indexes"))
 
 def db_worker():
 
@@ -618,64 +774,117 @@ def db_worker():
     conn = sqlite3.connect(config["collector"]["local_db_path"])
     c = conn.cursor()
 
-    # Create table if it doesn't exist
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS traffic (
-            src_domain TEXT,
-            src_ip TEXT,
-            src_port TEXT,
-            dst_domain TEXT,
-            dst_ip TEXT,
-            dst_port TEXT,
-            interface TEXT,
-            direction TEXT,
-            network_proto TEXT,
-            trans_proto TEXT,
-            tos TEXT,
-            desc TEXT,
-            process_name TEXT,
-            process_cmd TEXT,
-            process_arg TEXT,
-            parent_process_name TEXT,
-            parent_process_cmd TEXT,
-            parent_process_arg TEXT,
-            total_length INTEGER,
-            last_updated TEXT DEFAULT (datetime('now','localtime')),
-            PRIMARY KEY (src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg)
-        )
-    ''')
+    storage = config.get("storage", {})
+
+    vacuum = flow_schema.enable_incremental_vacuum(conn)
+    resize = db_tuning.apply_settings(conn, storage)
+    migrated = create_traffic_table(c)
     conn.commit()
 
+    if migrated or vacuum or resize:
+        db_tuning.vacuum(conn, resize, migrated or vacuum)  # give the space of the flat table back, applies incremental auto_vacuum and page_size
+
     conn.execute("PRAGMA journal_mode=WAL;")
 
-    batch_size = 5
-    counter = 0
+    checkpoints = db_tuning.CheckpointScheduler(conn, config["collector"]["local_db_path"], storage, pipeline_stats)
+
+    # Group commit: windows share a transaction until it holds commit_rows rows or is commit_interval seconds old,
+    # the interval bounds how long written rows stay invisible to readers
+    commit_interval = config["collector"].get("commit_interval", 25)
+    commit_rows = config["collector"].get("commit_rows", 100000)
+    commit_time = time.monotonic()
+    uncommitted_rows = 0
+
+    dns_flush_interval = config["collector"].get("dns_flush_interval", 60)
+    dns_flush_time = time.time()
+
+    rollup_interval = config["collector"].get("rollup_interval", 60)
+    rollup_retention = flow_schema.get_retention(config["collector"])
+    rollup_time = time.time()
+
+    partition_retention = config["collector"].get("partition_retention", 2592000)
+    db_size_limit = config["collector"].get("db_size_limit_mb", 4096) * 1048576
+
+    # Closed windows are also kept in columnar segments for scans over long periods, see flow_archive.scan
+    archive = None
+    if config["collector"].get("flow_archive", False):
+        archive = flow_archive.ArchiveWriter(config["collector"].get("archive_path", "flow_archive"), config["collector"].get("archive_segment_seconds", 3600), config["collector"].get("archive_segment_rows", 1000000), config["collector"].get("archive_retention", 31536000))
 
     while True:
+        # Resolved domains are persisted in batches, so a crash loses at most one interval of them
+        if time.time() - dns_flush_time >= dns_flush_interval:
+            try:
+                write_dns_table(c)
+                conn.commit()
+            except Exception as e:
+                print("DNS write error:", e)
+            dns_flush_time = time.time()
+
+        # Completed minutes are folded into hours and hours into days, expired buckets and partitions are dropped
+        if time.time() - rollup_time >= rollup_interval:
+            stage_time = time.perf_counter()
+            try:
+                rolled, expired = flow_schema.downsample(c, time.time(), rollup_retention)
+                pipeline_stats['rollup_rows'] += rolled
+                pipeline_stats['rollup_expired'] += expired
+
+                dropped = flow_schema.expire_partitions(c, time.time(), partition_retention, db_size_limit)
+                conn.commit()
+                pipeline_stats['partitions_dropped'] += len(dropped)
+                if dropped:
+                    print(f"Dropped expired partitions: {', '.join(dropped)}")
+                    flow_schema.release_free_pages(conn)
+            except Exception as e:
+                print("Rollup error:", e)
+            pipeline_stats['rollup'] += time.perf_counter() - stage_time
+            rollup_time = time.time()
+
+        # Checked on every wake-up, a window written just before traffic stopped must not wait for the next one
+        if uncommitted_rows >= commit_rows or (uncommitted_rows and time.monotonic() - commit_time >= commit_interval):
+            stage_time = time.perf_counter()
+            conn.commit()
+            pipeline_stats['commit'] += time.perf_counter() - stage_time
+            pipeline_stats['commits'] += 1
+            commit_time = time.monotonic()
+            uncommitted_rows = 0
+
         try:
-            item = db_queue.get(timeout=1)
+            item = db_queue.get(timeout=min(1, commit_interval))
         except queue.Empty:
             if shutdown_event.is_set():
                 break
+            # Idle with everything committed, the WAL is checkpointed now instead of by a commit under load
+            if not conn.in_transaction:
+                try:
+                    checkpoints.run()
+                except Exception as e:
+                    print("Checkpoint error:", e)
             continue
 
         if item is None:
             break
-        length_sums, tcp_session = item
+        length_sums = item
+        stage_time = time.perf_counter()
         try:
-            write_traffic_table(length_sums, tcp_session, c)  # insert statements
+            uncommitted_rows += write_traffic_table(length_sums, c, archive)  # one executemany per window
         except Exception as e:
             print("DB write error:", e)
-        counter += 1
+        pipeline_stats['write'] += time.perf_counter() - stage_time
         db_queue.task_done()
 
-        if counter >= batch_size:
-            conn.commit()
-            counter = 0
-
+    stage_time = time.perf_counter()
     conn.commit()
+    pipeline_stats['commit'] += time.perf_counter() - stage_time
     conn.close()
 
+    if archive:
+        stage_time = time.perf_counter()
+        try:
+            archive.flush()  # the segment still filling up
+        except Exception as e:
+            print("Archive write error:", e)
+        pipeline_stats['archive'] += time.perf_counter() - stage_time
+
 def main():
 
     global arg
@@ -684,24 +893,36 @@ def main():
     global config
     config = load_config()
 
-    global regex_pattern
-    regex_pattern = declare_regex_pattern()
     global dns
-    dns = {}
+    dns = create_dns_cache()
 
     global shutdown_event
     shutdown_event = threading.Event()
 
+    global pipeline_stats
+    pipeline_stats = collections.defaultdict(float)
+
+    set_session_limits()
+
+    global replay_timestamp_pattern
+    replay_timestamp_pattern = re.compile(r"(?:(?P<epoch>\d{9,}\.\d+)|(?P<hour>\d{2}):(?P<minute>\d{2}):(?P<second>\d{2}\.\d+))\s")
+
     signal.signal(signal.SIGINT, handle_termination)
 
+    # Bounded, a stalled writer must not let windows pile up in memory
     global data_queue
-    data_queue = queue.Queue()
+    if config["collector"]["remote_forwarding"]:
+        data_queue = create_forward_spool()
 
     global db_queue
-    db_queue = queue.Queue()
+    db_queue = create_queue("db_queue", spill_queue.merge_windows)
+
+    conn = sqlite3.connect(config["collector"]["local_db_path"])
+    create_dns_table(conn.cursor())
+    conn.commit()
+    conn.close()
 
-    write_dns_table()
-    read_dns_table()
+    dns_resolver.start(dns, config["collector"].get("dns_workers", 4), config["collector"].get("dns_timeout", 2))
 
     if config["collector"]["remote_forwarding"]:
         ws_thread = threading.Thread(target=initialize_websocket, daemon=False)
@@ -712,6 +933,8 @@ def main():
     if config["collector"]["remote_forwarding"]:
         ws_thread.start()
     
+    start_time = time.perf_counter()
+
     db_thread.start()
     parsing_thread.start()
 
@@ -721,13 +944,37 @@ def main():
     db_thread.join()
     parsing_thread.join()
 
+    if config["collector"]["remote_forwarding"]:
+        data_queue.close()  # what was not acknowledged is sent after the next start
+
+    # Whatever was resolved since the DB worker's last flush
+    conn = sqlite3.connect(config["collector"]["local_db_path"])
+    write_dns_table(conn.cursor())
+    conn.commit()
+    conn.close()
+
+    if arg.replay:
+        print_pipeline_stats(time.perf_counter() - start_time)
+    else:
+        print(f"DNS resolver: {dns_resolver.format_stats(dns_resolver.get_stats())}")
+        print(f"TCP sessions: {format_session_stats()}")
+
 # Function Declaration -- End
 
 # Global Variable -- Start
 
+WINDOW_FLUSH = "flush"  # line_queue marker closing the current window
+
+SHARD_BATCH_SIZE = 256  # lines per worker message
+
+SHARD_QUEUE_SIZE = 64  # batches in flight per worker before the reader blocks
+
+POLL_INTERVAL = 0.2  # longest the reader waits for a line before checking the window timer
+
 
 # Global Variable -- End
 
 if __name__ == "__main__":
 
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -8,6 +8,11 @@ import json
 import argparse
 import dash_bootstrap_components
 import pathlib
+import time
+import ipaddress
+
+import flow_schema
+import db_tuning
 
 # Import Module -- End
 
@@ -33,9 +38,66 @@ def load_config():
     with open(path, "r") as f:
         return json.load(f)
 
+def connect_db(db_path):
+
+    conn = sqlite3.connect(db_path)
+    db_tuning.apply_read_settings(conn, config.get("storage", {}))
+
+    # Addresses are stored packed, filters compare them through these: dst_ip = inet('1.1.1.1'),
+    # dst_ip BETWEEN inet_first('10.0.0.0/8') AND inet_last('10.0.0.0/8') or inet_text(dst_ip) LIKE '192.168.%'
+    conn.create_function("inet", 1, flow_schema.pack_ip, deterministic=True)
+    conn.create_function("inet_first", 1, lambda network: network_bound(network, False), deterministic=True)
+    conn.create_function("inet_last", 1, lambda network: network_bound(network, True), deterministic=True)
+    conn.create_function("inet_text", 1, flow_schema.unpack_ip, deterministic=True)
+
+    return conn
+
+def network_bound(network, last):
+
+    try:
+        network = ipaddress.ip_network(network, strict=False)
+    except (TypeError, ValueError):
+        return None
+
+    return flow_schema.pack_ip(str(network[-1] if last else network[0]))
+
+def format_port(port):
+
+    # Already text for the 'Not well-known' bucket, NaN where pandas read a NULL into a float column
+    if isinstance(port, str):
+        return port
+
+    if port is None or pandas.isna(port):
+        return 'None'
+
+    return str(int(port))
+
+def format_time(timestamp):
+
+    if timestamp is None or pandas.isna(timestamp):
+        return 'None'
+
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+def format_traffic(df):
+
+    # The tables hold packed addresses, integer ports and epoch seconds, shown as text in local time
+    for column in ('sender_ip', 'src_ip', 'dst_ip'):
+        if column in df:
+            df[column] = df[column].map(flow_schema.unpack_ip)
+
+    for column in ('src_port', 'dst_port'):
+        if column in df:
+            df[column] = df[column].map(format_port)
+
+    if 'last_updated' in df:
+        df['last_updated'] = df['last_updated'].map(format_time)
+
+    return df
+
 def read_local_traffic_table(page_size=20, page_current=0, filter_query=None, known_port=False, human_readable=False, sort_option=[]):
 
-    conn = sqlite3.connect(config["collector"]["local_db_path"])
+    conn = connect_db(config["collector"]["local_db_path"])
 
     if known_port is False and human_readable is False:
 
@@ -68,6 +130,8 @@ def read_local_traffic_table(page_size=20, page_current=0, filter_query=None, kn
 
             base_query += f" WHERE {filter_query}"
 
+        count_query = f"SELECT COUNT(*) FROM ({base_query})"
+
         if sort_option:
 
             base_query += f" ORDER BY {sort_option[0]} {sort_option[1]}"
@@ -111,6 +175,8 @@ def read_local_traffic_table(page_size=20, page_current=0, filter_query=None, kn
 
             base_query += f" WHERE {filter_query}"
 
+        count_query = f"SELECT COUNT(*) FROM ({base_query})"
+
         if sort_option and sort_option[0] == 'total_length':
 
             base_query += f" ORDER BY total_length_raw {sort_option[1]}"
@@ -126,13 +192,13 @@ def read_local_traffic_table(page_size=20, page_current=0, filter_query=None, kn
                 src_domain,
                 src_ip,
                 CASE 
-                    WHEN src_port != 'None' AND CAST(src_port AS INTEGER) > 1024 THEN 'Not well-known'
+                    WHEN src_port > 1024 THEN 'Not well-known'
                     ELSE src_port
                 END AS src_port,
                 dst_domain,
                 dst_ip,
                 CASE 
-                    WHEN dst_port != 'None' AND CAST(dst_port AS INTEGER) > 1024 THEN 'Not well-known'
+                    WHEN dst_port > 1024 THEN 'Not well-known'
                     ELSE dst_port
                 END AS dst_port,
                 interface,
@@ -149,35 +215,21 @@ def read_local_traffic_table(page_size=20, page_current=0, filter_query=None, kn
                 parent_process_arg,
                 SUM(total_length) AS total_length,
                 MAX(last_updated) AS last_updated
-            FROM traffic
+            FROM traffic_known_port
         """
 
         if filter_query:
 
             base_query += f" WHERE {filter_query}"
 
+        # Grouped by the ids and the stored port buckets, which the known_port index holds in this order
         base_query += f"""
-        GROUP BY
-            src_domain,
-            src_ip,
-            CASE WHEN src_port != 'None' AND CAST(src_port AS INTEGER) > 1024 THEN 'Not well-known' ELSE src_port END,
-            dst_domain,
-            dst_ip,
-            CASE WHEN dst_port != 'None' AND CAST(dst_port AS INTEGER) > 1024 THEN 'Not well-known' ELSE dst_port END,
-            interface,
-            direction,
-            network_proto,
-            trans_proto,
-            tos,
-            desc,
-            process_name,
-            process_cmd,
-            process_arg,
-            parent_process_name,
-            parent_process_cmd,
-            parent_process_arg
+        GROUP BY src_host_id, src_known_port, dst_host_id, dst_known_port, descriptor_id, process_id
         """
 
+        # Unfiltered, the groups are counted off the known_port index alone instead of through the joins of the view
+        count_query = f"SELECT COUNT(*) FROM ({base_query})" if filter_query else "SELECT COUNT(*) FROM (SELECT 1 FROM flow_totals GROUP BY src_host_id, src_known_port, dst_host_id, dst_known_port, descriptor_id, process_id)"
+
         if sort_option:
 
             base_query += f" ORDER BY {sort_option[0]} {sort_option[1]}"
@@ -189,13 +241,13 @@ def read_local_traffic_table(page_size=20, page_current=0, filter_query=None, kn
                 src_domain,
                 src_ip,
                 CASE 
-                    WHEN src_port != 'None' AND CAST(src_port AS INTEGER) > 1024 THEN 'Not well-known'
+                    WHEN src_port > 1024 THEN 'Not well-known'
                     ELSE src_port
                 END AS src_port,
                 dst_domain,
                 dst_ip,
                 CASE 
-                    WHEN dst_port != 'None' AND CAST(dst_port AS INTEGER) > 1024 THEN 'Not well-known'
+                    WHEN dst_port > 1024 THEN 'Not well-known'
                     ELSE dst_port
                 END AS dst_port,
                 interface,
@@ -220,7 +272,7 @@ def read_local_traffic_table(page_size=20, page_current=0, filter_query=None, kn
                     ELSE printf('%.2f B', SUM(total_length) * 1.0)
                 END AS total_length,
                 MAX(last_updated) AS last_updated
-            FROM traffic
+            FROM traffic_known_port
         """
 
         if filter_query:
@@ -228,27 +280,12 @@ def read_local_traffic_table(page_size=20, page_current=0, filter_query=None, kn
             base_query += f" WHERE {filter_query}"
 
         base_query += f"""
-        GROUP BY
-            src_domain,
-            src_ip,
-            CASE WHEN src_port != 'None' AND CAST(src_port AS INTEGER) > 1024 THEN 'Not well-known' ELSE src_port END,
-            dst_domain,
-            dst_ip,
-            CASE WHEN dst_port != 'None' AND CAST(dst_port AS INTEGER) > 1024 THEN 'Not well-known' ELSE dst_port END,
-            interface,
-            direction,
-            network_proto,
-            trans_proto,
-            tos,
-            desc,
-            process_name,
-            process_cmd,
-            process_arg,
-            parent_process_name,
-            parent_process_cmd,
-            parent_process_arg
+        GROUP BY src_host_id, src_known_port, dst_host_id, dst_known_port, descriptor_id, process_id
         """
 
+        # Unfiltered, the groups are counted off the known_port index alone instead of through the joins of the view
+        count_query = f"SELECT COUNT(*) FROM ({base_query})" if filter_query else "SELECT COUNT(*) FROM (SELECT 1 FROM flow_totals GROUP BY src_host_id, src_known_port, dst_host_id, dst_known_port, descriptor_id, process_id)"
+
         if sort_option and sort_option[0] == 'total_length':
 
             base_query += f" ORDER BY total_length_raw {sort_option[1]}"
@@ -263,25 +300,26 @@ def read_local_traffic_table(page_size=20, page_current=0, filter_query=None, kn
 
         conn.close()
 
-        return df_base, 0
+        return format_traffic(df_base), 0
 
     else:
 
-        df_count = pandas.read_sql(base_query,conn)
+        # Counted by SQLite before the ORDER BY, instead of reading every row into a DataFrame
+        row_count = conn.execute(count_query).fetchone()[0]
 
         base_query += f" LIMIT {page_size} OFFSET {page_current * page_size}"
 
         df_base = pandas.read_sql(base_query,conn)
 
-        page_count = len(df_count) // page_size + (1 if len(df_count) % page_size else 0)
+        page_count = row_count // page_size + (1 if row_count % page_size else 0)
 
         conn.close()
 
-        return df_base, page_count
+        return format_traffic(df_base), page_count
 
 def read_receiver_traffic_table(page_size=20, page_current=0, filter_query=None, known_port=False, human_readable=False, sort_option=[]):
 
-    conn = sqlite3.connect(config["receiver"]["receiver_db_path"])
+    conn = connect_db(config["receiver"]["receiver_db_path"])
 
     if known_port is False and human_readable is False:
 
@@ -316,6 +354,8 @@ def read_receiver_traffic_table(page_size=20, page_current=0, filter_query=None,
 
             base_query += f" WHERE {filter_query}"
 
+        count_query = f"SELECT COUNT(*) FROM ({base_query})"
+
         if sort_option:
 
             base_query += f" ORDER BY {sort_option[0]} {sort_option[1]}"
@@ -361,6 +401,8 @@ def read_receiver_traffic_table(page_size=20, page_current=0, filter_query=None,
 
             base_query += f" WHERE {filter_query}"
 
+        count_query = f"SELECT COUNT(*) FROM ({base_query})"
+
         if sort_option and sort_option[0] == 'total_length':
 
             base_query += f" ORDER BY total_length_raw {sort_option[1]}"
@@ -378,13 +420,13 @@ def read_receiver_traffic_table(page_size=20, page_current=0, filter_query=None,
                 src_domain,
                 src_ip,
                 CASE 
-                    WHEN src_port != 'None' AND CAST(src_port AS INTEGER) > 1024 THEN 'Not well-known'
+                    WHEN src_port > 1024 THEN 'Not well-known'
                     ELSE src_port
                 END AS src_port,
                 dst_domain,
                 dst_ip,
                 CASE 
-                    WHEN dst_port != 'None' AND CAST(dst_port AS INTEGER) > 1024 THEN 'Not well-known'
+                    WHEN dst_port > 1024 THEN 'Not well-known'
                     ELSE dst_port
                 END AS dst_port,
                 interface,
@@ -401,37 +443,21 @@ def read_receiver_traffic_table(page_size=20, page_current=0, filter_query=None,
                 parent_process_arg,
                 SUM(total_length) AS total_length,
                 MAX(last_updated) AS last_updated
-            FROM receiver_traffic
+            FROM receiver_traffic_known_port
         """
 
         if filter_query:
 
             base_query += f" WHERE {filter_query}"
 
+        # Grouped by the ids and the stored port buckets, which the known_port index holds in this order
         base_query += f"""
-        GROUP BY
-            sender_domain,
-            sender_ip,
-            src_domain,
-            src_ip,
-            CASE WHEN src_port != 'None' AND CAST(src_port AS INTEGER) > 1024 THEN 'Not well-known' ELSE src_port END,
-            dst_domain,
-            dst_ip,
-            CASE WHEN dst_port != 'None' AND CAST(dst_port AS INTEGER) > 1024 THEN 'Not well-known' ELSE dst_port END,
-            interface,
-            direction,
-            network_proto,
-            trans_proto,
-            tos,
-            desc,
-            process_name,
-            process_cmd,
-            process_arg,
-            parent_process_name,
-            parent_process_cmd,
-            parent_process_arg
+        GROUP BY sender_host_id, src_host_id, src_known_port, dst_host_id, dst_known_port, descriptor_id, process_id
         """
 
+        # Unfiltered, the groups are counted off the known_port index alone instead of through the joins of the view
+        count_query = f"SELECT COUNT(*) FROM ({base_query})" if filter_query else "SELECT COUNT(*) FROM (SELECT 1 FROM receiver_flow_totals GROUP BY sender_host_id, src_host_id, src_known_port, dst_host_id, dst_known_port, descriptor_id, process_id)"
+
         if sort_option:
 
             base_query += f" ORDER BY {sort_option[0]} {sort_option[1]}"
@@ -445,13 +471,13 @@ def read_receiver_traffic_table(page_size=20, page_current=0, filter_query=None,
                 src_domain,
                 src_ip,
                 CASE 
-                    WHEN src_port != 'None' AND CAST(src_port AS INTEGER) > 1024 THEN 'Not well-known'
+                    WHEN src_port > 1024 THEN 'Not well-known'
                     ELSE src_port
                 END AS src_port,
                 dst_domain,
                 dst_ip,
                 CASE 
-                    WHEN dst_port != 'None' AND CAST(dst_port AS INTEGER) > 1024 THEN 'Not well-known'
+                    WHEN dst_port > 1024 THEN 'Not well-known'
                     ELSE dst_port
                 END AS dst_port,
                 interface,
@@ -476,7 +502,7 @@ def read_receiver_traffic_table(page_size=20, page_current=0, filter_query=None,
                     ELSE printf('%.2f B', SUM(total_length) * 1.0)
                 END AS total_length,
                 MAX(last_updated) AS last_updated
-            FROM receiver_traffic
+            FROM receiver_traffic_known_port
         """
 
         if filter_query:
@@ -484,29 +510,12 @@ def read_receiver_traffic_table(page_size=20, page_current=0, filter_query=None,
             base_query += f" WHERE {filter_query}"
 
         base_query += f"""
-        GROUP BY
-            sender_domain,
-            sender_ip,
-            src_domain,
-            src_ip,
-            CASE WHEN src_port != 'None' AND CAST(src_port AS INTEGER) > 1024 THEN 'Not well-known' ELSE src_port END,
-            dst_domain,
-            dst_ip,
-            CASE WHEN dst_port != 'None' AND CAST(dst_port AS INTEGER) > 1024 THEN 'Not well-known' ELSE dst_port END,
-            interface,
-            direction,
-            network_proto,
-            trans_proto,
-            tos,
-            desc,
-            process_name,
-            process_cmd,
-            process_arg,
-            parent_process_name,
-            parent_process_cmd,
-            parent_process_arg
+        GROUP BY sender_host_id, src_host_id, src_known_port, dst_host_id, dst_known_port, descriptor_id, process_id
         """
 
+        # Unfiltered, the groups are counted off the known_port index alone instead of through the joins of the view
+        count_query = f"SELECT COUNT(*) FROM ({base_query})" if filter_query else "SELECT COUNT(*) FROM (SELECT 1 FROM receiver_flow_totals GROUP BY sender_host_id, src_host_id, src_known_port, dst_host_id, dst_known_port, descriptor_id, process_id)"
+
         if sort_option and sort_option[0] == 'total_length':
 
             base_query += f" ORDER BY total_length_raw {sort_option[1]}"
@@ -521,21 +530,22 @@ def read_receiver_traffic_table(page_size=20, page_current=0, filter_query=None,
 
         conn.close()
 
-        return df_base, 0
+        return format_traffic(df_base), 0
 
     else:
 
-        df_count = pandas.read_sql(base_query,conn)
+        # Counted by SQLite before the ORDER BY, instead of reading every row into a DataFrame
+        row_count = conn.execute(count_query).fetchone()[0]
 
         base_query += f" LIMIT {page_size} OFFSET {page_current * page_size}"
 
         df_base = pandas.read_sql(base_query,conn)
 
-        page_count = len(df_count) // page_size + (1 if len(df_count) % page_size else 0)
+        page_count = row_count // page_size + (1 if row_count % page_size else 0)
 
         conn.close()
 
-        return df_base, page_count
+        return format_traffic(df_base), page_count
 
 def create_dash_app():
 
@@ -857,7 +867,7 @@ def create_dash_app():
                                             # Dash DataTable to display the database contents
                                             dash_bootstrap_components.Textarea(
                                                 id='textarea-traffic-filter',
-                                                placeholder='Enter SQL WHERE clause ...',
+                                                placeholder="Enter SQL WHERE clause ... e.g. dst_ip = inet('1.1.1.1') AND dst_port = 443",
                                                 debounce=True,
                                                 draggable=False,
                                                 rows=2,
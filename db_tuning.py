@@ -0,0 +1,137 @@
+# Import Module -- Start
+
+import os
+import time
+import collections
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+def apply_settings(conn, settings):
+
+    """Apply the storage section of flownix.json to a writer connection.
+
+    Returns True when the database still has another page size than configured, which only a VACUUM outside
+    WAL mode changes (see vacuum). Must run before journal_mode=WAL on a new database for page_size to apply.
+    """
+    synchronous = str(settings.get("synchronous", "NORMAL")).upper()
+    if synchronous not in SYNCHRONOUS_LEVELS:
+        print(f"Ignoring unknown synchronous level '{synchronous}', expected one of: {', '.join(SYNCHRONOUS_LEVELS)}")
+        synchronous = "NORMAL"
+
+    page_size = int(settings.get("page_size", 4096))
+
+    conn.execute(f"PRAGMA page_size = {page_size}")
+    conn.execute(f"PRAGMA synchronous = {synchronous}")
+    conn.execute(f"PRAGMA wal_autocheckpoint = {int(settings.get('wal_autocheckpoint', 1000))}")
+    conn.execute(f"PRAGMA journal_size_limit = {int(settings.get('journal_size_limit_mb', 64)) * 1048576}")
+    apply_read_settings(conn, settings)
+
+    return conn.execute("PRAGMA page_size").fetchone()[0] != page_size
+
+def apply_read_settings(conn, settings):
+
+    # Page cache and memory-mapped I/O, the settings readers benefit from as well
+    conn.execute(f"PRAGMA cache_size = {-int(settings.get('cache_size_kib', 65536))}")
+    conn.execute(f"PRAGMA mmap_size = {int(settings.get('mmap_size_mb', 256)) * 1048576}")
+
+def vacuum(conn, resize=False, required=True):
+
+    """VACUUM the database, leaving WAL mode first when the page size is to change (it cannot in WAL mode).
+
+    With required False the VACUUM is only run for the page size and skipped when WAL mode cannot be left.
+    """
+    if resize:
+        try:
+            journal_mode, = conn.execute("PRAGMA journal_mode=DELETE;").fetchone()
+        except Exception as e:
+            journal_mode = str(e)
+
+        if journal_mode != 'delete':
+            print(f"Keeping page_size {conn.execute('PRAGMA page_size').fetchone()[0]} until the database is not in use by other connections ({journal_mode})")
+            if not required:
+                return
+
+    print("Vacuuming the database ...")
+    conn.execute("VACUUM")
+
+def get_wal_bytes(db_path):
+    try:
+        return os.path.getsize(f"{db_path}-wal")
+    except OSError:
+        return 0
+
+class CheckpointScheduler:
+
+    """Checkpoints the WAL of a writer connection while the writer is idle.
+
+    Every interval seconds a PASSIVE checkpoint copies what it can without waiting for readers. When readers
+    held it back with more than restart_bytes in the WAL, a RESTART one follows that waits up to busy_timeout ms
+    for them, so the next writes start over at the beginning of the WAL instead of growing it (and
+    journal_size_limit truncates the file). A RESTART still blocked by readers is retried after retry_delay seconds.
+    """
+
+    def __init__(self, conn, db_path, settings, stats=None):
+
+        self.conn = conn
+        self.db_path = db_path
+        self.interval = settings.get("checkpoint_interval", 30)
+        self.restart_bytes = settings.get("checkpoint_restart_mb", 64) * 1048576
+        self.busy_timeout = settings.get("checkpoint_busy_timeout_ms", 200)
+        self.retry_delay = settings.get("checkpoint_retry_delay", 5)
+        self.page_size, = conn.execute("PRAGMA page_size").fetchone()
+
+        self.next_time = time.monotonic() + self.interval
+        self.stats = collections.defaultdict(float) if stats is None else stats  # checkpoint_* counters
+
+    def run(self):
+
+        """Checkpoint if one is due, call only with no write transaction open."""
+        if time.monotonic() < self.next_time:
+            return None
+
+        mode = "PASSIVE"
+        start_time = time.perf_counter()
+        busy, log_frames, checkpointed_frames = self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+
+        if checkpointed_frames < log_frames and log_frames * self.page_size >= self.restart_bytes:
+            mode = "RESTART"
+            busy_timeout, = self.conn.execute("PRAGMA busy_timeout").fetchone()
+            self.conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+            try:
+                busy, log_frames, checkpointed_frames = self.conn.execute("PRAGMA wal_checkpoint(RESTART)").fetchone()
+            finally:
+                self.conn.execute(f"PRAGMA busy_timeout = {busy_timeout}")
+
+        elapsed_time = time.perf_counter() - start_time
+        wal_bytes = max(log_frames, 0) * self.page_size
+
+        self.stats['checkpoints'] += 1
+        self.stats[f'checkpoint_{mode.lower()}'] += 1
+        self.stats['checkpoint_seconds'] += elapsed_time
+        self.stats['checkpoint_wal'] = wal_bytes
+        self.stats['checkpoint_wal_max'] = max(self.stats['checkpoint_wal_max'], wal_bytes)
+        self.stats['checkpoint_wal_file'] = get_wal_bytes(self.db_path)
+
+        if mode == "RESTART" and (busy or checkpointed_frames < log_frames):
+            self.stats['checkpoint_busy'] += 1
+            self.next_time = time.monotonic() + self.retry_delay
+        else:
+            self.next_time = time.monotonic() + self.interval
+
+        if mode == "RESTART":
+            print(f"WAL checkpoint (RESTART): {wal_bytes / 1048576:.1f} MiB in the WAL, {checkpointed_frames}/{log_frames} frames, {elapsed_time:.3f}s{', busy' if busy else ''}")
+
+        return mode, busy, log_frames, checkpointed_frames
+
+def format_stats(stats):
+    return f"{stats['checkpoints']:.0f} ({stats['checkpoint_restart']:.0f} restart), {stats['checkpoint_busy']:.0f} busy retries, {stats['checkpoint_seconds']:.3f}s, WAL {stats['checkpoint_wal'] / 1048576:.1f} MiB (max {stats['checkpoint_wal_max'] / 1048576:.1f} MiB, file {stats['checkpoint_wal_file'] / 1048576:.1f} MiB)"
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+# Global Variable -- End
@@ -0,0 +1,131 @@
+# Import Module -- Start
+
+import threading
+import sqlite3
+import time
+import collections
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+class DnsCache:
+
+    """Size-bounded LRU map of ip -> domain ('None' when unresolvable) with separate positive and negative TTLs.
+
+    Entries are only read from the dns table on demand (load) and only the ones changed since the
+    last take_dirty() are written back, see write_dns_table.
+    """
+
+    def __init__(self, db_path=None, max_size=65536, ttl=3600, negative_ttl=300, track_loaded=False):
+
+        self.db_path = db_path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # ip -> (domain, resolved_at), least recently used first
+        self.dirty = {}  # ip -> (domain, resolved_at) not yet persisted, survives eviction
+        self.loaded = {} if track_loaded else None  # ip -> (domain, resolved_at) read by load() since take_loaded()
+        self.local = threading.local()  # per-thread read connection for load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def expired(self, domain, resolved_at, now):
+        return now - resolved_at > (self.negative_ttl if domain == 'None' else self.ttl)
+
+    def get(self, ip, default=None):
+
+        # Hot path, runs twice per packet: no lock, the dict operations themselves are atomic
+        entry = self.entries.get(ip)
+
+        if entry is None:
+            return default
+
+        if self.expired(entry[0], entry[1], time.time()):
+            self.entries.pop(ip, None)
+            return default
+
+        try:
+            self.entries.move_to_end(ip)
+        except KeyError:
+            pass  # evicted by another thread in between
+
+        return entry[0]
+
+    def set(self, ip, domain, resolved_at=None, dirty=True):
+
+        entry = (domain, time.time() if resolved_at is None else resolved_at)
+
+        with self.lock:
+            self.entries[ip] = entry
+            self.entries.move_to_end(ip)
+
+            if dirty:
+                self.dirty[ip] = entry
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def __setitem__(self, ip, domain):
+        self.set(ip, domain)
+
+    def load(self, ip):
+
+        """Look ip up in the persisted dns table, caching and returning the domain unless missing or expired."""
+        if self.db_path is None:
+            return None
+
+        conn = getattr(self.local, 'conn', None)
+
+        try:
+            if conn is None:
+                conn = self.local.conn = sqlite3.connect(self.db_path)
+            row = conn.execute("SELECT domain, COALESCE(resolved_at, 0) FROM dns WHERE ip = ?", (ip,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"DNS cache load error: {e}")
+            return None
+
+        if row is None or self.expired(row[0], row[1], time.time()):
+            return None
+
+        self.set(ip, row[0], row[1], dirty=False)
+
+        if self.loaded is not None:
+            with self.lock:
+                self.loaded[ip] = (row[0], row[1])
+
+        return row[0]
+
+    def take_dirty(self):
+
+        """Return and forget the entries changed since the last call, as {ip: (domain, resolved_at)}."""
+        with self.lock:
+            dirty = self.dirty
+            self.dirty = {}
+
+        return dirty
+
+    def take_loaded(self):
+
+        """Return and forget the entries read from the dns table since the last call (track_loaded only)."""
+        with self.lock:
+            loaded = self.loaded
+            self.loaded = {}
+
+        return loaded
+
+    def merge(self, entries, dirty=True):
+
+        """Add entries from another cache's take_dirty()/take_loaded()."""
+        for ip, (domain, resolved_at) in entries.items():
+            self.set(ip, domain, resolved_at, dirty)
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+
+# Global Variable -- End
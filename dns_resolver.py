@@ -0,0 +1,177 @@
+# Import Module -- Start
+
+import threading
+import queue
+import socket
+import time
+import collections
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+def start(dns_cache, worker_count=4, timeout=2.0, max_pending=1024):
+
+    """Start the background lookup pool filling dns_cache (a dns_cache.DnsCache)."""
+    global cache
+    cache = dns_cache
+
+    global lookup_timeout
+    lookup_timeout = timeout
+
+    global request_queue
+    request_queue = queue.Queue(maxsize=max_pending)
+
+    # Queued plus being looked up, and the lookups left running past their deadline, are bounded as well
+    global max_in_flight, max_stuck
+    max_in_flight = max_pending + worker_count
+    max_stuck = worker_count * 4
+
+    for _ in range(worker_count):
+        threading.Thread(target=lookup_worker, daemon=True).start()  # daemon, a stuck lookup must not block shutdown
+
+def resolve(ip):
+
+    """Return the cached domain for ip, or 'None' while a background lookup is queued for it."""
+    domain = cache.get(ip)
+
+    if domain is not None:
+        stats['cache_hits'] += 1
+        return domain
+
+    with lock:
+        now = time.monotonic()
+        submitted = in_flight.get(ip)
+
+        if submitted is None:
+            if len(in_flight) >= max_in_flight:
+                expire_in_flight(now)
+
+            try:
+                if len(in_flight) >= max_in_flight:
+                    raise queue.Full
+                request_queue.put_nowait(ip)
+            except queue.Full:
+                # Retried the next time the ip shows up, counted once until it gets queued
+                if ip not in dropped:
+                    stats['dropped'] += 1
+                    dropped[ip] = True
+                    if len(dropped) > MAX_DROPPED:
+                        dropped.popitem(last=False)
+                return 'None'
+
+            dropped.pop(ip, None)
+            in_flight[ip] = now
+            stats['lookups'] += 1
+
+        elif now - submitted > lookup_timeout * 2:
+            # Queued for too long behind other lookups, remember the failure so the ip is not queued again
+            del in_flight[ip]
+            cache[ip] = 'None'
+            stats['timeouts'] += 1
+
+    return 'None'
+
+def expire_in_flight(now):
+
+    # Entries of ips never seen again once their lookup was given up on, oldest first as the dict keeps insertion order
+    for ip, submitted in list(in_flight.items()):
+        if now - submitted <= lookup_timeout * 2:
+            break
+        del in_flight[ip]
+        stats['timeouts'] += 1
+
+def lookup_worker():
+
+    global stuck
+
+    while True:
+        ip = request_queue.get()
+
+        with lock:
+            if ip not in in_flight:
+                continue  # given up on while queued, its 'None' is cached already
+
+        # Resolved by an earlier run and still fresh, no need to ask the resolver again
+        if cache.load(ip) is not None:
+            with lock:
+                in_flight.pop(ip, None)
+                stats['loaded'] += 1
+            continue
+
+        # gethostbyaddr cannot be cancelled: it runs in its own thread and the worker waits for it up to the
+        # deadline, a dead resolver then holds that thread instead of the worker
+        answer = {}
+        with lock:
+            overloaded = stuck >= max_stuck
+
+        if not overloaded:
+            lookup = threading.Thread(target=lookup_host, args=(ip, answer), daemon=True)
+            lookup.start()
+            lookup.join(lookup_timeout)
+
+        with lock:
+            in_flight.pop(ip, None)
+
+            if 'hostname' not in answer:
+                # Too many lookups already stuck, or this one past its deadline: its answer will be discarded
+                answer['abandoned'] = True
+                stuck += not overloaded
+                cache[ip] = 'None'
+                stats['timeouts'] += 1
+                continue
+
+            cache[ip] = answer['hostname']
+            stats['resolved' if answer['hostname'] != 'None' else 'failed'] += 1
+
+def lookup_host(ip, answer):
+
+    global stuck
+
+    try:
+        # Perform reverse DNS lookup to get the hostname for the given IP address
+        hostname, _, _ = socket.gethostbyaddr(ip)
+    except (socket.herror, socket.gaierror, OSError):
+        hostname = 'None'
+
+    with lock:
+        if answer.get('abandoned'):
+            stuck -= 1
+            stats['late'] += 1  # the worker gave up on it, the ip stays unresolved for the negative ttl
+        else:
+            answer['hostname'] = hostname
+
+def get_stats(reset=False):
+
+    """Return the lookup counters, optionally zeroing them so callers can sum deltas."""
+    with lock:
+        current = dict(stats)
+        current['pending'] = len(in_flight)
+        if reset:
+            stats.clear()
+
+    return current
+
+def format_stats(current):
+
+    return ", ".join(f"{name} {current.get(name, 0):.0f}" for name in STAT_NAMES)
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+STAT_NAMES = ('lookups', 'cache_hits', 'loaded', 'resolved', 'failed', 'timeouts', 'late', 'dropped', 'pending')
+
+lock = threading.Lock()
+
+in_flight = {}  # ip -> monotonic time the lookup was queued
+
+dropped = collections.OrderedDict()  # ips turned away by a full queue since they were last queued
+
+MAX_DROPPED = 65536
+
+stuck = 0  # lookups still running past their deadline
+
+stats = collections.defaultdict(int)
+
+# Global Variable -- End
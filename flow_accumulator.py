@@ -0,0 +1,100 @@
+# Import Module -- Start
+
+import time
+import collections
+
+import flow_schema
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+class FlowAccumulator:
+
+    """Sums the flows of the windows a receiver takes per (sender, flow key) until they are written.
+
+    A flow arriving again before the flush adds to its total in memory instead of updating its row once more, the
+    rows written follow the distinct flows rather than the messages. take() is due once max_flows flows are held,
+    interval seconds after the first add() or when the 1m rollup bucket of the held flows is over, so the flows
+    written at the time of the last add() keep their minute.
+    """
+
+    def __init__(self, max_flows=100000, interval=5):
+
+        self.max_flows = max_flows
+        self.interval = interval
+
+        self.senders = {}  # (sender_domain, sender_ip) -> {flow key: total_length}
+        self.sequences = {}  # (sender_domain, sender_ip) -> {stream: (first seq, last seq)}
+        self.flows = 0
+
+        self.first_time = None
+        self.last_time = None
+
+        self.stats = collections.defaultdict(float)  # messages, rows, flushes, flushed_rows
+
+    def add(self, rows, sender, sequence=None, now=None):
+
+        """Add the (flow key, total_length) rows of a message of sender, with the (stream, first, last) sequence numbers it covers."""
+        now = time.time() if now is None else now
+
+        if self.first_time is None:
+            self.first_time = now
+        self.last_time = now
+
+        flows = self.senders.setdefault(sender, {})
+        held = len(flows)
+
+        for key, total_length in rows:
+            flows[key] = flows.get(key, 0) + total_length
+
+        self.flows += len(flows) - held
+
+        if sequence:
+            stream, first_seq, last_seq = sequence
+            sequences = self.sequences.setdefault(sender, {})
+            held_first, _ = sequences.get(stream, (first_seq, last_seq))
+            sequences[stream] = (min(held_first, first_seq), last_seq)
+
+        self.stats['messages'] += 1
+        self.stats['rows'] += len(rows)
+
+    def last_seq(self, stream):
+
+        # Held windows count as written for the duplicates check
+        return max((sequences[stream][1] for sequences in self.sequences.values() if stream in sequences), default=0)
+
+    def due(self, now=None):
+        if self.first_time is None:
+            return False
+
+        now = time.time() if now is None else now
+        minute = flow_schema.ROLLUP_TIERS['1m']
+
+        return self.flows >= self.max_flows or now - self.first_time >= self.interval or int(now) // minute != int(self.last_time) // minute
+
+    def take(self):
+
+        """Hand over what is held as [(sender, [(flow key, total_length), ...], [(stream, first, last), ...]), ...] and the time of the last add()."""
+        taken = [(sender, list(flows.items()), [(stream, *seqs) for stream, seqs in self.sequences.get(sender, {}).items()]) for sender, flows in self.senders.items()]
+        now = self.last_time
+
+        self.stats['flushes'] += bool(taken)
+        self.stats['flushed_rows'] += self.flows
+
+        self.senders = {}
+        self.sequences = {}
+        self.flows = 0
+        self.first_time = None
+        self.last_time = None
+
+        return taken, now
+
+    def format_stats(self):
+        return f"{self.stats['messages']:.0f} messages with {self.stats['rows']:.0f} flows written as {self.stats['flushed_rows']:.0f} rows in {self.stats['flushes']:.0f} flushes ({self.stats['rows'] / max(self.stats['flushed_rows'], 1):.1f}x)"
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+# Global Variable -- End
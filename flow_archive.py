@@ -0,0 +1,239 @@
+# Import Module -- Start
+
+import os
+import math
+import json
+import shutil
+import numpy
+
+import flow_key
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+class ArchiveWriter:
+
+    """Append-only archive of closed flow windows in immutable columnar segments under path.
+
+    Windows are buffered until segment_seconds have passed since the first one or segment_rows rows are held,
+    then written out as one segment directory: a .npy file per column and meta.json with the dictionaries of
+    the string columns. index.json lists the segments by time range, see scan(). The buffer is only kept in
+    memory, the windows of a crashed collector are in the live database but not in the archive.
+    """
+
+    def __init__(self, path, segment_seconds=3600, segment_rows=1000000, retention=0):
+
+        self.path = path
+        self.segment_seconds = segment_seconds
+        self.segment_rows = segment_rows
+        self.retention = retention  # seconds a segment is kept after its last window, 0 for forever
+
+        self.windows = []  # (window time, [(flow key, total_length), ...]) not yet written
+        self.rows = 0
+
+        os.makedirs(path, exist_ok=True)
+
+        # Segments half-written when the collector died, their windows are lost to the archive
+        for name in os.listdir(path):
+            if name.endswith(".tmp"):
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+        self.index = read_index(path)
+
+    def add(self, items, now):
+
+        """Archive the (flow key, total_length) items of a window closed at epoch now."""
+        if self.windows and (now - self.windows[0][0] >= self.segment_seconds or self.rows >= self.segment_rows):
+            self.flush()
+
+        if items:
+            self.windows.append((int(now), items))
+            self.rows += len(items)
+
+    def flush(self):
+
+        """Write the buffered windows out as a segment, returns its index entry or None when nothing was buffered."""
+        if not self.windows:
+            return None
+
+        start = self.windows[0][0]
+        end = self.windows[-1][0] + 1
+        name = f"segment-{start}-{end}"
+        temp_path = os.path.join(self.path, f"{name}.tmp")
+
+        os.makedirs(temp_path, exist_ok=True)
+
+        times = numpy.fromiter((window_time for window_time, items in self.windows for _ in items), dtype=numpy.uint32, count=self.rows)
+        keys = [key for _, items in self.windows for key, _ in items]
+        lengths = numpy.fromiter((total_length for _, items in self.windows for _, total_length in items), dtype=numpy.int64, count=self.rows)
+
+        dictionaries = {}
+        numpy.save(os.path.join(temp_path, "time.npy"), times)
+        numpy.save(os.path.join(temp_path, "total_length.npy"), lengths)
+
+        for position, column in enumerate(flow_key.FLOW_KEY_FIELDS):
+            if column in PORT_COLUMNS:
+                values = numpy.fromiter((to_port(key[position]) for key in keys), dtype=numpy.int32, count=self.rows)
+            else:
+                values, dictionaries[column] = encode_strings([key[position] for key in keys])
+            numpy.save(os.path.join(temp_path, f"{column}.npy"), values)
+
+        with open(os.path.join(temp_path, "meta.json"), "w") as f:
+            json.dump({"start": start, "end": end, "rows": self.rows, "dictionaries": dictionaries}, f)
+
+        # Renamed into place only once complete, a segment is never seen half-written and never changes after
+        os.replace(temp_path, os.path.join(self.path, name))
+
+        entry = {"name": name, "start": start, "end": end, "rows": self.rows}
+        self.index.append(entry)
+        self.windows = []
+        self.rows = 0
+
+        if self.retention:
+            self.expire(end - self.retention)
+
+        write_index(self.path, self.index)
+
+        return entry
+
+    def expire(self, before):
+
+        """Delete the segments whose last window closed before epoch before."""
+        expired = [entry for entry in self.index if entry["end"] <= before]
+
+        for entry in expired:
+            self.index.remove(entry)
+            shutil.rmtree(os.path.join(self.path, entry["name"]), ignore_errors=True)
+
+        return expired
+
+def to_port(port):
+
+    # Ports are text with 'None' when absent in flow keys, -1 in the archive
+    try:
+        return int(port)
+    except (TypeError, ValueError):
+        return -1
+
+def encode_strings(values):
+
+    """Dictionary-encode values into the narrowest unsigned codes, returns (codes, dictionary)."""
+    codes = {}
+    encoded = [codes.setdefault(value, len(codes)) for value in values]
+
+    dtype = numpy.uint8 if len(codes) <= 0x100 else numpy.uint16 if len(codes) <= 0x10000 else numpy.uint32
+
+    return numpy.array(encoded, dtype=dtype), list(codes)
+
+def read_index(path):
+
+    try:
+        with open(os.path.join(path, "index.json"), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+def write_index(path, index):
+
+    temp_path = os.path.join(path, "index.json.tmp")
+
+    with open(temp_path, "w") as f:
+        json.dump(index, f)
+
+    os.replace(temp_path, os.path.join(path, "index.json"))
+
+def find_segments(path, start=None, end=None):
+
+    """Index entries of the segments holding windows with start <= window time < end, oldest first."""
+    return sorted((entry for entry in read_index(path) if (start is None or entry["end"] > start) and (end is None or entry["start"] < end)), key=lambda entry: entry["start"])
+
+def load_segment(path, entry):
+
+    """Return (meta, columns) of a segment, the columns memory-mapped read-only."""
+    segment_path = os.path.join(path, entry["name"])
+
+    with open(os.path.join(segment_path, "meta.json"), "r") as f:
+        meta = json.load(f)
+
+    columns = {column: numpy.load(os.path.join(segment_path, f"{column}.npy"), mmap_mode='r') for column in ARCHIVE_COLUMNS}
+
+    return meta, columns
+
+def scan(path, start=None, end=None, group_by=('process_name',), where=None):
+
+    """Sum total_length over the archived flows of the windows with start <= window time < end, grouped by group_by.
+
+    group_by and where take archive columns: the flow key fields and time. where maps a column to a value or a
+    list/set of accepted ones, ports as integers (-1 when absent). Only the segment files are read, never the
+    live database. Returns {group tuple: total_length}.
+    """
+    totals = {}
+
+    for entry in find_segments(path, start, end):
+        meta, columns = load_segment(path, entry)
+        dictionaries = meta["dictionaries"]
+
+        mask = numpy.ones(meta["rows"], dtype=bool)
+        if start is not None and entry["start"] < start:
+            mask &= columns["time"] >= start
+        if end is not None and entry["end"] > end:
+            mask &= columns["time"] < end
+
+        for column, accepted in (where or {}).items():
+            accepted = accepted if isinstance(accepted, (list, tuple, set, frozenset)) else [accepted]
+            if column in dictionaries:
+                # Compared on the codes, values missing from this segment's dictionary match nothing
+                positions = {value: code for code, value in enumerate(dictionaries[column])}
+                accepted = [positions[value] for value in accepted if value in positions]
+            mask &= numpy.isin(columns[column], list(accepted))
+
+        if not mask.any():
+            continue
+
+        lengths = columns["total_length"][mask]
+
+        # Each group column becomes dense codes, combined into one integer per row and summed with bincount
+        codes = []
+        labels = []
+        for column in group_by:
+            values, inverse = numpy.unique(columns[column][mask], return_inverse=True)
+            codes.append(inverse.reshape(-1).astype(numpy.int64))
+            labels.append([dictionaries[column][value] for value in values.tolist()] if column in dictionaries else values.tolist())
+
+        sizes = [len(column_labels) for column_labels in labels]
+
+        if math.prod(sizes) < 2 ** 63:
+            group = numpy.zeros(len(lengths), dtype=numpy.int64)
+            for column_codes, size in zip(codes, sizes):
+                group = group * size + column_codes
+
+            groups, inverse = numpy.unique(group, return_inverse=True)
+
+            group_codes = []
+            for size in reversed(sizes):
+                groups, column_codes = numpy.divmod(groups, size)
+                group_codes.insert(0, column_codes)
+            group_codes = numpy.stack(group_codes, axis=1) if group_codes else numpy.zeros((len(groups), 0), dtype=numpy.int64)
+        else:
+            # Too many distinct combinations for one integer, grouped on the code rows instead
+            group_codes, inverse = numpy.unique(numpy.stack(codes, axis=1), axis=0, return_inverse=True)
+
+        sums = numpy.bincount(inverse.reshape(-1), weights=lengths)  # float64, exact up to 8 PiB per group
+
+        for row, total_length in zip(group_codes.tolist(), sums.tolist()):
+            key = tuple(column_labels[code] for column_labels, code in zip(labels, row))
+            totals[key] = totals.get(key, 0) + int(total_length)
+
+    return totals
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+PORT_COLUMNS = ('src_port', 'dst_port')
+
+# Columns stored per segment: the flow key fields, the closing time of the window and its byte count
+ARCHIVE_COLUMNS = ('time',) + flow_key.FLOW_KEY_FIELDS + ('total_length',)
+
+# Global Variable -- End
@@ -0,0 +1,297 @@
+# Import Module -- Start
+
+import os
+import time
+import socket
+import pathlib
+import sqlite3
+import threading
+import concurrent.futures
+
+import flow_key
+import flow_schema
+import db_tuning
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+def parse_source(source):
+
+    """Split a [SENDER=]PATH import argument into (sender, path), the sender defaulting to the directory name of the file."""
+    sender, separator, path = source.partition("=")
+
+    if not separator or os.path.exists(source):
+        path = source
+        sender = os.path.basename(os.path.dirname(os.path.abspath(source)))
+
+    return sender, path
+
+def resolve_sender(sender):
+
+    """(domain, ip) a sender given by address or host name is recorded under, as the receiver records a live one."""
+    if flow_schema.pack_ip(sender):
+        try:
+            return socket.gethostbyaddr(sender)[0], sender
+        except (OSError, UnicodeError):
+            return 'None', sender
+
+    try:
+        return sender, socket.gethostbyname(sender)
+    except (OSError, UnicodeError):
+        return sender, 'None'
+
+def connect(db_path, storage, timeout=60):
+
+    # uri=True lets ATTACH open the collector database read-only
+    conn = sqlite3.connect(db_path, timeout=timeout, uri=True)
+    conn.create_function("pack_ip", 1, flow_schema.pack_ip, deterministic=True)
+    db_tuning.apply_settings(conn, storage)
+
+    return conn
+
+def source_columns():
+
+    # Any collector layout reads the same through its flat views: TEXT addresses, 'None' ports and datetime strings of the
+    # older ones are converted to the stored types
+    converted = {
+        'src_ip': text_or('src_ip', "pack_ip(src_ip)"),
+        'dst_ip': text_or('dst_ip', "pack_ip(dst_ip)"),
+        'src_port': text_or('src_port', flow_schema.text_port('src_port')),
+        'dst_port': text_or('dst_port', flow_schema.text_port('dst_port')),
+    }
+
+    return ", ".join(f'{converted.get(column, quote(column))} AS {quote(column)}' for column in flow_key.FLOW_KEY_FIELDS)
+
+def text_or(column, converted):
+    return f"CASE WHEN typeof({column}) = 'text' THEN {converted} ELSE {column} END"
+
+def quote(column):
+    return f'"{column}"'
+
+def has_object(c, schema, name):
+    return c.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+def rolled_until(c, schema, name):
+    if not has_object(c, schema, 'rollup_state'):
+        return 0
+    row = c.execute(f"SELECT rolled_until FROM {schema}.rollup_state WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+def stage_source(c, now):
+
+    """Sum the flows and rollup buckets of the attached collector database src into temp.import_rows.
+
+    Flows are bucketed by the receiver partition of their last update, rollup rows keep their tier and bucket.
+    Returns the rolled_until of the collector per rollup tier.
+    """
+    keys = ", ".join(quote(column) for column in flow_key.FLOW_KEY_FIELDS)
+    partition_length = flow_schema.partition_length['receiver_flow']
+    last_updated = f"ifnull({text_or('last_updated', flow_schema.text_time('last_updated'))}, {int(now)})"
+
+    c.execute(f"CREATE TEMP TABLE import_rows (tier TEXT, bucket INTEGER, {keys}, total_length INTEGER, last_updated INTEGER)")
+
+    c.execute(f'''
+        INSERT INTO import_rows
+        SELECT 'flow', updated - updated % {partition_length}, {keys}, SUM(total_length), MAX(updated)
+        FROM (SELECT {source_columns()}, total_length, {last_updated} AS updated FROM src.traffic)
+        GROUP BY updated - updated % {partition_length}, {keys}
+    ''')
+
+    source_rolled = {}
+
+    for tier in flow_schema.ROLLUP_TIERS:
+        source_rolled[tier] = rolled_until(c, 'src', f"flow_{tier}")
+
+        if has_object(c, 'src', f"traffic_{tier}"):
+            c.execute(f'''
+                INSERT INTO import_rows
+                SELECT '{tier}', bucket, {keys}, SUM(total_length), NULL
+                FROM (SELECT bucket, {source_columns()}, total_length FROM src.traffic_{tier})
+                GROUP BY bucket, {keys}
+            ''')
+        elif tier == '1m':
+            # A collector older than the rollups has none, its flows count in the minute of their last update
+            c.execute(f'''
+                INSERT INTO import_rows
+                SELECT '1m', last_updated - last_updated % {flow_schema.ROLLUP_TIERS['1m']}, {keys}, total_length, NULL
+                FROM import_rows WHERE tier = 'flow'
+            ''')
+
+    return source_rolled
+
+def align_rollups(c, source_rolled, now, retention, partition_retention):
+
+    """Bring the staged rollups in line with how far the receiver has downsampled.
+
+    Buckets the receiver has already rolled (before its rolled_until) are never rolled again, the staged tier above
+    gets them rolled here where the collector had not. Past it the receiver rolls the imported lower tier itself,
+    so the staged rows of the tier above are dropped there. Rows past their retention are dropped as well.
+    """
+    keys = ", ".join(quote(column) for column in flow_key.FLOW_KEY_FIELDS)
+    tiers = list(flow_schema.ROLLUP_TIERS.items())
+
+    for (source, _), (target, seconds) in zip(tiers, tiers[1:]):
+        until = rolled_until(c, 'main', f"receiver_flow_{target}")
+        since = source_rolled[target]
+
+        c.execute("DELETE FROM import_rows WHERE tier = ? AND bucket >= ?", (target, until))
+
+        if since < until:
+            c.execute(f'''
+                INSERT INTO import_rows
+                SELECT ?, bucket - bucket % ?, {keys}, SUM(total_length), NULL
+                FROM import_rows
+                WHERE tier = ? AND bucket >= ? AND bucket < ?
+                GROUP BY bucket - bucket % ?, {keys}
+            ''', (target, seconds, source, since, until, seconds))
+
+    for tier in flow_schema.ROLLUP_TIERS:
+        c.execute("DELETE FROM import_rows WHERE tier = ? AND bucket < ?", (tier, int(now) - retention[tier]))
+
+    c.execute("DELETE FROM import_rows WHERE tier = 'flow' AND bucket + ? <= ?", (flow_schema.partition_length['receiver_flow'], int(now) - partition_retention))
+
+def merge_rows(c, sender):
+
+    """Write temp.import_rows under sender into the receiver partitions, flow totals and rollups, returns the (flows, rollup rows) written."""
+    c.execute('''
+        INSERT INTO host (domain, ip)
+        SELECT domain, ip FROM (SELECT src_domain AS domain, src_ip AS ip FROM import_rows UNION SELECT dst_domain, dst_ip FROM import_rows UNION SELECT ?, ?) AS h
+        WHERE NOT EXISTS (SELECT 1 FROM host WHERE host.domain IS h.domain AND host.ip IS h.ip)
+    ''', flow_schema.pack_host(sender))
+
+    for table, columns in (('descriptor', flow_schema.DESCRIPTOR_COLUMNS), ('process', flow_schema.PROCESS_COLUMNS)):
+        column_list = ", ".join(quote(column) for column in columns)
+        condition = " AND ".join(f"{table}.{quote(column)} IS r.{quote(column)}" for column in columns)
+        c.execute(f"INSERT INTO {table} ({column_list}) SELECT DISTINCT {column_list} FROM import_rows AS r WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {condition})")
+
+    sender_id, = c.execute("SELECT id FROM host WHERE domain IS ? AND ip IS ?", flow_schema.pack_host(sender)).fetchone()
+
+    # Keys are mapped to ids once, the partitions and tiers are then filled from the mapped rows
+    descriptor_join = " AND ".join(f"d.{quote(column)} IS r.{quote(column)}" for column in flow_schema.DESCRIPTOR_COLUMNS)
+    process_join = " AND ".join(f"p.{quote(column)} IS r.{quote(column)}" for column in flow_schema.PROCESS_COLUMNS)
+
+    c.execute(f'''
+        CREATE TEMP TABLE import_ids AS
+        SELECT r.tier, r.bucket, {sender_id} AS sender_host_id, src.id AS src_host_id, r.src_port, dst.id AS dst_host_id, r.dst_port, d.id AS descriptor_id, p.id AS process_id, r.total_length, r.last_updated
+        FROM import_rows AS r
+        JOIN host AS src ON src.domain IS r.src_domain AND src.ip IS r.src_ip
+        JOIN host AS dst ON dst.domain IS r.dst_domain AND dst.ip IS r.dst_ip
+        JOIN descriptor AS d ON {descriptor_join}
+        JOIN process AS p ON {process_join}
+    ''')
+
+    column_list = ", ".join(flow_schema.key_columns(True))
+    conflict_target = ", ".join(flow_schema.key_expressions(True))
+    flows = 0
+    rollups = 0
+
+    for start, in c.execute("SELECT DISTINCT bucket FROM import_ids WHERE tier = 'flow' ORDER BY bucket").fetchall():
+        partition = flow_schema.current_partition(c, start, receiver=True)
+        c.execute(f'''
+            INSERT INTO {partition} ({column_list}, total_length, last_updated)
+            SELECT {column_list}, total_length, last_updated FROM import_ids WHERE tier = 'flow' AND bucket = ?
+            ON CONFLICT({conflict_target})
+            DO UPDATE SET total_length = total_length + excluded.total_length, last_updated = max(last_updated, excluded.last_updated)
+        ''', (start,))
+        flows += c.rowcount
+
+    c.execute(f'''
+        INSERT INTO receiver_flow_totals ({column_list}, total_length, last_updated, src_known_port, dst_known_port)
+        SELECT {column_list}, SUM(total_length), MAX(last_updated), {flow_schema.known_port_sql('src_port')}, {flow_schema.known_port_sql('dst_port')}
+        FROM import_ids WHERE tier = 'flow' GROUP BY {column_list}
+        ON CONFLICT({conflict_target})
+        DO UPDATE SET total_length = total_length + excluded.total_length, last_updated = max(last_updated, excluded.last_updated)
+    ''')
+
+    for tier in flow_schema.ROLLUP_TIERS:
+        c.execute(f'''
+            INSERT INTO receiver_flow_{tier} (bucket, {column_list}, total_length)
+            SELECT bucket, {column_list}, total_length FROM import_ids WHERE tier = ?
+            ON CONFLICT(bucket, {conflict_target})
+            DO UPDATE SET total_length = total_length + excluded.total_length
+        ''', (tier,))
+        rollups += c.rowcount
+
+    return flows, rollups
+
+def import_database(db_path, sender, source_path, storage, retention, partition_retention):
+
+    """Merge one collector database into the receiver database under sender, returns (sender identity, flows, rollup rows)."""
+    if not os.path.isfile(source_path):
+        raise FileNotFoundError(f"Collector database not found: {source_path}")
+
+    now = time.time()
+    sender = resolve_sender(sender)
+    conn = connect(db_path, storage)
+    c = conn.cursor()
+
+    try:
+        # Staged in this connection's temp tables, many sources are read and summed at once without holding the write lock
+        c.execute("ATTACH ? AS src", (f"{pathlib.Path(source_path).absolute().as_uri()}?mode=ro",))
+        source_rolled = stage_source(c, now)
+        conn.commit()
+
+        # One writer at a time: SQLite would serialize the merges anyway, and the partition cache of flow_schema is shared
+        with merge_lock:
+            try:
+                c.execute("BEGIN IMMEDIATE")
+                align_rollups(c, source_rolled, now, retention, partition_retention)
+                flows, rollups = merge_rows(c, sender)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                flow_schema.clear_cache()
+                raise
+
+        return sender, flows, rollups
+
+    finally:
+        conn.close()
+
+def import_databases(db_path, sources, storage=None, jobs=4, retention=None, partition_retention=2592000):
+
+    """Merge the collector databases of (sender, path) sources into the receiver database at db_path, jobs at a time.
+
+    Expects the receiver tables to exist (flow_schema.create_traffic_tables). Returns the number of sources imported.
+    """
+    storage = storage or {}
+    retention = retention or dict(flow_schema.ROLLUP_RETENTION)
+    start_time = time.perf_counter()
+
+    # Rolled up to now first, the imported buckets before it are rolled here and the later ones by the receiver
+    conn = connect(db_path, storage)
+    flow_schema.downsample(conn.cursor(), time.time(), retention, receiver=True)
+    conn.commit()
+
+    imported = 0
+    flows = 0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {executor.submit(import_database, db_path, sender, path, storage, retention, partition_retention): path for sender, path in sources}
+
+        for future in concurrent.futures.as_completed(futures):
+            path = futures[future]
+            try:
+                (sender_domain, sender_ip), source_flows, source_rollups = future.result()
+            except Exception as e:
+                print(f"Import error: {path}: {e}")
+                continue
+
+            imported += 1
+            flows += source_flows
+            print(f"Imported {path} as {sender_domain} ({sender_ip}): {source_flows} flows, {source_rollups} rollup rows")
+
+    print(f"Imported {imported}/{len(sources)} databases, {flows} flows in {time.perf_counter() - start_time:.1f}s")
+
+    conn.close()
+
+    return imported
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+merge_lock = threading.Lock()
+
+# Global Variable -- End
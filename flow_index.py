@@ -0,0 +1,69 @@
+# Import Module -- Start
+
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+def create_indexes(c, table, definitions):
+
+    """Create the missing indexes of definitions (suffix -> indexed expression) on table and drop managed ones no longer defined.
+
+    No ANALYZE is run on purpose: with sampled statistics the planner started driving unfiltered dashboard scans
+    through the small dimension tables, the default heuristics pick the indexes only for selective filters and sorts.
+    """
+    wanted = {f"ix_{table}_{suffix}": expression for suffix, expression in definitions.items()}
+    existing = {name for name, in c.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND name LIKE 'ix\\_%' ESCAPE '\\'", (table,))}
+
+    for name in existing - wanted.keys():
+        c.execute(f"DROP INDEX IF EXISTS {name}")
+
+    for name in sorted(wanted.keys() - existing):
+        c.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({wanted[name]})")
+
+def get_definitions(names=None, receiver=False):
+
+    """Return the TRAFFIC_INDEXES definitions named in names (a traffic_indexes setting), all of them when None."""
+    definitions = dict(TRAFFIC_INDEXES, **(RECEIVER_INDEXES if receiver else {}))
+
+    if names is None:
+        return definitions
+
+    for name in names:
+        if name not in definitions:
+            print(f"Ignoring unknown traffic index '{name}', known ones are: {', '.join(definitions)}")
+
+    return {name: expression for name, expression in definitions.items() if name in names}
+
+def create_dimension_indexes(c):
+
+    # host is only unique on (domain, ip) and process/descriptor lead their unique keys with the filtered column already
+    create_indexes(c, 'host', HOST_INDEXES)
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+# Dashboard columns -> index on the flow totals: sorts on total_length/last_updated, dst_ip and process_name
+# filters (through the ids). The receiver totals lead their unique key with sender_host_id, which already serves
+# sender_ip filters. known_port holds the key with the well-known-port buckets of the ports in place of them, the
+# grouped dashboard modes read their groups off it in order. The per-period partitions have no dashboard indexes,
+# they are only written and dropped
+TRAFFIC_INDEXES = {
+    'dst_host': 'dst_host_id',
+    'process': 'process_id',
+    'total_length': 'total_length',
+    'last_updated': 'last_updated',
+    'known_port': 'src_host_id, src_known_port, dst_host_id, dst_known_port, descriptor_id, process_id',
+}
+
+# The receiver groups by sender as well
+RECEIVER_INDEXES = {
+    'known_port': 'sender_host_id, src_host_id, src_known_port, dst_host_id, dst_known_port, descriptor_id, process_id',
+}
+
+HOST_INDEXES = {
+    'ip': 'ip',
+}
+
+# Global Variable -- End
@@ -0,0 +1,57 @@
+# Import Module -- Start
+
+import sys
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+def intern_key(key):
+
+    """Intern the interface/direction/protocol/tos fields so every flow key shares one string object for them."""
+    # Process and domain fields already arrive shared from the flow_parser and DNS caches
+    return key[:6] + tuple(map(sys.intern, key[6:11])) + key[11:]
+
+def parse_legacy_key(key):
+
+    """Split a " ~~ "/" ~~~ " joined key string, as sent by collectors before tuple keys."""
+    key_src, key_dst, key_etc, key_process, key_parent_process = key.split(" ~~~ ")
+    src_domain, src_ip, src_port = key_src.split(" ~~ ")
+    dst_domain, dst_ip, dst_port = key_dst.split(" ~~ ")
+    interface, direction, network_proto, trans_proto, tos, desc = key_etc.split(" ~~ ")
+    process_name, process_cmd, process_arg = key_process.split(" ~~ ")
+    parent_process_name, parent_process_cmd, parent_process_arg = key_parent_process.split(" ~~ ")
+
+    return (src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg)
+
+def to_key(key):
+
+    """Normalize a forwarded key (list or legacy string) into a flow key tuple."""
+    if isinstance(key, str):
+        return parse_legacy_key(key)
+
+    if not isinstance(key, (list, tuple)):
+        raise ValueError(f"Flow key is a {type(key).__name__}, expected a list of {len(FLOW_KEY_FIELDS)} fields")
+
+    if len(key) != len(FLOW_KEY_FIELDS):
+        raise ValueError(f"Flow key has {len(key)} fields, expected {len(FLOW_KEY_FIELDS)}")
+
+    key = tuple(key)
+    hash(key)  # a TypeError for list or dict fields, here rather than once the key is summed
+
+    return key
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+# Flow keys are plain tuples in this column order, the same order as the traffic table
+FLOW_KEY_FIELDS = (
+    'src_domain', 'src_ip', 'src_port',
+    'dst_domain', 'dst_ip', 'dst_port',
+    'interface', 'direction', 'network_proto', 'trans_proto', 'tos', 'desc',
+    'process_name', 'process_cmd', 'process_arg',
+    'parent_process_name', 'parent_process_cmd', 'parent_process_arg',
+)
+
+# Global Variable -- End
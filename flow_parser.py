@@ -0,0 +1,185 @@
+# Import Module -- Start
+
+import re
+import sys
+import collections
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+# Parsed ptcpdump line, fields use the same 'None' placeholders as the flow key
+Packet = collections.namedtuple('Packet', [
+    'interface', 'direction', 'network_proto', 'trans_proto', 'tos', 'desc',
+    'src_ip', 'src_port', 'dst_ip', 'dst_port',
+    'process_name', 'process_cmd', 'process_arg',
+    'parent_process_name', 'parent_process_cmd', 'parent_process_arg',
+    'length', 'flag',
+])
+
+def declare_family_pattern():
+
+    # One anchored scan per protocol family, matched right after the prefix
+    pattern = {
+        'prefix': re.compile(r"(?P<interface>\S+)\s(?P<direction>In|Out)\s(?P<network_proto>[^,\r\n\t\f\v ]+)"),
+        'IP': re.compile(
+            r"(?:.*?tos\s(?P<tos>\S+)\,)?.*?proto\s(?P<trans_proto>\S+)\s.*?length\s(?P<length>\d+)"
+            r".*?(?P<src_ip>\d+\.\d+\.\d+\.\d+)(?:\.(?P<src_port>\d+))?\s>\s(?P<dst_ip>\d+\.\d+\.\d+\.\d+)(?:\.(?P<dst_port>\d+))?:"
+            r"(?:\sFlags\s\[(?P<flag>[^\]]+)\])?"
+        ),
+        'IP6': re.compile(
+            r".*?next-header\s(?P<trans_proto>\S+)\s.*?length:\s(?P<length>\d+)"
+            r".*?(?P<src_ip>[0-9a-fA-F:]+)(?:\.(?P<src_port>\d+))?\s>\s(?P<dst_ip>[0-9a-fA-F:]+)(?:\.(?P<dst_port>\d+))?:"
+            r"(?:\sFlags\s\[(?P<flag>[^\]]+)\])?"
+        ),
+        'ARP': re.compile(
+            r".*?(?:who-has\s(?P<req_target_ip>\d+\.\d+\.\d+\.\d+)\stell\s(?P<src_ip>\d+\.\d+\.\d+\.\d+)"
+            r"|Reply\s(?P<rep_target_ip>\d+\.\d+\.\d+\.\d+)\sis-at\s(?P<target_mac>[0-9a-fA-F]{2}(?::[0-9a-fA-F]{2}){5}))\,"
+            r".*?length\s(?P<length>\d+)"
+        ),
+        'process': re.compile(r"Process\s\(pid\s(?P<process_pid>\d+)\,\scmd\s(?P<process_cmd>[^,]*)\,\sargs\s(?P<process_arg>[^,]*)\)\,"),
+        'parent_process': re.compile(r"ParentProc\s\(pid\s(?P<parent_process_pid>\d+)\,\scmd\s(?P<parent_process_cmd>[^,]*)\,\sargs\s(?P<parent_process_arg>[^,]*)\)"),
+        'sni': re.compile(r"SNI=(\S+)\)"),
+    }
+
+    return pattern
+
+def parse_process(line):
+
+    # Cheap substring probes first, the regexes only run on the tail starting at the first candidate
+    position = line.find("Process (")
+    if position == -1:
+        position = line.find("ParentProc (")
+        if position == -1:
+            return NO_PROCESS
+
+    # The same process keeps printing the same tail, so its parsed and interned fields are reused
+    tail = line[position:]
+    process = process_cache.get(tail)
+    if process is not None:
+        return process
+
+    process_info = pattern['process'].search(tail)
+
+    if process_info:
+        process_cmd, process_arg = process_info.group('process_cmd', 'process_arg')
+        process_name = process_cmd.rsplit("/", 1)[-1]
+    else:
+        process_name = process_cmd = process_arg = 'None'
+
+    position = tail.find("ParentProc (")
+    parent_process_info = pattern['parent_process'].search(tail, position) if position != -1 else None
+
+    if parent_process_info:
+        parent_process_cmd, parent_process_arg = parent_process_info.group('parent_process_cmd', 'parent_process_arg')
+        parent_process_name = parent_process_cmd.rsplit("/", 1)[-1]
+    else:
+        parent_process_name = parent_process_cmd = parent_process_arg = 'None'
+
+    process = tuple(map(sys.intern, (process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg)))
+
+    if len(process_cache) >= PROCESS_CACHE_SIZE:
+        process_cache.clear()
+    process_cache[tail] = process
+
+    return process
+
+def parse_sni(line):
+
+    position = line.find("SNI=")
+    if position == -1:
+        return 'None'
+
+    sni = pattern['sni'].search(line, position)
+    if sni:
+        return f"sni: {sni.group(1)}"
+
+    return 'None'
+
+def parse_ip(line, position, interface, direction, network_proto):
+
+    ip = pattern[network_proto].match(line, position)
+
+    if not ip:
+        print(f"Captured unparsed: {line.strip()}")
+        return None
+
+    trans_proto, src_ip, src_port, dst_ip, dst_port, flag = ip.group('trans_proto', 'src_ip', 'src_port', 'dst_ip', 'dst_port', 'flag')
+    tos = (ip.group('tos') or 'None') if network_proto == "IP" else 'None'
+
+    if trans_proto == "TCP":
+
+        if flag is None or src_port is None:
+            print(f"Captured IP-TCP packet without ip_port_flag pattern: {line.strip()}")
+            return None
+
+        return Packet(interface, direction, network_proto, trans_proto, tos, parse_sni(line), src_ip, src_port, dst_ip, dst_port, *parse_process(line), int(ip.group('length')), flag)
+
+    elif trans_proto == "UDP":
+
+        if src_port is None:
+            print(f"Captured unparsed: {line.strip()}")
+            return None
+
+        return Packet(interface, direction, network_proto, trans_proto, tos, 'None', src_ip, src_port, dst_ip, dst_port, *parse_process(line), int(ip.group('length')), None)
+
+    elif trans_proto == "ICMPv4" or trans_proto == "ICMPv6":
+
+        return Packet(interface, direction, network_proto, trans_proto, tos, 'None', src_ip, 'None', dst_ip, 'None', 'None', 'None', 'None', 'None', 'None', 'None', int(ip.group('length')), None)
+
+    print(f"Captured unparsed: {line.strip()}")
+    return None
+
+def parse_arp(line, position, interface, direction, network_proto):
+
+    arp = pattern['ARP'].match(line, position)
+
+    if not arp:
+        print(f"Captured unparsed: {line.strip()}")
+        return None
+
+    if arp.group('req_target_ip'):
+        src_ip = arp.group('src_ip')
+        desc = f"target_ip: {arp.group('req_target_ip')}"
+    else:
+        src_ip = 'None'
+        desc = f"target_ip: {arp.group('rep_target_ip')}, target_mac: {arp.group('target_mac')}"
+
+    return Packet(interface, direction, network_proto, 'None', 'None', desc, src_ip, 'None', 'None', 'None', 'None', 'None', 'None', 'None', 'None', 'None', int(arp.group('length')), None)
+
+def parse_line(line):
+
+    """Parse one ptcpdump --oneline -v line into a Packet, or None if it carries no flow."""
+    prefix = pattern['prefix'].match(line)
+
+    if not prefix:
+        return None
+
+    interface, direction, network_proto = prefix.groups()
+    family = dispatch.get(network_proto)
+
+    if family is None:
+        print(f"Captured uncategorized packet: {line.strip()}")
+        return None
+
+    return family(line, prefix.end(), interface, direction, network_proto)
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+pattern = declare_family_pattern()
+
+NO_PROCESS = ('None', 'None', 'None', 'None', 'None', 'None')
+
+PROCESS_CACHE_SIZE = 4096
+
+process_cache = {}
+
+dispatch = {
+    'IP': parse_ip,
+    'IP6': parse_ip,
+    'ARP': parse_arp,
+}
+
+# Global Variable -- End
@@ -0,0 +1,655 @@
+# Import Module -- Start
+
+import time
+import socket
+
+import flow_index
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+def create_dimension_tables(c):
+
+    # Repeated key parts are stored once and referenced by integer id from the fact tables
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS host (
+            id INTEGER PRIMARY KEY,
+            domain TEXT,
+            ip BLOB,
+            UNIQUE (domain, ip)
+        )
+    ''')
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS descriptor (
+            id INTEGER PRIMARY KEY,
+            interface TEXT,
+            direction TEXT,
+            network_proto TEXT,
+            trans_proto TEXT,
+            tos TEXT,
+            "desc" TEXT,
+            UNIQUE (interface, direction, network_proto, trans_proto, tos, "desc")
+        )
+    ''')
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS process (
+            id INTEGER PRIMARY KEY,
+            process_name TEXT,
+            process_cmd TEXT,
+            process_arg TEXT,
+            parent_process_name TEXT,
+            parent_process_cmd TEXT,
+            parent_process_arg TEXT,
+            UNIQUE (process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg)
+        )
+    ''')
+
+def key_columns(receiver):
+    return (('sender_host_id',) if receiver else ()) + ('src_host_id', 'src_port', 'dst_host_id', 'dst_port', 'descriptor_id', 'process_id')
+
+def key_expressions(receiver):
+
+    # Absent ports are NULL and a unique key never matches two NULLs, so the key indexes them as -1
+    return tuple(f"ifnull({column}, -1)" if column.endswith('_port') else column for column in key_columns(receiver))
+
+def flat_select(table, receiver, bucket=False, keys=False):
+
+    # The dashboard and exports keep reading the flat column layout, in the stored types (pack_ip addresses,
+    # integer ports and epoch seconds) which dashboard.py formats for display. With keys the id columns and the
+    # well-known-port buckets of the totals follow, for grouping by them
+    sender_select = "sender.domain AS sender_domain, sender.ip AS sender_ip," if receiver else ""
+    key_select = "".join(f"f.{column} AS {column}, " for column in key_columns(receiver) if not column.endswith('_port')) + "f.src_known_port AS src_known_port, f.dst_known_port AS dst_known_port," if keys else ""
+    sender_join = "JOIN host AS sender ON sender.id = f.sender_host_id" if receiver else ""
+    last_column = "f.bucket AS bucket, datetime(f.bucket, 'unixepoch', 'localtime') AS bucket_start" if bucket else "f.last_updated AS last_updated"
+
+    return f'''
+        SELECT
+            {sender_select}
+            src.domain AS src_domain, src.ip AS src_ip, f.src_port AS src_port,
+            dst.domain AS dst_domain, dst.ip AS dst_ip, f.dst_port AS dst_port,
+            d.interface AS interface, d.direction AS direction, d.network_proto AS network_proto, d.trans_proto AS trans_proto, d.tos AS tos, d."desc" AS "desc",
+            p.process_name AS process_name, p.process_cmd AS process_cmd, p.process_arg AS process_arg,
+            p.parent_process_name AS parent_process_name, p.parent_process_cmd AS parent_process_cmd, p.parent_process_arg AS parent_process_arg,
+            {key_select}
+            f.total_length AS total_length,
+            {last_column}
+        FROM {table} AS f
+        {sender_join}
+        JOIN host AS src ON src.id = f.src_host_id
+        JOIN host AS dst ON dst.id = f.dst_host_id
+        JOIN descriptor AS d ON d.id = f.descriptor_id
+        JOIN process AS p ON p.id = f.process_id
+    '''
+
+def create_flat_view(c, view, table, receiver, bucket=False, keys=False):
+    c.execute(f"CREATE VIEW IF NOT EXISTS {view} AS {flat_select(table, receiver, bucket, keys)}")
+
+def create_flow_table(c, table, receiver, known_ports=False):
+
+    # A rowid table with the key as a unique index: the dashboard indexes of flow_index then hold a rowid
+    # instead of another copy of the whole key, and full scans stay sequential table scans
+    sender_column = "sender_host_id INTEGER NOT NULL," if receiver else ""
+    known_port_columns = ", src_known_port INTEGER, dst_known_port INTEGER" if known_ports else ""
+
+    c.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            {sender_column}
+            src_host_id INTEGER NOT NULL,
+            src_port INTEGER,
+            dst_host_id INTEGER NOT NULL,
+            dst_port INTEGER,
+            descriptor_id INTEGER NOT NULL,
+            process_id INTEGER NOT NULL,
+            total_length INTEGER,
+            last_updated INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+            {known_port_columns}
+        )
+    ''')
+    c.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {table}_key ON {table} ({', '.join(key_expressions(receiver))})")
+
+def create_rollup_table(c, table, receiver):
+
+    # Per-bucket byte deltas, keyed by bucket first so time ranges and retention are range scans. A rowid table
+    # as the flow partitions, a WITHOUT ROWID primary key would not take the NULL ports
+    sender_column = "sender_host_id INTEGER NOT NULL," if receiver else ""
+
+    c.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            bucket INTEGER NOT NULL,
+            {sender_column}
+            src_host_id INTEGER NOT NULL,
+            src_port INTEGER,
+            dst_host_id INTEGER NOT NULL,
+            dst_port INTEGER,
+            descriptor_id INTEGER NOT NULL,
+            process_id INTEGER NOT NULL,
+            total_length INTEGER
+        )
+    ''')
+    c.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {table}_key ON {table} (bucket, {', '.join(key_expressions(receiver))})")
+
+def create_traffic_tables(c, receiver=False, partition_hours=24, index_names=None):
+
+    """Create the partitioned flow and rollup tables with their flat views, migrating an old flat table first."""
+    # DDL is transactional in SQLite, a migration interrupted halfway is rolled back as a whole
+    if not c.connection.in_transaction:
+        c.execute("BEGIN")
+
+    table, view = base_names(receiver)
+
+    # Used by the migrations, TEXT addresses are converted in SQL
+    c.connection.create_function("pack_ip", 1, pack_ip, deterministic=True)
+
+    partition_length[table] = int(partition_hours * 3600)
+    traffic_indexes[table] = flow_index.get_definitions(index_names, receiver)
+
+    legacy = c.execute("SELECT type FROM sqlite_master WHERE name = ?", (view,)).fetchone()
+    if legacy and legacy[0] == 'table':
+        c.execute(f"ALTER TABLE {view} RENAME TO {view}_legacy")
+
+    # Hosts of the TEXT address layout are copied over with their ids, the flow tables keep referencing them
+    text_hosts = column_type(c, 'host', 'ip') == 'TEXT'
+    if text_hosts:
+        rename_table(c, 'host', 'host_text')
+
+    create_dimension_tables(c)
+
+    if text_hosts:
+        print("Converting host addresses to their binary form ...")
+        c.execute("INSERT INTO host (id, domain, ip) SELECT id, domain, pack_ip(ip) FROM host_text")
+        c.execute("DROP TABLE host_text")
+
+    flow_index.create_dimension_indexes(c)
+
+    # Flows are written to one table per period, old periods are expired by dropping their table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS partitions (
+            name TEXT PRIMARY KEY,
+            base TEXT,
+            start INTEGER,
+            "end" INTEGER
+        )
+    ''')
+
+    # A single unpartitioned flow table becomes the partition of the current period
+    unpartitioned = c.execute("SELECT type FROM sqlite_master WHERE name = ?", (table,)).fetchone()
+    if unpartitioned and unpartitioned[0] == 'table':
+        now = int(time.time())
+        start = now - now % partition_length[table]
+        c.execute(f"ALTER TABLE {table} RENAME TO {partition_name(table, start)}")
+        c.execute('INSERT INTO partitions (name, base, start, "end") VALUES (?, ?, ?, ?)', (partition_name(table, start), table, start, start + partition_length[table]))
+
+    for name, in c.execute("SELECT name FROM partitions WHERE base = ?", (table,)).fetchall():
+        retype_table(c, name, receiver)
+
+    partitioned = c.execute("SELECT 1 FROM partitions WHERE base = ?", (table,)).fetchone() is not None
+    partition = current_partition(c, time.time(), receiver)
+
+    # Partitions only keep their unique key, the dashboard indexes of earlier versions on them are dropped
+    for name, in c.execute("SELECT name FROM partitions WHERE base = ?", (table,)).fetchall():
+        flow_index.create_indexes(c, name, {})
+
+    # One row per flow with its totals over the retained partitions, what the dashboard reads and indexes
+    new_totals = c.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (f"{table}_totals",)).fetchone() is None
+    create_flow_table(c, f"{table}_totals", receiver, known_ports=True)
+
+    # Totals created without the well-known-port buckets get them from their ports
+    if column_type(c, f"{table}_totals", 'src_known_port') is None:
+        c.execute(f"ALTER TABLE {table}_totals ADD COLUMN src_known_port INTEGER")
+        c.execute(f"ALTER TABLE {table}_totals ADD COLUMN dst_known_port INTEGER")
+        c.execute(f"UPDATE {table}_totals SET src_known_port = {known_port_sql('src_port')}, dst_known_port = {known_port_sql('dst_port')}")
+
+    flow_index.create_indexes(c, f"{table}_totals", traffic_indexes[table])
+    create_traffic_views(c, receiver)
+
+    for tier in ROLLUP_TIERS:
+        retype_table(c, f"{table}_{tier}", receiver, rollup=True)
+        create_rollup_table(c, f"{table}_{tier}", receiver)
+        create_flat_view(c, f"{view}_{tier}", f"{table}_{tier}", receiver, bucket=True)
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            rolled_until INTEGER
+        )
+    ''')
+
+    if legacy and legacy[0] == 'table':
+        migrate_legacy_table(c, f"{view}_legacy", partition, receiver)
+        sum_partitions(c, receiver)
+        return True
+
+    if new_totals and partitioned:
+        sum_partitions(c, receiver)
+
+    return False
+
+def base_names(receiver):
+    return ('receiver_flow', 'receiver_traffic') if receiver else ('flow', 'traffic')
+
+def partition_name(table, start):
+    return f"{table}_p{time.strftime('%Y%m%d%H', time.gmtime(start))}"
+
+def column_type(c, table, column):
+    row = c.execute("SELECT type FROM pragma_table_info(?) WHERE name = ?", (table, column)).fetchone()
+    return row[0] if row else None
+
+def rename_table(c, table, new_name):
+
+    # In legacy mode the views over table are left alone instead of following it, they see the rebuilt table
+    c.execute("PRAGMA legacy_alter_table = ON")
+    c.execute(f"ALTER TABLE {table} RENAME TO {new_name}")
+    c.execute("PRAGMA legacy_alter_table = OFF")
+
+def retype_table(c, table, receiver, rollup=False):
+
+    """Rebuild a flow partition or rollup table of the TEXT port/last_updated layout with typed columns."""
+    if column_type(c, table, 'src_port') != 'TEXT':
+        return False
+
+    print(f"Converting {table} to typed columns ...")
+
+    rename_table(c, table, f"{table}_text")
+
+    if rollup:
+        create_rollup_table(c, table, receiver)
+        columns = ('bucket',) + key_columns(receiver) + ('total_length',)
+    else:
+        create_flow_table(c, table, receiver)
+        columns = key_columns(receiver) + ('total_length', 'last_updated')
+
+    converted = {'src_port': text_port('src_port'), 'dst_port': text_port('dst_port'), 'last_updated': text_time('last_updated')}
+
+    c.execute(f"INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(converted.get(column, column) for column in columns)} FROM {table}_text")
+    c.execute(f"DROP TABLE {table}_text")
+
+    return True
+
+def text_port(column):
+    return f"CAST(NULLIF({column}, 'None') AS INTEGER)"
+
+def text_time(column):
+
+    # The TEXT layout stored datetime('now', 'localtime') strings
+    return f"CAST(strftime('%s', {column}, 'utc') AS INTEGER)"
+
+def current_partition(c, now, receiver=False):
+
+    """Return the partition table taking the writes made at epoch now, creating it when a new period starts."""
+    table, _ = base_names(receiver)
+    start = int(now) - int(now) % partition_length[table]
+
+    cached = current_partitions.get(table)
+    if cached and cached[0] == start:
+        return cached[1]
+
+    partition = partition_name(table, start)
+
+    if c.execute("SELECT 1 FROM partitions WHERE name = ?", (partition,)).fetchone() is None:
+        create_flow_table(c, partition, receiver)
+        c.execute('INSERT INTO partitions (name, base, start, "end") VALUES (?, ?, ?, ?)', (partition, table, start, start + partition_length[table]))
+
+    current_partitions[table] = (start, partition)
+
+    return partition
+
+def create_traffic_views(c, receiver):
+
+    """(Re)create the traffic view over the flow totals."""
+    table, view = base_names(receiver)
+
+    # Earlier versions read the partitions through it, summed or with a row per partition
+    c.execute(f"DROP VIEW IF EXISTS {view}")
+    c.execute(f"DROP VIEW IF EXISTS {view}_rows")
+    create_flat_view(c, view, f"{table}_totals", receiver)
+
+    c.execute(f"DROP VIEW IF EXISTS {view}_known_port")
+    create_flat_view(c, f"{view}_known_port", f"{table}_totals", receiver, keys=True)
+
+def sum_partitions(c, receiver):
+
+    """Fill the flow totals from the retained partitions, for databases of versions without them."""
+    table, _ = base_names(receiver)
+    partitions = [name for name, in c.execute("SELECT name FROM partitions WHERE base = ? ORDER BY start", (table,))]
+    column_list = ", ".join(key_columns(receiver))
+
+    print(f"Summing {len(partitions)} partitions into {table}_totals ...")
+
+    c.execute(f"DELETE FROM {table}_totals")
+
+    if not partitions:
+        return
+
+    union = " UNION ALL ".join(f"SELECT {column_list}, total_length, last_updated FROM {partition}" for partition in partitions)
+
+    c.execute(f'''
+        INSERT INTO {table}_totals ({column_list}, total_length, last_updated, src_known_port, dst_known_port)
+        SELECT {column_list}, SUM(total_length), MAX(last_updated), {known_port_sql('src_port')}, {known_port_sql('dst_port')}
+        FROM ({union})
+        GROUP BY {column_list}
+    ''')
+
+def subtract_partition(c, partition, end, receiver):
+
+    """Take the flows of a partition about to be dropped out of the flow totals."""
+    table, _ = base_names(receiver)
+    column_list = ", ".join(key_columns(receiver))
+
+    # One lookup in the totals' unique key per partition row. A flow missing from the totals, which should not
+    # happen, comes in with last_updated 0 and is deleted right below
+    c.execute(f'''
+        INSERT INTO {table}_totals ({column_list}, total_length, last_updated)
+        SELECT {column_list}, -total_length, 0 FROM {partition} WHERE true
+        ON CONFLICT({", ".join(key_expressions(receiver))})
+        DO UPDATE SET total_length = total_length + excluded.total_length
+    ''')
+
+    # Last updated before the end of the partition, a flow has nothing left in the newer ones
+    c.execute(f"DELETE FROM {table}_totals WHERE last_updated < ? AND total_length <= 0", (end,))
+
+def migrate_legacy_table(c, legacy_table, table, receiver):
+
+    print(f"Migrating {legacy_table} into the normalized {table} table ...")
+
+    sender_hosts = f"UNION SELECT sender_domain, pack_ip(sender_ip) FROM {legacy_table}" if receiver else ""
+
+    c.execute(f'''
+        INSERT OR IGNORE INTO host (domain, ip)
+        SELECT src_domain, pack_ip(src_ip) FROM {legacy_table}
+        UNION SELECT dst_domain, pack_ip(dst_ip) FROM {legacy_table}
+        {sender_hosts}
+    ''')
+    c.execute(f'''
+        INSERT OR IGNORE INTO descriptor (interface, direction, network_proto, trans_proto, tos, "desc")
+        SELECT DISTINCT interface, direction, network_proto, trans_proto, tos, "desc" FROM {legacy_table}
+    ''')
+    c.execute(f'''
+        INSERT OR IGNORE INTO process (process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg)
+        SELECT DISTINCT process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg FROM {legacy_table}
+    ''')
+
+    sender_column = "sender_host_id, " if receiver else ""
+    sender_select = "sender.id, " if receiver else ""
+    sender_join = "JOIN host AS sender ON sender.domain IS t.sender_domain AND sender.ip IS pack_ip(t.sender_ip)" if receiver else ""
+
+    c.execute(f'''
+        INSERT INTO {table} ({sender_column}src_host_id, src_port, dst_host_id, dst_port, descriptor_id, process_id, total_length, last_updated)
+        SELECT {sender_select}src.id, {text_port('t.src_port')}, dst.id, {text_port('t.dst_port')}, d.id, p.id, t.total_length, {text_time('t.last_updated')}
+        FROM {legacy_table} AS t
+        {sender_join}
+        JOIN host AS src ON src.domain IS t.src_domain AND src.ip IS pack_ip(t.src_ip)
+        JOIN host AS dst ON dst.domain IS t.dst_domain AND dst.ip IS pack_ip(t.dst_ip)
+        JOIN descriptor AS d ON d.interface IS t.interface AND d.direction IS t.direction AND d.network_proto IS t.network_proto AND d.trans_proto IS t.trans_proto AND d.tos IS t.tos AND d."desc" IS t."desc"
+        JOIN process AS p ON p.process_name IS t.process_name AND p.process_cmd IS t.process_cmd AND p.process_arg IS t.process_arg AND p.parent_process_name IS t.parent_process_name AND p.parent_process_cmd IS t.parent_process_cmd AND p.parent_process_arg IS t.parent_process_arg
+    ''')
+
+    c.execute(f"DROP TABLE {legacy_table}")
+
+def lookup_ids(c, table, columns, values, convert=None):
+
+    """Map dimension tuples to their ids, inserting the ones not seen before.
+
+    The ids stay cached by the tuples as given, convert turns a tuple into the stored column values.
+    """
+    cache = dimension_cache[table]
+
+    if len(cache) >= DIMENSION_CACHE_SIZE:
+        cache.clear()
+
+    missing = [value for value in set(values) if value not in cache]
+
+    if missing:
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        condition = " AND ".join(f'"{column}" IS ?' for column in columns)
+
+        # Looked up before inserting, an INSERT OR IGNORE would add a host without an address again every time
+        # as the unique key never matches its NULL ip
+        for value in missing:
+            row = convert(value) if convert else value
+            found = c.execute(f"SELECT id FROM {table} WHERE {condition}", row).fetchone()
+            if found is None:
+                c.execute(f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})", row)
+            cache[value] = found[0] if found else c.lastrowid
+
+    return cache
+
+def pack_ip(ip):
+
+    """Sortable binary form of an IP address: the family (4 or 6) as first byte, then the packed address. None when absent."""
+    for family, flag in ((socket.AF_INET, b'\x04'), (socket.AF_INET6, b'\x06')):
+        try:
+            return flag + socket.inet_pton(family, ip)
+        except (OSError, TypeError):
+            pass
+
+    return None
+
+def unpack_ip(value):
+
+    """The text form of a pack_ip value, 'None' for an absent address."""
+    if not value:
+        return 'None'
+
+    return socket.inet_ntop(socket.AF_INET if value[0] == 4 else socket.AF_INET6, value[1:])
+
+def pack_host(host):
+    return host[0], pack_ip(host[1])
+
+def to_port(port):
+
+    # Flow keys carry ports as text with 'None' when absent
+    try:
+        return int(port)
+    except (TypeError, ValueError):
+        return None
+
+def known_port(port):
+
+    # Well-known ports keep their number, the others share the bucket above them and absent ones stay NULL
+    return None if port is None else min(port, WELL_KNOWN_PORT_MAX + 1)
+
+def known_port_sql(column):
+    return f"min({column}, {WELL_KNOWN_PORT_MAX + 1})"  # NULL for a NULL port, as known_port()
+
+def upsert_flows(c, items, now, sender=None):
+
+    """Add (flow key, total_length) items of a window written at epoch now to the current flow partition, the flow totals and the 1m rollup.
+
+    With a (sender_domain, sender_ip) sender the receiver_flow tables are written instead.
+    """
+    hosts = lookup_ids(c, 'host', ('domain', 'ip'), [key[0:2] for key, _ in items] + [key[3:5] for key, _ in items] + ([sender] if sender else []), pack_host)
+    descriptors = lookup_ids(c, 'descriptor', DESCRIPTOR_COLUMNS, [key[6:12] for key, _ in items])
+    processes = lookup_ids(c, 'process', PROCESS_COLUMNS, [key[12:18] for key, _ in items])
+
+    sender_id = (hosts[sender],) if sender else ()
+    rows = [(*sender_id, hosts[key[0:2]], to_port(key[2]), hosts[key[3:5]], to_port(key[5]), descriptors[key[6:12]], processes[key[12:18]], total_length) for key, total_length in items]
+
+    table, _ = base_names(bool(sender))
+    partition = current_partition(c, now, bool(sender))
+    columns = key_columns(bool(sender))
+    column_list = ", ".join(columns)
+    placeholders = ", ".join("?" for _ in columns)
+    conflict_target = ", ".join(key_expressions(bool(sender)))
+
+    last_updated = int(now)
+
+    c.executemany(f'''
+        INSERT INTO {partition} ({column_list}, total_length, last_updated)
+        VALUES ({placeholders}, ?, ?)
+        ON CONFLICT({conflict_target})
+        DO UPDATE SET total_length = total_length + excluded.total_length, last_updated = excluded.last_updated
+    ''', [(*row, last_updated) for row in rows])
+
+    # The partition keeps the period's share of a flow until it expires, the totals are what the dashboard reads
+    c.executemany(f'''
+        INSERT INTO {table}_totals ({column_list}, total_length, last_updated, src_known_port, dst_known_port)
+        VALUES ({placeholders}, ?, ?, ?, ?)
+        ON CONFLICT({conflict_target})
+        DO UPDATE SET total_length = total_length + excluded.total_length, last_updated = excluded.last_updated
+    ''', [(*row, last_updated, known_port(to_port(key[2])), known_port(to_port(key[5]))) for row, (key, _) in zip(rows, items)])
+
+    bucket = int(now) - int(now) % ROLLUP_TIERS['1m']
+
+    c.executemany(f'''
+        INSERT INTO {table}_1m (bucket, {column_list}, total_length)
+        VALUES (?, {placeholders}, ?)
+        ON CONFLICT(bucket, {conflict_target})
+        DO UPDATE SET total_length = total_length + excluded.total_length
+    ''', [(bucket, *row) for row in rows])
+
+def run_in_savepoint(c, name, function, *args):
+
+    # Maintenance runs inside the group-commit transaction, a failure must not take the pending windows with it
+    if not c.connection.in_transaction:
+        c.execute("BEGIN")
+    c.execute(f"SAVEPOINT {name}")
+
+    try:
+        result = function(c, *args)
+    except Exception:
+        c.execute(f"ROLLBACK TO {name}")
+        c.execute(f"RELEASE {name}")
+        clear_cache()
+        raise
+
+    c.execute(f"RELEASE {name}")
+
+    return result
+
+def downsample(c, now, retention, receiver=False):
+
+    """Roll completed 1m buckets into 1h and completed 1h buckets into 1d, then expire each tier past its retention."""
+    return run_in_savepoint(c, "rollup", downsample_tiers, now, retention, receiver)
+
+def downsample_tiers(c, now, retention, receiver):
+
+    table, _ = base_names(receiver)
+    column_list = ", ".join(key_columns(receiver))
+    conflict_target = ", ".join(key_expressions(receiver))
+    tiers = list(ROLLUP_TIERS.items())
+    rolled = 0
+
+    for (source, _), (target, seconds) in zip(tiers, tiers[1:]):
+        # Only whole target buckets are rolled, the one still filling up waits for the next run
+        until = int(now) - int(now) % seconds
+        state = c.execute("SELECT rolled_until FROM rollup_state WHERE name = ?", (f"{table}_{target}",)).fetchone()
+        since = state[0] if state else 0
+
+        if since >= until:
+            continue
+
+        c.execute(f'''
+            INSERT INTO {table}_{target} (bucket, {column_list}, total_length)
+            SELECT bucket - bucket % ?, {column_list}, SUM(total_length)
+            FROM {table}_{source}
+            WHERE bucket >= ? AND bucket < ?
+            GROUP BY bucket - bucket % ?, {column_list}
+            ON CONFLICT(bucket, {conflict_target})
+            DO UPDATE SET total_length = total_length + excluded.total_length
+        ''', (seconds, since, until, seconds))
+        rolled += c.rowcount
+
+        c.execute("INSERT INTO rollup_state (name, rolled_until) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET rolled_until = excluded.rolled_until", (f"{table}_{target}", until))
+
+    expired = 0
+
+    for tier in ROLLUP_TIERS:
+        c.execute(f"DELETE FROM {table}_{tier} WHERE bucket < ?", (int(now) - retention[tier],))
+        expired += c.rowcount
+
+    return rolled, expired
+
+def expire_partitions(c, now, retention, size_limit=0, receiver=False):
+
+    """Drop partitions ended more than retention seconds ago, then the oldest ones while the database is over size_limit bytes (0 for no limit).
+
+    The partition taking writes is never dropped. Returns the dropped partition names.
+    """
+    return run_in_savepoint(c, "expire", drop_partitions, now, retention, size_limit, receiver)
+
+def drop_partitions(c, now, retention, size_limit, receiver):
+
+    table, _ = base_names(receiver)
+    current = current_partition(c, now, receiver)
+    partitions = c.execute('SELECT name, "end" FROM partitions WHERE base = ? AND name != ? ORDER BY start', (table, current)).fetchall()
+    dropped = []
+
+    for name, end in partitions:
+        # Whole tables go at once, no row-by-row deletes
+        if end <= now - retention or (size_limit and used_bytes(c) > size_limit):
+            subtract_partition(c, name, end, receiver)
+            c.execute(f"DROP TABLE IF EXISTS {name}")
+            c.execute("DELETE FROM partitions WHERE name = ?", (name,))
+            dropped.append(name)
+
+    if size_limit and used_bytes(c) > size_limit:
+        print(f"Database still over its size limit with only {current} left, consider lower rollup retention")
+
+    return dropped
+
+def used_bytes(c):
+    page_size, = c.execute("PRAGMA page_size").fetchone()
+    page_count, = c.execute("PRAGMA page_count").fetchone()
+    freelist_count, = c.execute("PRAGMA freelist_count").fetchone()
+    return (page_count - freelist_count) * page_size
+
+def enable_incremental_vacuum(conn):
+
+    """Switch the database to incremental auto_vacuum, returns True when a VACUUM is still needed to apply it."""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+
+    # Only takes effect right away on an empty database, otherwise on the next VACUUM
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2
+
+def release_free_pages(conn):
+
+    """Give the pages of dropped partitions back to the file system."""
+    conn.executescript("PRAGMA incremental_vacuum;")  # execute() would only step it once, freeing a single page
+
+def get_retention(section):
+
+    """Seconds each rollup tier is kept, from the rollup_<tier>_retention keys of a config section."""
+    return {tier: section.get(f"rollup_{tier}_retention", seconds) for tier, seconds in ROLLUP_RETENTION.items()}
+
+def clear_cache():
+
+    """Forget cached dimension ids, after a rollback or when switching databases."""
+    for cache in dimension_cache.values():
+        cache.clear()
+
+    current_partitions.clear()
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+DESCRIPTOR_COLUMNS = ('interface', 'direction', 'network_proto', 'trans_proto', 'tos', 'desc')
+
+PROCESS_COLUMNS = ('process_name', 'process_cmd', 'process_arg', 'parent_process_name', 'parent_process_cmd', 'parent_process_arg')
+
+WELL_KNOWN_PORT_MAX = 1024  # the dashboard's known-port mode shows higher ports as 'Not well-known'
+
+DIMENSION_CACHE_SIZE = 65536  # ids per dimension table kept in memory
+
+dimension_cache = {'host': {}, 'descriptor': {}, 'process': {}}
+
+partition_length = {'flow': 86400, 'receiver_flow': 86400}  # seconds of traffic per partition table
+
+current_partitions = {}  # base table -> (period start, partition name) taking writes
+
+traffic_indexes = {'flow': {}, 'receiver_flow': {}}  # base table -> flow_index definitions kept on its totals table
+
+# Rollup tier -> bucket length in seconds, each tier is downsampled into the next
+ROLLUP_TIERS = {'1m': 60, '1h': 3600, '1d': 86400}
+
+# Default retention per tier: a day of minutes, 30 days of hours, a year of days
+ROLLUP_RETENTION = {'1m': 86400, '1h': 2592000, '1d': 31536000}
+
+# Global Variable -- End
@@ -0,0 +1,412 @@
+# Import Module -- Start
+
+import os
+import zlib
+import bisect
+import struct
+import threading
+import collections
+
+import wire_format
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+class ForwardSpool:
+
+    """Disk-backed, size-capped spool between the collector's DB worker and the websocket sender.
+
+    put() appends a window to append-only segment files under path, as a record holding its binary wire_format
+    message numbered in the collector's stream. The sender read()s the records in order, ack()s them as the receiver
+    does and rewind()s to the first unacknowledged one after a reconnect. Segments are deleted once acknowledged.
+
+    The stream id and the acknowledged sequence number are kept next to the segments, a restarted collector resends
+    the unacknowledged windows under the same stream and the receiver drops those it already took.
+
+    Once the segments would exceed max_bytes the policy applies: 'drop_oldest' deletes the oldest segments,
+    'merge' first sums the windows not sent yet and the new one by flow key into a single window. A window over
+    max_bytes on its own is rejected, the window just written is never dropped.
+    """
+
+    def __init__(self, path, max_bytes=268435456, policy='drop_oldest', compression_level=1, compress_min_bytes=1024):
+
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown forward spool policy '{policy}', expected one of: {', '.join(POLICIES)}")
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.compression_level = compression_level
+        self.compress_min_bytes = compress_min_bytes
+        self.segment_bytes = max(MIN_SEGMENT_BYTES, max_bytes // 16)  # what dropping the oldest segment frees
+
+        self.condition = threading.Condition()
+        self.stats = collections.defaultdict(float)  # appended, sent, dropped, rejected, merges, merged
+
+        os.makedirs(path, exist_ok=True)
+
+        self.stream = self.load_stream()
+        self.acked = self.load_acked()
+
+        # [first seq, [(seq, offset, end), ...]] per segment file, oldest first
+        self.segments = []
+        self.recover()
+
+        self.last_seq = max([self.acked] + [records[-1][0] for _, records in self.segments])
+
+        # Windows a previous run left may have been sent already, only those put() since are ever merged
+        self.sent_seq = self.last_seq
+        self.read_seq = self.acked  # last record handed out by read()
+
+        self.writer = None
+        self.reader = None
+
+        if self.segments:
+            print(f"Forward spool holds {self.pending()} windows ({self.size() / 1048576:.1f} MiB) not acknowledged by the receiver")
+
+    def load_stream(self):
+
+        stream_path = os.path.join(self.path, "stream")
+
+        try:
+            with open(stream_path, "rb") as f:
+                stream = f.read()
+            if len(stream) == STREAM_BYTES:
+                return stream
+        except FileNotFoundError:
+            pass
+
+        stream = os.urandom(STREAM_BYTES)
+        write_file(stream_path, stream)
+
+        return stream
+
+    def load_acked(self):
+        try:
+            with open(os.path.join(self.path, "acked"), "r") as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def recover(self):
+
+        for name in sorted(os.listdir(self.path)):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(self.path, name))  # never replaced its file
+
+            elif name.startswith("merge-"):
+                # A merge the collector died in the middle of is completed, the file name tells where the merged records started
+                _, first_seq, offset = name[:-6].split("-")
+                merge_path = os.path.join(self.path, name)
+                records = scan_segment(merge_path)
+                if records:
+                    self.truncate_segments(int(first_seq), int(offset))
+                    os.replace(merge_path, os.path.join(self.path, segment_name(records[0][0])))
+                else:
+                    os.remove(merge_path)
+
+        for name in sorted(os.listdir(self.path)):
+            if not name.startswith("segment-"):
+                continue
+
+            segment_path = os.path.join(self.path, name)
+            records = scan_segment(segment_path)
+
+            if not records or records[-1][0] <= self.acked:
+                os.remove(segment_path)
+                continue
+
+            # A record cut short by a crash ends the segment
+            if records[-1][2] < os.path.getsize(segment_path):
+                with open(segment_path, "r+b") as f:
+                    f.truncate(records[-1][2])
+
+            self.segments.append([records[0][0], records])
+
+    def truncate_segments(self, first_seq, offset):
+
+        """Cut the segment starting at first_seq at offset and delete the later segments."""
+        for name in os.listdir(self.path):
+            if not name.startswith("segment-"):
+                continue
+
+            segment_seq = int(name[8:-6])
+            if segment_seq > first_seq or (segment_seq == first_seq and offset == 0):
+                os.remove(os.path.join(self.path, name))
+            elif segment_seq == first_seq:
+                with open(os.path.join(self.path, name), "r+b") as f:
+                    f.truncate(offset)
+
+    def size(self):
+        return sum(records[-1][2] for _, records in self.segments)
+
+    def pending(self):
+        return sum(len(records) - bisect.bisect_right(records, (self.acked, INFINITY)) for _, records in self.segments)
+
+    def put(self, items):
+
+        """Append a window of (flow key, total_length) items."""
+        with self.condition:
+            seq = self.last_seq + 1
+            record = encode_record(seq, wire_format.encode_binary(items, self.stream, seq, self.compression_level, self.compress_min_bytes))
+
+            # It would be the next one dropped, with every other window before it
+            if len(record) > self.max_bytes:
+                self.stats['rejected'] += 1
+                print(f"Forward spool window of {len(record) / 1048576:.1f} MiB over {self.max_bytes / 1048576:.0f} MiB on its own, rejected")
+                return
+
+            if self.size() + len(record) > self.max_bytes:
+                if self.policy == 'merge' and self.merge_unsent(items, seq):
+                    self.drop_oldest(0, keep=1)  # the merged window is the last segment
+                    self.condition.notify_all()
+                    return
+
+                self.drop_oldest(len(record))
+
+            self.append(seq, record)
+
+            self.stats['appended'] += 1
+            self.condition.notify_all()
+
+    def append(self, seq, record):
+
+        if not self.segments or self.segments[-1][1][-1][2] >= self.segment_bytes:
+            self.close_writer()
+            self.segments.append([seq, []])
+
+        if self.writer is None:
+            self.writer = open(os.path.join(self.path, segment_name(self.segments[-1][0])), "ab")
+
+        records = self.segments[-1][1]
+        offset = records[-1][2] if records else 0
+
+        # Flushed right away, a window put() survives the collector getting killed
+        self.writer.write(record)
+        self.writer.flush()
+
+        records.append((seq, offset, offset + len(record)))
+        self.last_seq = seq
+
+    def drop_oldest(self, record_bytes, keep=0):
+
+        while len(self.segments) > keep and self.size() + record_bytes > self.max_bytes:
+            first_seq, records = self.segments.pop(0)
+            self.remove_segment(first_seq)
+
+            dropped = len(records) - bisect.bisect_right(records, (self.acked, INFINITY))
+            if dropped:
+                self.stats['dropped'] += dropped
+                print(f"Forward spool over {self.max_bytes / 1048576:.0f} MiB, dropped {dropped} windows up to {records[-1][0]}")
+
+    def merge_unsent(self, items, seq):
+
+        """Replace the windows never sent by one summing them and items, numbered seq.
+
+        False when none were unsent or the sum would not fit in max_bytes, put() then drops the oldest windows instead.
+        """
+        position = self.find(self.sent_seq)
+        if position is None:
+            return False
+
+        index, start = position
+        first_seq, records = self.segments[index]
+        offset = records[start][1]
+
+        merged = collections.defaultdict(int)
+        windows = 0
+        for segment_seq, _ in self.segments[index:]:
+            with open(os.path.join(self.path, segment_name(segment_seq)), "rb") as f:
+                f.seek(offset if segment_seq == first_seq else 0)
+                while (record := read_record(f)) is not None:
+                    for key, total_length in wire_format.decode_binary(record[1])[2]:
+                        merged[key] += total_length
+                    windows += 1
+
+        for key, total_length in items:
+            merged[tuple(key)] += total_length
+
+        record = encode_record(seq, wire_format.encode_binary(list(merged.items()), self.stream, seq, self.compression_level, self.compress_min_bytes))
+        if len(record) > self.max_bytes:
+            return False
+
+        # Written in full before the merged records go, its name tells recover() what to cut
+        merge_path = os.path.join(self.path, f"merge-{first_seq}-{offset}.spool")
+        write_file(merge_path, record)
+
+        self.close_writer()
+        self.close_reader()
+        self.truncate_segments(first_seq, offset)
+        os.replace(merge_path, os.path.join(self.path, segment_name(seq)))
+
+        del records[start:]
+        del self.segments[index + (1 if records else 0):]
+        self.segments.append([seq, [(seq, 0, len(record))]])
+        self.last_seq = seq
+
+        self.stats['merges'] += 1
+        self.stats['merged'] += windows + 1
+
+        return True
+
+    def find(self, seq):
+
+        """(segment index, record index) of the first record after seq, None when there is none."""
+        for index, (_, records) in enumerate(self.segments):
+            if records[-1][0] > seq:
+                return index, bisect.bisect_right(records, (seq, INFINITY))
+
+        return None
+
+    def rewind(self):
+
+        """Read again from the first window not acknowledged, after a reconnect."""
+        with self.condition:
+            self.read_seq = self.acked
+
+    def read(self, count, timeout=None):
+
+        """Up to count (seq, binary message) records after those read before, waiting up to timeout seconds for one."""
+        with self.condition:
+            if self.find(self.read_seq) is None:
+                self.condition.wait(timeout)
+
+            records = []
+
+            while len(records) < count:
+                position = self.find(self.read_seq)
+                if position is None:
+                    break
+
+                index, start = position
+                first_seq, segment_records = self.segments[index]
+                segment_path = os.path.join(self.path, segment_name(first_seq))
+
+                # Drained in batches, one file read for as many records of the segment as wanted
+                batch = segment_records[start:start + count - len(records)]
+                base = batch[0][1]
+
+                if self.reader is None or self.reader.name != segment_path:
+                    self.close_reader()
+                    self.reader = open(segment_path, "rb")
+
+                self.reader.seek(base)
+                data = self.reader.read(batch[-1][2] - base)
+
+                records += [(seq, data[offset - base + RECORD_HEADER.size:end - base]) for seq, offset, end in batch]
+                self.read_seq = batch[-1][0]
+
+            if records:
+                self.sent_seq = max(self.sent_seq, self.read_seq)
+                self.stats['sent'] += len(records)
+
+            return records
+
+    def ack(self, seq):
+
+        """The receiver stored every window up to seq, segments holding nothing newer are deleted."""
+        with self.condition:
+            seq = min(seq, self.last_seq)
+            if seq <= self.acked:
+                return
+
+            # Not synced, a lost update only has the receiver drop a few windows sent again
+            self.acked = seq
+            write_file(os.path.join(self.path, "acked"), str(seq).encode(), sync=False)
+
+            while self.segments and self.segments[0][1][-1][0] <= self.acked:
+                self.remove_segment(self.segments.pop(0)[0])
+
+    def remove_segment(self, first_seq):
+
+        segment_path = os.path.join(self.path, segment_name(first_seq))
+
+        if self.writer and self.writer.name == segment_path:
+            self.close_writer()
+        if self.reader and self.reader.name == segment_path:
+            self.close_reader()
+
+        os.remove(segment_path)
+
+    def close_writer(self):
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+
+    def close_reader(self):
+        if self.reader:
+            self.reader.close()
+            self.reader = None
+
+    def close(self):
+        with self.condition:
+            self.close_writer()
+            self.close_reader()
+
+    def format_stats(self):
+        with self.condition:
+            return f"spooled {self.pending()} ({self.size() / 1048576:.1f}/{self.max_bytes / 1048576:.0f} MiB), acked up to {self.acked}, appended {self.stats['appended']:.0f}, sent {self.stats['sent']:.0f}, dropped {self.stats['dropped']:.0f}, rejected {self.stats['rejected']:.0f}, merged {self.stats['merged']:.0f} in {self.stats['merges']:.0f}"
+
+def segment_name(first_seq):
+    return f"segment-{first_seq:020d}.spool"
+
+def encode_record(seq, message):
+    return RECORD_HEADER.pack(len(message), zlib.crc32(message), seq) + message
+
+def read_record(f):
+
+    """Next (seq, message) of a segment file, None at its end or at a torn record."""
+    header = f.read(RECORD_HEADER.size)
+    if len(header) < RECORD_HEADER.size:
+        return None
+
+    length, crc, seq = RECORD_HEADER.unpack(header)
+    message = f.read(length)
+
+    if len(message) < length or zlib.crc32(message) != crc:
+        return None
+
+    return seq, message
+
+def scan_segment(path):
+
+    """(seq, offset, end) of the whole records of a segment file."""
+    records = []
+
+    with open(path, "rb") as f:
+        offset = 0
+        while (record := read_record(f)) is not None:
+            records.append((record[0], offset, f.tell()))
+            offset = f.tell()
+
+    return records
+
+def write_file(path, data, sync=True):
+
+    # Replaced in one go, a crash leaves the old content or the new one
+    temp_path = f"{path}.tmp"
+
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+
+    os.replace(temp_path, path)
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+POLICIES = ('drop_oldest', 'merge')
+
+STREAM_BYTES = 16
+
+MIN_SEGMENT_BYTES = 65536
+
+RECORD_HEADER = struct.Struct('<IIQ')  # message length, crc32, sequence number
+
+INFINITY = float('inf')  # (seq, INFINITY) sorts after every (seq, offset, end) record of seq
+
+# Global Variable -- End
@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[('../assets/ptcpdump','assets')],
     datas=[],
-    hiddenimports=['threading', 'queue', 'signal', 'subprocess','sys','os','re','time','sqlite3','socket', 'argparse', 'collections', 'traceback', 'websockets.sync.client', 'ssl', 'json', 'pathlib', 'copy'],
+    hiddenimports=['threading', 'queue', 'signal', 'subprocess','sys','os','re','time','sqlite3','socket', 'argparse', 'collections', 'itertools', 'multiprocessing', 'traceback', 'websockets.sync.client', 'ssl', 'json', 'pathlib', 'selectors', 'flow_parser', 'flow_key', 'dns_resolver', 'dns_cache', 'flow_schema', 'flow_index', 'flow_archive', 'numpy', 'math', 'shutil', 'spill_queue', 'pickle', 'db_tuning', 'wire_format', 'zlib', 'struct', 'forward_spool', 'bisect'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
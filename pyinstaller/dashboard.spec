@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('../assets','assets')],
-    hiddenimports=['pandas', 'subprocess', 'sqlite3', 'dash', 'json', 'argparse', 'dash_bootstrap_components', 'pathlib'],
+    hiddenimports=['pandas', 'subprocess', 'sqlite3', 'dash', 'json', 'argparse', 'dash_bootstrap_components', 'pathlib', 'time', 'ipaddress', 'flow_schema', 'flow_index', 'db_tuning'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=['threading', 'signal', 'queue', 'websockets.sync.server', 'traceback', 'argparse', 'sqlite3', 'socket', 'sys', 'os', 'ssl', 'json', 'pathlib', 'copy'],
+    hiddenimports=['threading', 'signal', 'queue', 'websockets.sync.server', 'websockets.asyncio.server', 'asyncio', 'resource', 'traceback', 'argparse', 'sqlite3', 'socket', 'sys', 'os', 'ssl', 'json', 'pathlib', 'time', 'flow_key', 'dns_resolver', 'dns_cache', 'flow_schema', 'flow_index', 'spill_queue', 'pickle', 'db_tuning', 'wire_format', 'zlib', 'struct', 'flow_import', 'flow_accumulator', 'concurrent.futures'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -4,16 +4,28 @@ import threading
 import signal
 import queue
 import websockets.sync.server
+import websockets.asyncio.server
+import asyncio
+import concurrent.futures
+import resource
 import traceback
 import argparse
 import sqlite3
-import socket
 import sys
 import os
 import ssl
 import json
 import pathlib
-import copy
+import time
+import flow_key
+import dns_resolver
+import dns_cache
+import flow_schema
+import flow_import
+import flow_accumulator
+import spill_queue
+import wire_format
+import db_tuning
 
 # Import Module -- End
 
@@ -32,6 +44,12 @@ def parse_arg():
     # Define arguments
     parser.add_argument('--config-path', type=str, required=False, default='config/flownix.json', help="Configuration file path")
 
+    # Without a command the receiver serves the websocket
+    subparsers = parser.add_subparsers(dest='command')
+    import_parser = subparsers.add_parser('import', help="Merge collector databases into the receiver database", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    import_parser.add_argument('sources', nargs='+', metavar='[SENDER=]DB_PATH', help="Collector database, recorded under the SENDER address or host name (default: its directory name)")
+    import_parser.add_argument('--jobs', type=int, required=False, default=4, help="Databases imported in parallel")
+
     # Parse the arguments
     arg = parser.parse_args()
 
@@ -51,123 +69,398 @@ def handle_termination(signum, frame):
     db_queue.put(None)  # stop DB worker
     server.shutdown()
 
+def merge_messages(newest, item):
+
+    # Coalesced only with a message of the same sender, the rows are written under its host, and of a stream only
+    # with the window right after, the merged message then stands for the range of sequence numbers
+    if item is None or item[1] != newest[1]:
+        return None
+
+    newest_sequence = get_sequence(newest)
+    sequence = get_sequence(item)
+
+    if newest_sequence or sequence:
+        if not (newest_sequence and sequence and newest_sequence[0] == sequence[0] and sequence[1] == newest_sequence[2] + 1):
+            return None
+        sequence = (sequence[0], newest_sequence[1], sequence[2])
+
+    return newest[0] + item[0], newest[1], newest[2], sequence
+
+def get_sequence(item):
+
+    # (stream, first sequence number, last sequence number) of a queued message, None for collectors without
+    # sequence numbers and for messages spooled before them
+    return item[3] if len(item) > 3 else None
+
+def create_stream_table(c):
+
+    # The last window written per collector stream, retransmitted windows up to it are dropped
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS receiver_streams (
+            stream TEXT PRIMARY KEY,
+            sender_domain TEXT,
+            sender_ip TEXT,
+            last_seq INTEGER,
+            last_updated INTEGER
+        )
+    ''')
+
+def take_sequence(stream, seq):
+
+    """Record window seq of stream as received, returns False for a window taken before (a retransmission)."""
+    with received_lock:
+        # Streams written before the receiver started were loaded by the DB worker, any other one is new
+        if seq <= received_seqs.get(stream, 0):
+            return False
+
+        received_seqs[stream] = seq
+
+        return True
+
 def get_domain_by_ip(ip):
-    """Resolve the domain name (hostname) from an IP address."""
-    # Check if the domain is in cache first
-    if ip in dns:
-        return dns[ip]
+    """Return the cached domain for an IP, the lookup itself runs in the background resolver."""
+    return dns_resolver.resolve(ip)
 
-    try:
-        # Perform reverse DNS lookup to get the hostname for the given IP address
-        hostname, _, _ = socket.gethostbyaddr(ip)
-        dns[ip] = hostname
-        return hostname
-    except (socket.herror, socket.gaierror):
-        # If DNS lookup fails, return the IP as is and cache it
-        dns[ip] = 'None'
-        return 'None'
-
-def write_receiver_traffic_table(data, sender_ip, sender_domain, c):
-
-    for key, total_length in data:
+def to_rows(data, sender_ip):
+
+    """(flow key, total_length) rows of a received window, without the markers and malformed flows."""
+    rows = []
+
+    for flow in data:
         try:
+            key, total_length = flow
             if key == "sni" or key == "finish":
                 continue
-            key_src, key_dst, key_etc, key_process, key_parent_process = key.split(" ~~~ ")
-            src_domain, src_ip, src_port = key_src.split(" ~~ ")
-            dst_domain, dst_ip, dst_port = key_dst.split(" ~~ ")
-            interface, direction, network_proto, trans_proto, tos, desc = key_etc.split(" ~~ ")
-            process_name, process_cmd, process_arg = key_process.split(" ~~ ")
-            parent_process_name, parent_process_cmd, parent_process_arg = key_parent_process.split(" ~~ ")
-
-            # Insert or update in the database
-            c.execute('''
-                INSERT INTO receiver_traffic (sender_domain, sender_ip, src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg, total_length, last_updated)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now', 'localtime'))
-                ON CONFLICT(sender_domain, sender_ip, src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg)
-                DO UPDATE SET total_length = total_length + excluded.total_length, last_updated = datetime('now', 'localtime')
-            ''', (sender_domain, sender_ip, src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg, total_length))
 
-        except Exception as e:
-            print(f"Exception type: {type(e).__name__}")
-            print(f"Exception args: {e.args}")
-            print(f"Exception message: {e}")
-            traceback.print_exc()
+            if not isinstance(total_length, int) or isinstance(total_length, bool):
+                raise ValueError(f"total_length {total_length!r} is not an integer")
 
-def db_worker():
+            rows.append((flow_key.to_key(key), total_length))
+        except (ValueError, TypeError) as e:
+            print(f"Skipping malformed flow from {sender_ip}: {e}")
 
-    """Update the database at regular intervals."""
+    return rows
+
+def write_receiver_traffic_table(rows, sender_ip, sender_domain, c, now, sequences=()):
+
+    try:
+        # Open the group-commit transaction first, otherwise RELEASE of the outermost savepoint would commit
+        if not c.connection.in_transaction:
+            c.execute("BEGIN")
+
+        # One savepoint per sender, a failing one is rolled back as a whole and the transaction carries on
+        c.execute("SAVEPOINT message")
+        flow_schema.upsert_flows(c, rows, now, (sender_domain, sender_ip))
+        for stream, _, last_seq in sequences:
+            # Committed together with the rows, a window is never written twice nor marked written without them
+            c.execute("INSERT INTO receiver_streams (stream, sender_domain, sender_ip, last_seq, last_updated) VALUES (?, ?, ?, ?, ?) ON CONFLICT(stream) DO UPDATE SET sender_domain = excluded.sender_domain, sender_ip = excluded.sender_ip, last_seq = excluded.last_seq, last_updated = excluded.last_updated", (stream, sender_domain, sender_ip, last_seq, int(now)))
+        c.execute("RELEASE message")
+
+        for stream, _, last_seq in sequences:
+            written_seqs[stream] = last_seq
+
+    except Exception as e:
+        print(f"Exception type: {type(e).__name__}")
+        print(f"Exception args: {e.args}")
+        print(f"Exception message: {e}")
+        traceback.print_exc()
+
+        if c.connection.in_transaction:
+            c.execute("ROLLBACK TO message")
+            c.execute("RELEASE message")
+        flow_schema.clear_cache()  # ids inserted by the rolled back message no longer exist
+
+        return 0
+
+    return len(rows)
+
+def commit_writes(conn):
+
+    """Commit the group-commit transaction, the windows written in it are acked as stored from then on."""
+    conn.commit()
+
+    with received_lock:
+        stored_seqs.update(written_seqs)
+
+def flush_flows(accumulator, c):
+
+    """Write the flows summed by the accumulator, one upsert per distinct (sender, flow). Returns the rows written."""
+    taken, now = accumulator.take()
+    written = 0
+
+    for (sender_domain, sender_ip), rows, sequences in taken:
+        written += write_receiver_traffic_table(rows, sender_ip, sender_domain, c, now, sequences)
+
+    return written
+
+def open_db():
+
+    """Open the receiver database, creating the flow tables behind the receiver_traffic view and migrating an old flat table."""
     conn = sqlite3.connect(config["receiver"]["receiver_db_path"])
     c = conn.cursor()
 
-    # Create table if it doesn't exist
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS receiver_traffic (
-            sender_domain TEXT,
-            sender_ip TEXT,  
-            src_domain TEXT,
-            src_ip TEXT,
-            src_port TEXT,
-            dst_domain TEXT,
-            dst_ip TEXT,
-            dst_port TEXT,
-            interface TEXT,
-            direction TEXT,
-            network_proto TEXT,
-            trans_proto TEXT,
-            tos TEXT,
-            desc TEXT,
-            process_name TEXT,
-            process_cmd TEXT,
-            process_arg TEXT,
-            parent_process_name TEXT,
-            parent_process_cmd TEXT,
-            parent_process_arg TEXT,
-            total_length INTEGER,
-            last_updated TEXT DEFAULT (datetime('now','localtime')),
-            PRIMARY KEY (sender_domain, sender_ip, src_domain, src_ip, src_port, dst_domain, dst_ip, dst_port, interface, direction, network_proto, trans_proto, tos, desc, process_name, process_cmd, process_arg, parent_process_name, parent_process_cmd, parent_process_arg)
-        )
-    ''')
+    vacuum = flow_schema.enable_incremental_vacuum(conn)
+    resize = db_tuning.apply_settings(conn, config.get("storage", {}))
+    migrated = flow_schema.create_traffic_tables(c, receiver=True, partition_hours=config["receiver"].get("partition_hours", 24), index_names=config["receiver"].get("traffic_indexes"))
+    create_stream_table(c)
     conn.commit()
 
+    if migrated or vacuum or resize:
+        db_tuning.vacuum(conn, resize, migrated or vacuum)  # give the space of the flat table back, applies incremental auto_vacuum and page_size
+
     conn.execute("PRAGMA journal_mode=WAL;")
 
-    batch_size = 5
-    counter = 0
+    return conn
+
+def db_worker():
+
+    """Update the database at regular intervals."""
+    conn = open_db()
+    c = conn.cursor()
+
+    storage = config.get("storage", {})
+
+    checkpoints = db_tuning.CheckpointScheduler(conn, config["receiver"]["receiver_db_path"], storage)
+
+    # Group commit: messages share a transaction until it holds commit_rows rows or is commit_interval seconds old
+    commit_interval = config["receiver"].get("commit_interval", 5)
+    commit_rows = config["receiver"].get("commit_rows", 100000)
+    commit_time = time.monotonic()
+    uncommitted_rows = 0
+
+    rollup_interval = config["receiver"].get("rollup_interval", 60)
+    rollup_retention = flow_schema.get_retention(config["receiver"])
+    rollup_time = time.time()
+
+    partition_retention = config["receiver"].get("partition_retention", 2592000)
+    db_size_limit = config["receiver"].get("db_size_limit_mb", 4096) * 1048576
+
+    # The handlers take windows against these, only once they are loaded the server starts
+    written_seqs.update(c.execute("SELECT stream, last_seq FROM receiver_streams"))
+    with received_lock:
+        received_seqs.update(written_seqs)
+        stored_seqs.update(written_seqs)
+    streams_loaded.set()
+    duplicates = 0
+
+    # The same flows of a sender in consecutive windows are summed in memory and written once per flush
+    accumulator = flow_accumulator.FlowAccumulator(config["receiver"].get("coalesce_flows", 100000), config["receiver"].get("coalesce_interval", 5))
 
     while True:
+        # Due by size or age, also while no messages come in
+        if accumulator.due():
+            try:
+                uncommitted_rows += flush_flows(accumulator, c)
+            except Exception as e:
+                print("DB write error:", e)
+
+        # Completed minutes are folded into hours and hours into days, expired buckets and partitions are dropped
+        if time.time() - rollup_time >= rollup_interval:
+            try:
+                flow_schema.downsample(c, time.time(), rollup_retention, receiver=True)
+                dropped = flow_schema.expire_partitions(c, time.time(), partition_retention, db_size_limit, receiver=True)
+                c.execute("DELETE FROM receiver_streams WHERE last_updated < ?", (int(time.time()) - partition_retention,))
+                commit_writes(conn)
+                if dropped:
+                    print(f"Dropped expired partitions: {', '.join(dropped)}")
+                    flow_schema.release_free_pages(conn)
+            except Exception as e:
+                print("Rollup error:", e)
+            rollup_time = time.time()
+
+        # Also with no rows, the stream positions of empty windows have to be committed before they are acked as stored
+        if uncommitted_rows >= commit_rows or (conn.in_transaction and time.monotonic() - commit_time >= commit_interval):
+            commit_writes(conn)
+            commit_time = time.monotonic()
+            uncommitted_rows = 0
+
         try:
-            item = db_queue.get(timeout=1)
+            item = db_queue.get(timeout=min(1, commit_interval))
         except queue.Empty:
             if shutdown_event.is_set():
                 break
+            # Idle with everything committed, the WAL is checkpointed now instead of by a commit under load
+            if not conn.in_transaction:
+                try:
+                    checkpoints.run()
+                except Exception as e:
+                    print("Checkpoint error:", e)
             continue
 
         if item is None:
             break
-        data, sender_ip, sender_domain = item
+        data, sender_ip, sender_domain = item[:3]
+        sequence = get_sequence(item)
+
+        # Sent again by a collector that missed the ack, and queued again as the receiver restarted in between
+        if sequence and sequence[2] <= max(written_seqs.get(sequence[0], 0), accumulator.last_seq(sequence[0])):
+            duplicates += 1
+            db_queue.task_done()
+            continue
+
+        if sender_domain == 'None':
+            sender_domain = dns.get(sender_ip, 'None')  # lookup may have completed while queued
+
+        # A window of the next minute goes in after the held ones are written under theirs
+        now = time.time()
+        if accumulator.due(now):
+            try:
+                uncommitted_rows += flush_flows(accumulator, c)
+            except Exception as e:
+                print("DB write error:", e)
+
         try:
-            write_receiver_traffic_table(data, sender_ip, sender_domain, c)  # insert statements
+            accumulator.add(to_rows(data, sender_ip), (sender_domain, sender_ip), sequence, now)
         except Exception as e:
             print("DB write error:", e)
-        counter += 1
         db_queue.task_done()
 
-        if counter >= batch_size:
-            conn.commit()
-            counter = 0
+    try:
+        flush_flows(accumulator, c)
+    except Exception as e:
+        print("DB write error:", e)
 
-    conn.commit()
+    commit_writes(conn)
     conn.close()
 
+    print(f"Checkpoints: {db_tuning.format_stats(checkpoints.stats)}")
+    print(f"Coalesced: {accumulator.format_stats()}")
+    print(f"Duplicate windows dropped by the writer: {duplicates}")
+
+def take_message(message, sender_ip, subprotocol):
+
+    """Decode a received message, returns (reply, queue item) with the item None when there is nothing to write."""
+    try:
+        stream, seq, data = wire_format.decode(message)  # binary or JSON, as negotiated
+    except ValueError as e:
+        print(f"Dropping malformed message from {sender_ip}: {e}")
+        return wire_format.encode_ack(subprotocol, None, "error"), None
+
+    # Windows of a stream arrive in order, the ack covers every one up to the last taken. The collector keeps them
+    # spooled until the stored ack covers them too, a window taken but lost with the receiver is then sent again
+    if stream is not None and not take_sequence(stream, seq):
+        print(f"Dropping window {seq} of stream {stream} from {sender_ip}, already received")
+        return wire_format.encode_ack(subprotocol, None, ack=received_seqs[stream], stored=stored_seqs.get(stream)), None
+
+    print(f"Received {len(data)} flows from {sender_ip}" + (f", window {seq}" if stream is not None else ""))
+    sender_domain = get_domain_by_ip(sender_ip)  # cached, or 'None' while the background resolver looks it up
+    sequence = (stream, seq, seq) if stream is not None else None
+
+    return wire_format.encode_ack(subprotocol, data, ack=seq, stored=stored_seqs.get(stream)), (data, sender_ip, sender_domain, sequence)
+
 def websocket_handler(websocket):
     for message in websocket:
-        data = json.loads(message)
+        # The DB worker is stopping, a window acked now would never be written. Unacked, the collector keeps it spooled
+        if shutdown_event.is_set():
+            websocket.close(1001, "receiver shutting down")
+            break
+
         sender_ip, _ = websocket.remote_address
-        print(f"Received from agent: {data}")
-        sender_domain = get_domain_by_ip(sender_ip)
-        db_queue.put(copy.deepcopy((data, sender_ip, sender_domain)))
-        websocket.send(json.dumps({"status": "secure-ok", "echo": data}))
+        reply, item = take_message(message, sender_ip, websocket.subprotocol)
+
+        if item:
+            db_queue.put(item)
+        websocket.send(reply)
+
+async def async_websocket_handler(websocket):
+
+    loop = asyncio.get_running_loop()
+    sender_ip, _ = websocket.remote_address
+
+    # One message of a connection at a time: while it waits for the handoff, at most connection_queue more are
+    # buffered and TCP holds back the collector, the others go on
+    async for message in websocket:
+        if shutdown_event.is_set():
+            await websocket.close(1001, "receiver shutting down")
+            break
+
+        # Large windows are decoded off the event loop, small ones cost less than the hop to a thread
+        if len(message) > DECODE_INLINE_BYTES:
+            reply, item = await loop.run_in_executor(None, take_message, message, sender_ip, websocket.subprotocol)
+        else:
+            reply, item = take_message(message, sender_ip, websocket.subprotocol)
+
+        if item:
+            await handoff.put(item)
+        await websocket.send(reply)
+
+async def pump_handoff():
+
+    """Move the messages of all connections from the handoff to db_queue, in one thread so a blocking put() stalls only this."""
+    loop = asyncio.get_running_loop()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="handoff") as executor:
+        while True:
+            items = [await handoff.get()]
+            while not handoff.empty():
+                items.append(handoff.get_nowait())
+
+            await loop.run_in_executor(executor, put_items, items)
+
+            for _ in items:
+                handoff.task_done()
+
+def put_items(items):
+    for item in items:
+        db_queue.put(item)
+
+async def serve_async(ssl_context):
+
+    """Serve every collector connection from one event loop, until SIGINT."""
+    global handoff
+    handoff = asyncio.Queue(config["receiver"].get("handoff_size", 256))
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+
+    pump = asyncio.create_task(pump_handoff())
+
+    async with websockets.asyncio.server.serve(async_websocket_handler, config["receiver"]["receiver_wss_ip"], config["receiver"]["receiver_wss_port"], ssl=ssl_context, select_subprotocol=wire_format.select_subprotocol, max_size=config["receiver"].get("max_message_mb", 16) * 1048576, max_queue=config["receiver"].get("connection_queue", 4)) as server:
+        print(f'Server running at wss://{config["receiver"]["receiver_wss_ip"]}:{config["receiver"]["receiver_wss_port"]} (asyncio)')
+        await stop.wait()
+
+        print("\nShutdown signal received, flushing DB...")
+        shutdown_event.set()
+        server.close()
+        await server.wait_closed()
+
+    # Everything acked reaches the DB worker before it stops
+    await handoff.join()
+    pump.cancel()
+    db_queue.put(None)
+
+def raise_file_limit():
+
+    # A socket per connected collector, the default soft limit of 1024 would cap them
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError) as e:
+            print(f"Keeping the open file limit at {soft}: {e}")
+
+def import_databases():
+
+    """Backfill collector databases, e.g. of collectors that were offline or not forwarding."""
+    conn = open_db()
+
+    partition_retention = config["receiver"].get("partition_retention", 2592000)
+    db_size_limit = config["receiver"].get("db_size_limit_mb", 4096) * 1048576
+
+    sources = [flow_import.parse_source(source) for source in arg.sources]
+    imported = flow_import.import_databases(config["receiver"]["receiver_db_path"], sources, config.get("storage", {}), arg.jobs, flow_schema.get_retention(config["receiver"]), partition_retention)
+
+    # Backfilled periods past the size limit go right away rather than at the next rollup of a running receiver
+    dropped = flow_schema.expire_partitions(conn.cursor(), time.time(), partition_retention, db_size_limit, receiver=True)
+    conn.commit()
+    if dropped:
+        print(f"Dropped expired partitions: {', '.join(dropped)}")
+        flow_schema.release_free_pages(conn)
+
+    conn.close()
+
+    return imported == len(sources)
 
 def main():
 
@@ -177,36 +470,71 @@ def main():
     global config
     config = load_config()
 
+    if arg.command == 'import':
+        sys.exit(0 if import_databases() else 1)
+
     global dns
-    dns = {}
+    dns = dns_cache.DnsCache(None, config["receiver"].get("dns_cache_size", 65536), config["receiver"].get("dns_ttl", 3600), config["receiver"].get("dns_negative_ttl", 300))
 
+    dns_resolver.start(dns, config["receiver"].get("dns_workers", 4), config["receiver"].get("dns_timeout", 2))
+
+    # Bounded, a stalled writer holds back the senders (block), spools their messages (spill) or merges them (coalesce)
     global db_queue
-    db_queue = queue.Queue()
+    db_queue = spill_queue.SpillQueue(config["receiver"].get("queue_size", 256), config["receiver"].get("queue_policy", "spill"), os.path.join(config["receiver"].get("spool_path", "receiver_spool"), "db_queue.spool"), merge_messages)
 
     global shutdown_event
     shutdown_event = threading.Event()
 
-    global server
+    # Highest window received per collector stream, written by the DB worker and committed (stored)
+    global received_seqs, received_lock, written_seqs, stored_seqs, streams_loaded
+    received_seqs = {}
+    received_lock = threading.Lock()
+    written_seqs = {}
+    stored_seqs = {}
+    streams_loaded = threading.Event()
 
-    signal.signal(signal.SIGINT, handle_termination)
+    # asyncio serves all collectors from one thread, thread mode has one thread per connected collector
+    server_mode = config["receiver"].get("server_mode", "asyncio")
+    if server_mode not in SERVER_MODES:
+        raise ValueError(f"Unknown server_mode '{server_mode}', expected one of: {', '.join(SERVER_MODES)}")
 
     db_thread = threading.Thread(target=db_worker, daemon=False)
     db_thread.start()
 
+    # The last window of each stream comes from the database before any is taken, never on the event loop
+    while not streams_loaded.wait(1):
+        if not db_thread.is_alive():
+            print("DB worker stopped before the server started.")
+            return
+
     ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
     ssl_context.load_cert_chain(certfile=config["receiver"]["receiver_cert_path"], keyfile=config["receiver"]["receiver_key_path"])
 
-    with websockets.sync.server.serve(websocket_handler, config["receiver"]["receiver_wss_ip"], config["receiver"]["receiver_wss_port"], ssl=ssl_context) as server:
-        print(f'Server running at wss://{config["receiver"]["receiver_wss_ip"]}:{config["receiver"]["receiver_wss_port"]}')
-        server.serve_forever()
-        
+    if server_mode == "asyncio":
+        raise_file_limit()
+        asyncio.run(serve_async(ssl_context))
+
+    else:
+        global server
+
+        signal.signal(signal.SIGINT, handle_termination)
+
+        with websockets.sync.server.serve(websocket_handler, config["receiver"]["receiver_wss_ip"], config["receiver"]["receiver_wss_port"], ssl=ssl_context, select_subprotocol=wire_format.select_subprotocol, max_size=config["receiver"].get("max_message_mb", 16) * 1048576) as server:
+            print(f'Server running at wss://{config["receiver"]["receiver_wss_ip"]}:{config["receiver"]["receiver_wss_port"]}')
+            server.serve_forever()
+
     db_thread.join()
+    print(f"DNS resolver: {dns_resolver.format_stats(dns_resolver.get_stats())}")
+    print(f"DB queue: {db_queue.format_stats()}")
     print("Server shutdown complete.")
 
 # Function Declaration -- End
 
 # Global Variable -- Start
 
+DECODE_INLINE_BYTES = 65536  # messages up to this size are decoded on the event loop
+
+SERVER_MODES = ('asyncio', 'thread')
 
 # Global Variable -- End
 
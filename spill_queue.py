@@ -0,0 +1,203 @@
+# Import Module -- Start
+
+import os
+import queue
+import pickle
+import threading
+import time
+import collections
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+class SpillQueue:
+
+    """Bounded FIFO in front of a writer thread, with a policy for what put() does once maxsize items are queued.
+
+    'block' waits for room. 'spill' appends the item to the spool file at spool_path, get() drains the spool in
+    order once the queued items are taken and later items go to the spool as well until it is empty. 'coalesce'
+    merges the item into the newest queued one with merge(newest, item), which returns the merged item or None
+    when the two do not merge, then put() waits as with 'block'. The None shutdown marker is never held back, and
+    never spooled: behind spooled items it is kept in memory and get() returns it once the spool is drained.
+
+    A spool left behind by a previous run is drained first.
+    """
+
+    def __init__(self, maxsize=64, policy='spill', spool_path=None, merge=None):
+
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}', expected one of: {', '.join(POLICIES)}")
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.spool_path = spool_path
+        self.merge = merge
+
+        self.items = collections.deque()
+        self.condition = threading.Condition()
+
+        self.spool = None  # spool file, open while it holds items
+        self.spool_offset = 0  # where the next spooled item starts
+        self.spooled = 0  # items in the spool
+        self.stopping = False  # the None marker came while items were spooled
+
+        self.stats = collections.defaultdict(float)  # spilled, spilled_bytes, coalesced, blocked, blocked_seconds, max_depth
+
+        if spool_path and os.path.exists(spool_path) and os.path.getsize(spool_path):
+            self.recover_spool()
+
+    def recover_spool(self):
+
+        self.spool = open(self.spool_path, "a+b")
+        self.spool.seek(0)
+
+        # A record cut short by a crash ends the spool, a None marker an older version spooled is not an item
+        end = 0
+        while True:
+            try:
+                item = pickle.load(self.spool)
+            except (EOFError, pickle.UnpicklingError, ValueError, TypeError, AttributeError, IndexError):
+                break
+            end = self.spool.tell()
+            self.spooled += item is not None
+
+        if not self.spooled:
+            self.spool.close()
+            self.spool = None
+            os.remove(self.spool_path)
+            return
+
+        self.spool.truncate(end)
+        print(f"Draining {self.spooled} items spooled to {self.spool_path} by a previous run")
+
+    def qsize(self):
+        return len(self.items) + self.spooled
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def put(self, item):
+
+        with self.condition:
+            # Nothing overtakes the spool, or items would reach the writer out of order
+            if self.spooled:
+                if item is None:
+                    self.stopping = True
+                    self.condition.notify_all()
+                else:
+                    self.write_spool(item)
+                return
+
+            while item is not None and len(self.items) >= self.maxsize:
+                if self.policy == 'spill' and self.spool_path:
+                    self.write_spool(item)
+                    return
+
+                if self.policy == 'coalesce' and self.merge and self.items[-1] is not None:
+                    merged = self.merge(self.items[-1], item)
+                    if merged is not None:
+                        self.items[-1] = merged
+                        self.stats['coalesced'] += 1
+                        return
+
+                wait_time = time.monotonic()
+                self.stats['blocked'] += 1
+                self.condition.wait()
+                self.stats['blocked_seconds'] += time.monotonic() - wait_time
+
+                if self.spooled:
+                    self.write_spool(item)
+                    return
+
+            self.items.append(item)
+            self.stats['max_depth'] = max(self.stats['max_depth'], len(self.items))
+            self.condition.notify_all()
+
+    def get(self, block=True, timeout=None):
+
+        with self.condition:
+            deadline = None if timeout is None else time.monotonic() + timeout
+
+            while not self.items:
+                if self.spooled:
+                    return self.read_spool()
+
+                if self.stopping:
+                    self.stopping = False
+                    return None
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not block or (remaining is not None and remaining <= 0):
+                    raise queue.Empty
+                self.condition.wait(remaining)
+
+            item = self.items.popleft()
+            self.condition.notify_all()
+
+            return item
+
+    def task_done(self):
+        pass  # nothing join()s on it, kept for queue.Queue compatibility
+
+    def write_spool(self, item):
+
+        if self.spool is None:
+            print(f"Queue full, spilling to {self.spool_path}")
+            os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+            self.spool = open(self.spool_path, "a+b")
+
+        data = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+        self.spool.write(data)
+        self.spool.flush()
+
+        self.spooled += 1
+        self.stats['spilled'] += 1
+        self.stats['spilled_bytes'] += len(data)
+        self.condition.notify_all()
+
+    def read_spool(self):
+
+        self.spool.seek(self.spool_offset)
+        while (item := pickle.load(self.spool)) is None:
+            pass  # skipped as recover_spool() did not count it
+        self.spool_offset = self.spool.tell()
+        self.spooled -= 1
+
+        # Drained, the file starts over empty
+        if not self.spooled:
+            self.spool.close()
+            self.spool = None
+            self.spool_offset = 0
+            os.remove(self.spool_path)
+            print(f"Drained {self.spool_path}")
+
+        self.condition.notify_all()
+
+        return item
+
+    def spool_bytes(self):
+        return self.spool.seek(0, os.SEEK_END) - self.spool_offset if self.spool else 0
+
+    def format_stats(self):
+        with self.condition:
+            return f"depth {len(self.items)}/{self.maxsize} (max {self.stats['max_depth']:.0f}), spooled {self.spooled} ({self.spool_bytes() / 1048576:.1f} MiB), spilled {self.stats['spilled']:.0f} ({self.stats['spilled_bytes'] / 1048576:.1f} MiB), coalesced {self.stats['coalesced']:.0f}, blocked {self.stats['blocked']:.0f} ({self.stats['blocked_seconds']:.1f}s)"
+
+def merge_windows(newest, window):
+
+    """Coalesce two flow windows (flow key -> total_length dicts) into newest."""
+    if window is None:
+        return None
+
+    for key, total_length in window.items():
+        newest[key] = newest.get(key, 0) + total_length
+
+    return newest
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+POLICIES = ('block', 'spill', 'coalesce')
+
+# Global Variable -- End
@@ -0,0 +1,212 @@
+# Import Module -- Start
+
+import json
+import zlib
+import struct
+
+import flow_key
+
+# Import Module -- End
+
+# Function Declaration -- Start
+
+def get_subprotocols(wire_format):
+
+    """Websocket subprotocols a collector offers for its forward_format setting, most preferred first."""
+    if wire_format not in WIRE_FORMATS:
+        raise ValueError(f"Unknown forward_format '{wire_format}', expected one of: {', '.join(WIRE_FORMATS)}")
+
+    return [BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL] if wire_format == 'binary' else [JSON_SUBPROTOCOL]
+
+def select_subprotocol(connection, subprotocols):
+
+    """Receiver side of the negotiation, collectors offering no known subprotocol are served JSON instead of refused."""
+    for subprotocol in SUBPROTOCOLS:
+        if subprotocol in subprotocols:
+            return subprotocol
+
+    return None
+
+def encode(items, subprotocol, stream=None, seq=None, compression_level=1, compress_min_bytes=1024):
+
+    """Encode a window of (flow key, total_length) items for the negotiated subprotocol, bare JSON without one.
+
+    Negotiated messages carry the collector's stream id (16 bytes) and the sequence number of the window.
+    """
+    if subprotocol == BINARY_SUBPROTOCOL:
+        return encode_binary(items, stream, seq, compression_level, compress_min_bytes)
+
+    if subprotocol == JSON_SUBPROTOCOL:
+        return json.dumps({"stream": stream.hex(), "seq": seq, "flows": items})
+
+    return json.dumps(items)
+
+def encode_binary(items, stream, seq, compression_level=1, compress_min_bytes=1024):
+
+    """Binary message of a window: a header, then the (optionally zlib compressed) body.
+
+    The body holds the distinct key strings once, as a table of uint32 byte lengths followed by their UTF-8 bytes,
+    then per flow the 18 table positions of its key fields and its total_length as uint64.
+    """
+    strings = {}
+    positions = [strings.setdefault(field, len(strings)) for key, _ in items for field in key]
+
+    if len(positions) != len(items) * FIELD_COUNT:
+        raise ValueError(f"Flow keys must have {FIELD_COUNT} fields")
+
+    flags = 0
+    position_format = 'H'
+    if len(strings) > 0xFFFF:
+        flags |= FLAG_WIDE
+        position_format = 'I'
+
+    encoded = [string.encode() for string in strings]
+
+    body = b''.join((
+        struct.pack('<II', len(strings), len(items)),
+        struct.pack(f'<{len(encoded)}I', *map(len, encoded)),
+        *encoded,
+        struct.pack(f'<{len(positions)}{position_format}', *positions),
+        struct.pack(f'<{len(items)}Q', *(total_length for _, total_length in items)),
+    ))
+
+    if compression_level and len(body) >= compress_min_bytes:
+        flags |= FLAG_ZLIB
+        body = zlib.compress(body, compression_level)
+
+    return HEADER.pack(MAGIC, VERSION, flags, stream, seq) + body
+
+def decode(message):
+
+    """Decode a received message into (stream id as hex, sequence number, items), both None for a bare JSON window.
+
+    Bytes are binary messages, text is JSON.
+    """
+    if isinstance(message, bytes):
+        return decode_binary(message)
+
+    try:
+        data = json.loads(message)
+    except RecursionError:
+        raise ValueError("Malformed JSON message: nested too deep")
+
+    if isinstance(data, list):
+        return None, None, check_flows(data)
+
+    try:
+        stream, seq, flows = bytes.fromhex(data["stream"]).hex(), int(data["seq"]), data["flows"]
+    except (KeyError, TypeError, ValueError, OverflowError) as e:
+        raise ValueError(f"Malformed JSON message: {e}")
+
+    return stream, seq, check_flows(flows)
+
+def check_flows(flows):
+
+    # Shaped as decode_binary() returns them, anything else is a malformed message and not a failing handler
+    if not isinstance(flows, list):
+        raise ValueError(f"Malformed JSON message: flows is {type(flows).__name__}, not a list")
+
+    for flow in flows:
+        if not isinstance(flow, list) or len(flow) != 2:
+            raise ValueError(f"Malformed JSON message: flow {flow!r:.100} is not a [key, total_length] pair")
+
+    return flows
+
+def decode_binary(message):
+
+    try:
+        magic, version, flags, stream, seq = HEADER.unpack_from(message)
+    except struct.error:
+        raise ValueError("Binary message shorter than its header")
+
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} binary message")
+
+    body = memoryview(message)[HEADER.size:]
+
+    if flags & FLAG_ZLIB:
+        # Bounded, a small message must not inflate into all of the receiver's memory
+        decompressor = zlib.decompressobj()
+        try:
+            body = decompressor.decompress(body, MAX_BODY_BYTES)
+        except zlib.error as e:
+            raise ValueError(f"Corrupt compressed message: {e}")
+        if decompressor.unconsumed_tail or not decompressor.eof:
+            raise ValueError(f"Compressed message over {MAX_BODY_BYTES} bytes or truncated")
+
+    try:
+        string_count, flow_count = struct.unpack_from('<II', body)
+        offset = 8
+
+        lengths = struct.unpack_from(f'<{string_count}I', body, offset)
+        offset += 4 * string_count
+
+        strings = []
+        for length in lengths:
+            strings.append(str(body[offset:offset + length], 'utf-8'))
+            offset += length
+
+        position_format = 'I' if flags & FLAG_WIDE else 'H'
+        positions = struct.unpack_from(f'<{flow_count * FIELD_COUNT}{position_format}', body, offset)
+        offset += struct.calcsize(position_format) * flow_count * FIELD_COUNT
+
+        total_lengths = struct.unpack_from(f'<{flow_count}Q', body, offset)
+
+        fields = [strings[position] for position in positions]
+
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed binary message: {e}")
+
+    # Every FIELD_COUNT consecutive fields make up one key
+    return stream.hex(), seq, list(zip(zip(*[iter(fields)] * FIELD_COUNT), total_lengths))
+
+def encode_ack(subprotocol, data, status="secure-ok", ack=None, stored=None):
+
+    """Reply to a received message.
+
+    Once a subprotocol was negotiated only the status and two cumulative acks: the highest sequence number up to
+    which every window of the stream was taken (ack) and up to which they were committed to the database (stored).
+    Older collectors get their data echoed back.
+    """
+    if subprotocol is None:
+        return json.dumps({"status": status, "echo": data})
+
+    return json.dumps({"status": status, "ack": ack, "stored": stored})
+
+def decode_ack(reply):
+
+    """(status, cumulative ack, cumulative stored ack) of a receiver reply, the acks None from receivers without them."""
+    try:
+        reply = json.loads(reply)
+        return reply.get("status"), reply.get("ack"), reply.get("stored")
+    except (ValueError, AttributeError):
+        return None, None, None
+
+# Function Declaration -- End
+
+# Global Variable -- Start
+
+BINARY_SUBPROTOCOL = 'flownix.binary.v1'
+
+JSON_SUBPROTOCOL = 'flownix.json'
+
+# What the receiver accepts, in its order of preference. Collectors offering none are the older ones sending JSON
+SUBPROTOCOLS = [BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL]
+
+WIRE_FORMATS = ('binary', 'json')
+
+FIELD_COUNT = len(flow_key.FLOW_KEY_FIELDS)
+
+HEADER = struct.Struct('<2sBB16sQ')  # magic, version, flags, stream id, sequence number
+
+MAGIC = b'FX'
+
+VERSION = 1
+
+FLAG_ZLIB = 0x01  # body is zlib compressed
+
+FLAG_WIDE = 0x02  # string table positions are uint32 instead of uint16
+
+MAX_BODY_BYTES = 64 * 1048576
+
+# Global Variable -- End